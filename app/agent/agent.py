@@ -1,28 +1,24 @@
-from typing import Any, Dict
+import logging
+from typing import Any, Dict, List
 
-import numpy as np
-from smolagents import LiteLLMModel
+from smolagents import tool
 
+from app.agent.answer_cache import SemanticAnswerCache
+from app.agent.outputs import compact_movies, compact_preferences
+from app.agent.runtime import AgentSessions, MovieAgent, MovieLiteLLMModel
 from app.agent.templates import get_movie_prompt_templates
+from app.clients.cassette import recorded
+from app.clients.deadline import DeadlineExceeded, exceeded, expired, remaining
+from app.clients.sqlite import sqlite_client
+from app.clients.title_resolver import title_resolver
+from app.clients.tmdb import tmdb_client
+from app.observability.health import agent_runs
 from app.schemas.schemas import (
     PreferenceData,
     UserPreferencesResponse,
 )
 from app.settings import settings
-
-model = LiteLLMModel(
-    model_id=settings.llm_name,
-    api_key=settings.llm_api_key,
-)
-
-import logging
-
-from smolagents import tool
-from smolagents.agents import ToolCallingAgent
-
-from app.clients.openai import openai_client
-from app.clients.sqlite import sqlite_client
-from app.clients.tmdb import tmdb_client
+from app.vectors.embeddings import embedding_backend
 
 logger = logging.getLogger(__name__)
 
@@ -56,45 +52,39 @@ def store_user_preference(user_id: str, preferences: PreferenceData) -> str:
     )  # smolagents doesn't support Pydantic models natively
     try:
         preference_text = ""
-        for movie in preferences.favourite_movies:
-            movie_details = tmdb_client.search_movie(movie)
+        favourite_titles = []
+        # Look up all favourite movies concurrently
+        # Known movies are resolved from the catalog, the others on TMDB. Movies
+        # which can't be looked up in time are stored by the user's title
+        search_results = title_resolver.resolve(preferences.favourite_movies)
+        for movie, movie_details in zip(preferences.favourite_movies, search_results):
+            # Store the TMDB title so these movies can be excluded from suggestions
+            favourite_titles.append(movie_details.title if movie_details else movie)
 
             if preferences.genre is None:
                 preferences.genre = []
 
             # Get movie genres and add them to preferences
-            movie_genres = tmdb_client.get_movie_genres(movie_details)
+            movie_genres = []
+            if movie_details and movie_details.genres is not None:
+                movie_genres = movie_details.genres
+            elif movie_details:
+                movie_genres = tmdb_client.get_movie_genres(movie_details)
 
             if movie_genres:
                 preferences.genre.extend(movie_genres)
             if movie_details:
                 preference_text += f"{movie_details.overview}.\n\n"
 
-        # Split movie overviews and embed each independently
-        if preference_text:
-            # Split the text by double newlines and filter out empty strings
-            movie_overviews = [
-                overview
-                for overview in preference_text.strip().split("\n\n")
-                if overview
-            ]
-
-            if movie_overviews:
-                # Get embeddings for non-empty overviews
-                overview_embeddings = [
-                    openai_client.get_embedding(overview)
-                    for overview in movie_overviews
-                ]
-
-                if overview_embeddings:
-                    # Convert to numpy arrays and calculate the average embedding
-                    overview_embeddings_array = np.array(overview_embeddings)
-                    embedding = np.mean(overview_embeddings_array, axis=0).tolist()
-
-        embedding = openai_client.get_embedding(preference_text)
+        try:
+            embedding = embedding_backend.embed(preference_text)
+        except DeadlineExceeded:
+            # get_preferences embeds the preference text when it is read next
+            embedding = None
+        preferences.favourite_movies = favourite_titles
 
         success = sqlite_client.update_preferences(
-            user_id, preferences, preference_text, embedding
+            user_id, preferences, preference_text, embedding, embedding_backend.model_id
         )
 
         if success:
@@ -106,6 +96,23 @@ def store_user_preference(user_id: str, preferences: PreferenceData) -> str:
         return f"Error storing user preference: {str(e)}"
 
 
+def _load_preferences(user_id: str, include_embedding: bool) -> UserPreferencesResponse:
+    try:
+        preferences = sqlite_client.get_preferences(
+            user_id, include_embedding=include_embedding
+        )
+
+        if preferences is None:
+            # Handle the case when no preferences are found
+            return UserPreferencesResponse(error="No preferences found for this user")
+        return UserPreferencesResponse(**preferences)
+    except Exception as e:
+        logger.error(f"Error retrieving user preferences: {str(e)}")
+        return UserPreferencesResponse(
+            error=f"Failed to retrieve preferences: {str(e)}"
+        )
+
+
 @tool
 def get_user_preferences(user_id: str = "1") -> Dict[str, Any]:
     """
@@ -115,33 +122,21 @@ def get_user_preferences(user_id: str = "1") -> Dict[str, Any]:
         user_id: The unique identifier for the user. Defaults to "1".
 
     Returns:
-        Dict[str, Any]: A dictionary containing the user's preferences (genre, favourite_movies, year_range, rating_min) or an empty dictionary if no preferences are found.
+        Dict[str, Any]: A dictionary containing the user's preferences (genre,
+            favourite_movies, year_range, rating_min) or an error if no preferences
+            are found.
     """
-    try:
-        # Validate input with Pydantic
-        preferences = sqlite_client.get_preferences(user_id, include_embedding=True)
-
-        if preferences is None:
-            # Handle the case when no preferences are found
-            response = UserPreferencesResponse(
-                error="No preferences found for this user"
-            )
-        else:
-            response = UserPreferencesResponse(**preferences)
-
-        return response.model_dump()
-    except Exception as e:
-        logger.error(f"Error retrieving user preferences: {str(e)}")
-        response = UserPreferencesResponse(
-            error=f"Failed to retrieve preferences: {str(e)}"
-        )
-        return response.model_dump()
+    # The embedding stays in the application, it would cost thousands of tokens
+    return compact_preferences(_load_preferences(user_id, include_embedding=False))
 
 
 @tool
 def suggest_movies(
-    user_id: str = "1", genres: list[str] = None, year_range: tuple = None
-) -> Dict[str, Any]:
+    user_id: str = "1",
+    genres: list[str] = None,
+    year_range: tuple = None,
+    query: str = None,
+) -> List[Dict[str, Any]]:
     """
     Suggest movies to the user based on their preferences. Derive the genres and year range from the user's preferences.
 
@@ -152,18 +147,26 @@ def suggest_movies(
             (1900, datetime.now().year),
             description="Preferred year range as a tuple of (start_year, end_year)",
         )
+        query: Keywords from the user's request which the movie's title or plot
+            should mention, e.g. "heist", "space" or "time travel". Leave empty when
+            there are none
 
     Returns:
-        Dict[str, Any]: A dictionary containing the suggested movies.
+        List[Dict[str, Any]]: The suggested movies with their title, year, rating,
+            genres and a short overview.
     """
     # Get user preferences
-    preferences = get_user_preferences(user_id)
+    preferences = _load_preferences(user_id, include_embedding=True)
     # Get trending movies
     trending_movies = sqlite_client.get_most_similar_movies(
-        preferences, limit=5, genres=genres, year_range=year_range
+        preferences.model_dump(),
+        limit=5,
+        genres=genres,
+        year_range=year_range,
+        query=query,
     )
 
-    return trending_movies
+    return compact_movies(trending_movies)
 
 
 tools = [
@@ -172,17 +175,52 @@ tools = [
     suggest_movies,
 ]
 
-# Create the agent
-agent = ToolCallingAgent(
-    tools=tools,
-    model=model,
-)
 
+def new_agent(**kwargs) -> MovieAgent:
+    """Create an agent with an empty memory and a model of its own."""
+    model = MovieLiteLLMModel(
+        model_id=settings.llm_name,
+        api_base=str(settings.llm_host),
+        api_key=settings.llm_api_key,
+    )
+    return MovieAgent(
+        tools=tools,
+        model=model,
+        prompt_templates=get_movie_prompt_templates(),
+        **kwargs,
+    )
 
-# If you want to use the ToolCallingAgent instead, uncomment the following lines as they both will work
 
-agent = ToolCallingAgent(
-    tools=tools,
-    model=model,
-    prompt_templates=get_movie_prompt_templates(),
-)
+agents = AgentSessions(new_agent)
+answer_cache = SemanticAnswerCache(sqlite_client)
+
+
+# Recorded so cassettes can be replayed question by question, never served from them
+@recorded("question", replay=False, keep_request=True)
+def answer_question(text: str, user_id: str) -> str:
+    """Answer a user's message, from the semantic answer cache when it is enabled."""
+    user_id = str(user_id)
+    if settings.answer_cache_enabled:
+        cached = answer_cache.get(text, user_id)
+        if cached is not None:
+            return cached
+    with agent_runs.track():
+        agent, lock = agents.get(user_id)
+        # Only the runs of the same user share a memory and wait for each other
+        budget = remaining()
+        if not lock.acquire(timeout=-1 if budget is None else max(budget, 0)):
+            raise exceeded("agent_queue")
+        try:
+            # Answers which may draw on earlier turns must not answer other questions
+            fresh = not agent.memory.steps
+            response, tools_used = agent.run_with_tools(
+                text, reset=False, additional_args={"user_id": user_id}
+            )
+            agent.write_memory_to_messages()
+        finally:
+            lock.release()
+    # A run cut short by the deadline must not answer the next similar questions
+    timed_out = expired() or response == agent.deadline_answer
+    if settings.answer_cache_enabled and fresh and not timed_out:
+        answer_cache.put(text, user_id, str(response), tools_used)
+    return response
@@ -0,0 +1,160 @@
+import functools
+import itertools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from app.clients.sqlite import SQLiteClient
+from app.observability.metrics import ANSWER_CACHE_ENTRIES, ANSWER_CACHE_LOOKUPS
+from app.settings import settings
+from app.vectors.embeddings import EmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+# Runs which called these tools changed data, they must never be answered from cache
+WRITE_TOOLS = {"store_user_preference"}
+
+
+class CachedAnswer(NamedTuple):
+    vector: np.ndarray
+    answer: str
+    user_id: str
+    scope: str  # data version the answer was computed from
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Answers of previous agent runs, looked up by the similarity of the questions.
+
+    A cached answer is only returned to the user it was computed for, while the
+    versions of their preferences and of the catalog are unchanged. Even answers of
+    runs which used no tools are not shared, the agent may have taken them from the
+    user's conversation. Runs which stored preferences are not cached. Entries expire
+    after `ttl_seconds`, the least recently used ones are evicted beyond
+    `max_entries`.
+    """
+
+    def __init__(
+        self,
+        client: SQLiteClient,
+        backend: EmbeddingBackend = None,
+        max_entries: int = None,
+        ttl_seconds: float = None,
+        threshold: float = None,
+    ):
+        self.client = client
+        self.backend = backend or client.embedding_backend
+        self.max_entries = max_entries or settings.answer_cache_max_entries
+        self.ttl_seconds = ttl_seconds or settings.answer_cache_ttl_seconds
+        self.threshold = (
+            settings.answer_cache_similarity_threshold
+            if threshold is None
+            else threshold
+        )
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()
+        self._keys = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        # The question is embedded on lookup and again when its answer is stored
+        self._embed = functools.lru_cache(maxsize=256)(self._embed_question)
+        ANSWER_CACHE_ENTRIES.set_function(self.__len__)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _embed_question(self, question: str) -> np.ndarray:
+        normalized = " ".join(re.findall(r"\w+", question.lower()))
+        vector = np.asarray(self.backend.embed(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _scopes(self, user_id: str) -> tuple[str, str]:
+        catalog_version, preferences_version = self.client.data_version(user_id)
+        return catalog_version, f"{catalog_version}:{preferences_version}"
+
+    def _evict_expired(self, now: float) -> None:
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            del self._entries[key]
+
+    def get(self, question: str, user_id: str) -> Optional[str]:
+        """The cached answer of the most similar question, if it is similar enough."""
+        answer = None
+        try:
+            vector = self._embed(question)
+            catalog_version, user_scope = self._scopes(user_id)
+            with self._lock:
+                self._evict_expired(time.monotonic())
+                candidates = [
+                    (key, entry)
+                    for key, entry in self._entries.items()
+                    if len(entry.vector) == len(vector)
+                    and entry.user_id == user_id
+                    and entry.scope == user_scope
+                ]
+                if catalog_version and candidates:
+                    scores = (
+                        np.stack([entry.vector for _, entry in candidates]) @ vector
+                    )
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.threshold:
+                        key, entry = candidates[best]
+                        self._entries.move_to_end(key)
+                        answer = entry.answer
+        except Exception as e:
+            logger.error(f"Error looking up cached answer: {str(e)}")
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        ANSWER_CACHE_LOOKUPS.inc(result="miss" if answer is None else "hit")
+        return answer
+
+    def put(
+        self, question: str, user_id: str, answer: str, tools: Iterable[str]
+    ) -> bool:
+        """
+        Cache the answer of a run which called `tools`.
+
+        Returns:
+            bool: True if the answer was cached
+        """
+        tools = set(tools)
+        if not answer or tools & WRITE_TOOLS:
+            return False
+        try:
+            vector = self._embed(question)
+            catalog_version, user_scope = self._scopes(user_id)
+            if not catalog_version:
+                return False
+            entry = CachedAnswer(
+                vector=vector,
+                answer=answer,
+                user_id=user_id,
+                scope=user_scope,
+                expires_at=time.monotonic() + self.ttl_seconds,
+            )
+            with self._lock:
+                self._entries[next(self._keys)] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return True
+        except Exception as e:
+            logger.error(f"Error caching answer: {str(e)}")
+            return False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,64 @@
+import math
+from typing import Any, Iterable
+
+from app.schemas.schemas import MovieInfo, UserPreferencesResponse
+from app.settings import settings
+
+# Fields which only matter to the application, never sent to the LLM
+PRIVATE_PREFERENCE_FIELDS = {"embedding", "embedding_model"}
+MIN_OVERVIEW_CHARS = 40
+
+
+def estimate_tokens(value: Any) -> int:
+    """Rough token count of a tool output as the agent serializes it (str())."""
+    return math.ceil(len(str(value)) / 4)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0].rstrip(",.;:") + "…"
+
+
+def movie_projection(movie: MovieInfo, overview_chars: int) -> dict:
+    """The fields of a movie the agent needs to present it, without nulls."""
+    projection = {
+        "title": movie.title,
+        "year": (movie.release_date or "")[:4] or None,
+        "rating": round(movie.vote_average, 1) if movie.vote_average else None,
+        "genres": movie.genres or None,
+        "overview": (
+            _truncate(movie.overview, overview_chars)
+            if movie.overview and overview_chars > 0
+            else None
+        ),
+    }
+    return {key: value for key, value in projection.items() if value is not None}
+
+
+def compact_movies(
+    movies: Iterable[MovieInfo], token_budget: int = None, overview_chars: int = None
+) -> list[dict]:
+    """
+    Movie projections which fit in `token_budget`: overviews are shortened first,
+    then dropped, then the lowest ranked movies are left out.
+    """
+    token_budget = token_budget or settings.tool_output_token_budget
+    if overview_chars is None:
+        overview_chars = settings.tool_overview_max_chars
+    movies = list(movies)
+    while True:
+        projections = [movie_projection(movie, overview_chars) for movie in movies]
+        if len(movies) <= 1 or estimate_tokens(projections) <= token_budget:
+            return projections
+        if overview_chars > 0:
+            overview_chars //= 2
+            if overview_chars < MIN_OVERVIEW_CHARS:
+                overview_chars = 0
+        else:
+            movies.pop()
+
+
+def compact_preferences(response: UserPreferencesResponse) -> dict:
+    """Preferences as shown to the agent: no embedding and no empty fields."""
+    return response.model_dump(exclude=PRIVATE_PREFERENCE_FIELDS, exclude_none=True)
@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Union
+
+from smolagents import LiteLLMModel
+from smolagents.agents import ToolCallingAgent
+from smolagents.memory import ActionStep
+from smolagents.models import ChatMessage
+
+from app.agent.outputs import estimate_tokens
+from app.clients.cassette import recorded
+from app.clients.deadline import DeadlineExceeded, call_timeout, check
+from app.observability.metrics import (
+    AGENT_RUN_SECONDS,
+    AGENT_RUNS_IN_PROGRESS,
+    AGENT_STEP_PROMPT_TOKENS,
+    AGENT_STEPS_PER_RUN,
+    AGENT_TOOL_CALLS,
+    AGENT_TOOL_CALLS_PER_RUN,
+    AGENT_TOOL_OUTPUT_TOKENS,
+    AGENT_TOOL_SECONDS,
+    LLM_REQUEST_SECONDS,
+    LLM_TOKENS,
+)
+from app.observability.tracing import span
+from app.settings import settings
+
+
+class MovieLiteLLMModel(LiteLLMModel):
+    """
+    LiteLLMModel which reports latency and token usage of every completion and
+    limits each completion to the time left until the request's deadline.
+    """
+
+    def __call__(self, messages: List[Dict[str, str]], **kwargs) -> ChatMessage:
+        budget = call_timeout(None, "llm")
+        if budget is not None:
+            kwargs.setdefault("timeout", budget)
+        with (
+            span("llm.completion", model=self.model_id),
+            LLM_REQUEST_SECONDS.time(model=self.model_id),
+        ):
+            message, input_tokens, output_tokens = self._complete(messages, **kwargs)
+        self.last_input_token_count = input_tokens
+        self.last_output_token_count = output_tokens
+        LLM_TOKENS.inc(self.last_input_token_count or 0, source="agent", kind="prompt")
+        if self.last_input_token_count:
+            AGENT_STEP_PROMPT_TOKENS.observe(self.last_input_token_count)
+        LLM_TOKENS.inc(
+            self.last_output_token_count or 0, source="agent", kind="completion"
+        )
+        return message
+
+    # Prompts hold the memory of earlier runs, so completions are replayed in order
+    @recorded(
+        "llm",
+        key=lambda messages, **kwargs: messages,
+        encode=lambda result: [json.loads(result[0].model_dump_json()), *result[1:]],
+        decode=lambda data: (ChatMessage.from_dict(data[0]), *data[1:]),
+        ordered=True,
+    )
+    def _complete(self, messages: List[Dict[str, str]], **kwargs) -> tuple:
+        """The completion and its input and output token counts."""
+        message = super().__call__(messages, **kwargs)
+        return message, self.last_input_token_count, self.last_output_token_count
+
+
+class MovieAgent(ToolCallingAgent):
+    """
+    ToolCallingAgent which reports steps, tool calls and latency of each run. No step
+    starts after the request's deadline, the run then ends with `deadline_answer`.
+    """
+
+    deadline_answer = (
+        "Sorry, I ran out of time working on this. Please ask me again in a moment."
+    )
+
+    def run(self, task: str, *args, **kwargs):
+        return self.run_with_tools(task, *args, **kwargs)[0]
+
+    def run_with_tools(self, task: str, *args, **kwargs) -> tuple[Any, list[str]]:
+        """
+        Run the agent like `run`.
+
+        Returns:
+            tuple[Any, list[str]]: The answer, and the names of the tools the run
+            called, final_answer excluded
+        """
+        first_step = len(self.memory.steps) if not kwargs.get("reset", True) else 0
+        with (
+            span("agent.run"),
+            AGENT_RUNS_IN_PROGRESS.track_inprogress(),
+            AGENT_RUN_SECONDS.time(),
+        ):
+            try:
+                answer = super().run(task, *args, **kwargs)
+            except DeadlineExceeded:
+                answer = self.deadline_answer
+            finally:
+                tools = self._record_run(self.memory.steps[first_step:])
+        return answer, tools
+
+    def step(self, memory_step: ActionStep) -> Union[None, Any]:
+        check("agent_step")
+        with span("agent.step", step=memory_step.step_number):
+            return super().step(memory_step)
+
+    def execute_tool_call(
+        self, tool_name: str, arguments: Union[Dict[str, str], str]
+    ) -> Any:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with span(f"tool.{tool_name}"):
+                observation = super().execute_tool_call(tool_name, arguments)
+            outcome = "ok"
+            AGENT_TOOL_OUTPUT_TOKENS.observe(
+                estimate_tokens(observation), tool=tool_name
+            )
+            return observation
+        finally:
+            AGENT_TOOL_SECONDS.observe(time.perf_counter() - start, tool=tool_name)
+            AGENT_TOOL_CALLS.inc(tool=tool_name, outcome=outcome)
+
+    def _record_run(self, steps: list) -> list[str]:
+        action_steps = [step for step in steps if isinstance(step, ActionStep)]
+        tools = [
+            tool_call.name
+            for step in action_steps
+            for tool_call in step.tool_calls or []
+            if tool_call.name != "final_answer"
+        ]
+        AGENT_STEPS_PER_RUN.observe(len(action_steps))
+        AGENT_TOOL_CALLS_PER_RUN.observe(len(tools))
+        return tools
+
+
+class AgentSessions:
+    """
+    One agent per user, so every user has their own conversation memory and runs of
+    different users don't wait for each other. The agents of the least recently
+    active users are dropped beyond `max_sessions`, they start over with an empty
+    memory.
+    """
+
+    def __init__(self, factory: Callable[[], MovieAgent], max_sessions: int = None):
+        self.factory = factory
+        self.max_sessions = max_sessions or settings.agent_max_sessions
+        self._lock = threading.Lock()
+        self._sessions: OrderedDict[str, tuple[MovieAgent, threading.Lock]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: str) -> tuple[MovieAgent, threading.Lock]:
+        """The user's agent, and the lock which serializes the user's runs."""
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = self._sessions[user_id] = (self.factory(), threading.Lock())
+            self._sessions.move_to_end(user_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
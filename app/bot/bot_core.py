@@ -2,13 +2,19 @@ import logging
 
 import telebot
 
-from app.agent.agent import agent
+from app.agent.agent import answer_question
+from app.clients.deadline import DeadlineExceeded, request_deadline
 from app.clients.sqlite import sqlite_client
+from app.observability.metrics import TELEGRAM_QUEUE_DEPTH
+from app.observability.profiling import sampling_profile, should_sample
+from app.observability.tracing import start_trace
 from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
 bot = telebot.TeleBot(settings.telegram_bot_token, parse_mode=None)
+if bot.threaded:
+    TELEGRAM_QUEUE_DEPTH.set_function(bot.worker_pool.tasks.qsize)
 
 
 @bot.message_handler(commands=["start", "help"])
@@ -24,6 +30,13 @@ def send_welcome(message):
 def respond_to_message(message):
     user_info = f"User ID: {message.from_user.id}, Message: {message.text}"
     logger.info(f"Processing message: {user_info}")
-    response = agent.run(message.text, reset=False, additional_args={"user_id": message.from_user.id})
-    bot.reply_to(message, response)
-    agent.write_memory_to_messages()
+    with (
+        start_trace("telegram.message", user_id=message.from_user.id) as trace,
+        sampling_profile(trace, enabled=should_sample()),
+    ):
+        try:
+            with request_deadline(settings.request_deadline_seconds):
+                response = answer_question(message.text, message.from_user.id)
+        except DeadlineExceeded:
+            response = "Sorry, I'm busy right now. Please ask me again in a moment."
+        bot.reply_to(message, response)
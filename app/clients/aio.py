@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Coroutine, TypeVar
+
+import httpx
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class IOLoop:
+    """
+    Event loop running in a background thread which owns the pooled async HTTP client.
+
+    All async outbound calls run on this loop, so they share one connection pool and
+    its limits whether they are awaited from the FastAPI loop or started from the
+    synchronous agent tools, the Telegram workers or the scraper thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._http_client: httpx.AsyncClient | None = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="io-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.http_max_connections,
+                        max_keepalive_connections=settings.http_max_keepalive_connections,
+                    ),
+                    timeout=httpx.Timeout(
+                        settings.http_timeout_seconds,
+                        connect=settings.http_connect_timeout_seconds,
+                    ),
+                )
+            return self._http_client
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: float = None) -> T:
+        """Run a coroutine on the I/O loop and wait for it in the calling thread."""
+        if self._in_loop():
+            coro.close()
+            raise RuntimeError("IOLoop.run() would block the I/O loop, await instead")
+        # The task starts with a copy of the caller's context (trace, priority)
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    async def submit(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await a coroutine on the I/O loop from any event loop."""
+        if self._in_loop():
+            return await coro
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(coro, self.loop)
+        )
+
+    def gather(self, *coros: Awaitable[T]) -> list[T]:
+        """Run coroutines concurrently on the I/O loop and block for all results."""
+
+        async def _gather() -> list[T]:
+            return await asyncio.gather(*coros)
+
+        return self.run(_gather())
+
+    def close(self) -> None:
+        with self._lock:
+            loop, client = self._loop, self._http_client
+            self._loop = self._http_client = None
+        if loop is None:
+            return
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(5)
+        loop.close()
+
+
+def on_io_loop(
+    func: Callable[..., Coroutine[Any, Any, T]],
+) -> Callable[..., Coroutine[Any, Any, T]]:
+    """Run the decorated coroutine on the I/O loop, whichever loop awaits it."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs) -> T:
+        return await io_loop.submit(func(*args, **kwargs))
+
+    return wrapper
+
+
+io_loop = IOLoop()
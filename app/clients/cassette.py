@@ -0,0 +1,359 @@
+import asyncio
+import base64
+import builtins
+import functools
+import gzip
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+import numpy as np
+
+from app.clients.deadline import DeadlineExceeded
+from app.observability.tracing import span
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+# Float lists at least this long (embeddings) are stored as base64 float32
+_PACKED_MIN_LENGTH = 8
+
+
+class CassetteMiss(LookupError):
+    """The cassette has no recorded exchange for a request made during replay."""
+
+
+class ReplayedError(RuntimeError):
+    """An upstream error of a type which can't be rebuilt, raised again on replay."""
+
+
+@dataclass
+class Exchange:
+    channel: str
+    key: str
+    seconds: float
+    result: Any = None
+    error: Optional[dict] = None
+    # Arguments of the call, kept for channels replayed by the runner
+    request: Any = None
+
+
+def _pack(value: Any) -> Any:
+    """Replace the float lists in `value` by base64 float32 arrays."""
+    if isinstance(value, list):
+        if len(value) >= _PACKED_MIN_LENGTH and all(
+            isinstance(item, float) for item in value
+        ):
+            data = np.asarray(value, dtype="<f4").tobytes()
+            return {"__f32__": base64.b64encode(data).decode()}
+        return [_pack(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _pack(item) for key, item in value.items()}
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_unpack(item) for item in value]
+    if isinstance(value, dict):
+        if "__f32__" in value:
+            data = base64.b64decode(value["__f32__"])
+            return np.frombuffer(data, dtype="<f4").astype(float).tolist()
+        return {key: _unpack(item) for key, item in value.items()}
+    return value
+
+
+def request_key(*request: Any) -> str:
+    """Stable hash of the request arguments of an exchange."""
+    text = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:20]
+
+
+def _encode_error(error: Exception) -> dict:
+    encoded = {"type": type(error).__name__, "message": str(error)}
+    if isinstance(error, DeadlineExceeded):
+        encoded["operation"] = error.operation
+    return encoded
+
+
+def _decode_error(error: dict) -> Exception:
+    if error["type"] == "DeadlineExceeded":
+        return DeadlineExceeded(error["operation"])
+    error_type = getattr(builtins, error["type"], None)
+    if isinstance(error_type, type) and issubclass(error_type, Exception):
+        return error_type(error["message"])
+    return ReplayedError(f"{error['type']}: {error['message']}")
+
+
+class Cassette:
+    """
+    Outbound exchanges (LLM completions, embeddings, TMDB requests) of a session.
+
+    While recording, every call of a function decorated with @recorded is stored
+    with its result or error and its latency. While replaying, the calls are served
+    from the cassette after sleeping the recorded latency times `latency_scale`.
+    Requests are matched by the hash of their arguments, and channels replayed in
+    order (the LLM, whose prompts change with any change to the tools) fall back to
+    the next unused exchange of the channel when the hash doesn't match.
+    """
+
+    def __init__(self, header: dict = None, latency_scale: float = 1.0):
+        self.header = header or {
+            "version": CASSETTE_VERSION,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "llm_name": settings.llm_name,
+            "embedding_backend": settings.embedding_backend,
+            "embedding_model_name": settings.embedding_model_name,
+        }
+        self.latency_scale = latency_scale
+        self.exchanges: list[Exchange] = []
+        self.recording = header is None
+        self._lock = threading.Lock()
+        self._unused: dict[tuple[str, str], deque[int]] = defaultdict(deque)
+        self._ordered: dict[str, deque[int]] = defaultdict(deque)
+        self._last: dict[tuple[str, str], int] = {}
+        self.stats = {"served": 0, "reused": 0, "out_of_order": 0, "missed": 0}
+
+    def record(self, exchange: Exchange) -> None:
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    def channel(self, channel: str) -> list[Exchange]:
+        return [exchange for exchange in self.exchanges if exchange.channel == channel]
+
+    def _index(self) -> None:
+        for index, exchange in enumerate(self.exchanges):
+            self._unused[exchange.channel, exchange.key].append(index)
+            self._ordered[exchange.channel].append(index)
+
+    def _take(self, index: int) -> Exchange:
+        exchange = self.exchanges[index]
+        self._unused[exchange.channel, exchange.key].remove(index)
+        self._ordered[exchange.channel].remove(index)
+        self._last[exchange.channel, exchange.key] = index
+        return exchange
+
+    def lookup(self, channel: str, key: str, ordered: bool = False) -> Exchange:
+        """
+        The recorded exchange for a request: the first unused one with the same key,
+        else the last used one with the same key, else (for `ordered` channels) the
+        next unused one of the channel.
+        """
+        with self._lock:
+            if self._unused[channel, key]:
+                exchange = self._take(self._unused[channel, key][0])
+            elif (channel, key) in self._last:
+                self.stats["reused"] += 1
+                exchange = self.exchanges[self._last[channel, key]]
+            elif ordered and self._ordered[channel]:
+                self.stats["out_of_order"] += 1
+                exchange = self._take(self._ordered[channel][0])
+            else:
+                self.stats["missed"] += 1
+                exchange = None
+            if exchange is not None:
+                self.stats["served"] += 1
+                return exchange
+        raise CassetteMiss(f"No recorded {channel} exchange for request {key}")
+
+    def save(self, path: str | Path) -> None:
+        """Write the cassette as gzipped JSON lines, the header first."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            exchanges = list(self.exchanges)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(self.header) + "\n")
+            for exchange in exchanges:
+                line = {
+                    "channel": exchange.channel,
+                    "key": exchange.key,
+                    "seconds": round(exchange.seconds, 6),
+                }
+                if exchange.request is not None:
+                    line["request"] = exchange.request
+                if exchange.error is not None:
+                    line["error"] = exchange.error
+                else:
+                    line["result"] = _pack(exchange.result)
+                f.write(json.dumps(line, separators=(",", ":"), default=str) + "\n")
+        logger.info(f"Saved {len(exchanges)} exchanges to cassette {path}")
+
+    @classmethod
+    def load(cls, path: str | Path, latency_scale: float = 1.0) -> "Cassette":
+        """Read a cassette for replay."""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version in {path}")
+            cassette = cls(header, latency_scale)
+            for line in f:
+                data = json.loads(line)
+                cassette.exchanges.append(
+                    Exchange(
+                        channel=data["channel"],
+                        key=data["key"],
+                        seconds=data["seconds"],
+                        result=_unpack(data.get("result")),
+                        error=data.get("error"),
+                        request=data.get("request"),
+                    )
+                )
+        cassette._index()
+        return cassette
+
+
+_active: Optional[Cassette] = None
+
+
+@contextmanager
+def use_cassette(cassette: Cassette) -> Iterator[Cassette]:
+    """Record into, or replay from, `cassette` in the whole process."""
+    global _active
+    previous, _active = _active, cassette
+    try:
+        yield cassette
+    finally:
+        _active = previous
+
+
+def recorded(
+    channel: str,
+    key: Callable[..., Any] = None,
+    encode: Callable[[Any], Any] = None,
+    decode: Callable[[Any], Any] = None,
+    ordered: bool = False,
+    replay: bool = True,
+    keep_request: bool = False,
+) -> Callable:
+    """
+    Decorator recording the calls of an upstream method (sync or async) in the
+    active cassette, or serving them from it. A no-op without an active cassette.
+
+    Args:
+        channel: Name of the upstream, e.g. "llm", "embedding" or "tmdb"
+        key: Request arguments to match on, from the call's arguments without self,
+            defaults to all of them
+        encode: Turns the result into JSON-serializable data
+        decode: Rebuilds the result from the recorded data
+        ordered: Replay the channel in order when the arguments don't match
+        replay: Serve calls from the cassette, otherwise calls always run and are
+            only recorded
+        keep_request: Store the request arguments along with their hash
+    """
+    key = key or (lambda *args, **kwargs: [args, kwargs])
+    encode = encode or (lambda result: result)
+    decode = decode or (lambda data: data)
+
+    def _exchange(
+        cassette: Cassette, args: tuple, kwargs: dict, start: float, result, error
+    ) -> None:
+        request = key(*args, **kwargs)
+        cassette.record(
+            Exchange(
+                channel=channel,
+                key=request_key(request),
+                request=request if keep_request else None,
+                seconds=time.perf_counter() - start,
+                result=None if error else encode(result),
+                error=_encode_error(error) if error else None,
+            )
+        )
+
+    def _replayed(exchange: Exchange):
+        if exchange.error is not None:
+            raise _decode_error(exchange.error)
+        return decode(exchange.result)
+
+    def decorator(func: Callable) -> Callable:
+        # Methods are matched on their arguments without self
+        parameters = list(inspect.signature(func).parameters)
+        skip = 1 if parameters and parameters[0] == "self" else 0
+
+        def request(args: tuple, kwargs: dict) -> str:
+            return request_key(key(*args[skip:], **kwargs))
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cassette = _active
+                if cassette is None:
+                    return await func(*args, **kwargs)
+                if cassette.recording or not replay:
+                    start = time.perf_counter()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        if cassette.recording:
+                            _exchange(cassette, args[skip:], kwargs, start, None, e)
+                        raise
+                    if cassette.recording:
+                        _exchange(cassette, args[skip:], kwargs, start, result, None)
+                    return result
+                exchange = cassette.lookup(channel, request(args, kwargs), ordered)
+                with span(f"replay.{channel}"):
+                    await asyncio.sleep(exchange.seconds * cassette.latency_scale)
+                return _replayed(exchange)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cassette = _active
+            if cassette is None:
+                return func(*args, **kwargs)
+            if cassette.recording or not replay:
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if cassette.recording:
+                        _exchange(cassette, args[skip:], kwargs, start, None, e)
+                    raise
+                if cassette.recording:
+                    _exchange(cassette, args[skip:], kwargs, start, result, None)
+                return result
+            exchange = cassette.lookup(channel, request(args, kwargs), ordered)
+            with span(f"replay.{channel}"):
+                time.sleep(exchange.seconds * cassette.latency_scale)
+            return _replayed(exchange)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def cassette_from_settings() -> Iterator[Optional[Cassette]]:
+    """
+    Record or replay the process' outbound exchanges as set by settings.cassette_mode,
+    a recorded cassette is saved to settings.cassette_path when the block exits.
+    """
+    mode = settings.cassette_mode
+    if mode == "off" or not settings.cassette_path:
+        yield None
+        return
+    if mode == "record":
+        cassette = Cassette()
+    else:
+        cassette = Cassette.load(
+            settings.cassette_path, settings.cassette_latency_scale
+        )
+    logger.info(f"Cassette {mode} mode, {settings.cassette_path}")
+    try:
+        with use_cassette(cassette):
+            yield cassette
+    finally:
+        if mode == "record":
+            cassette.save(settings.cassette_path)
@@ -0,0 +1,78 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.observability.metrics import DEADLINE_EXCEEDED
+
+logger = logging.getLogger(__name__)
+
+# time.monotonic() by which the current request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of time before `operation` could finish."""
+
+    def __init__(self, operation: str):
+        super().__init__(f"Deadline exceeded before {operation} finished")
+        self.operation = operation
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Give the work of the block `seconds` to finish. The deadline follows the context
+    into worker threads and the I/O loop, and a nested deadline never extends the
+    enclosing one. None or 0 leaves the work unbounded.
+    """
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the deadline, None without a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    budget = remaining()
+    return budget is not None and budget <= 0
+
+
+def exceeded(operation: str) -> DeadlineExceeded:
+    """Count a deadline miss of `operation` and return the exception to raise."""
+    DEADLINE_EXCEEDED.inc(operation=operation)
+    logger.warning(f"Deadline exceeded before {operation} finished")
+    return DeadlineExceeded(operation)
+
+
+def check(operation: str) -> None:
+    """Raise DeadlineExceeded if no time is left to start `operation`."""
+    if expired():
+        raise exceeded(operation)
+
+
+def call_timeout(default: Optional[float], operation: str) -> Optional[float]:
+    """
+    Timeout of an outbound call: `default`, or the time left until the deadline when
+    that is shorter. Raises DeadlineExceeded when no time is left.
+    """
+    budget = remaining()
+    if budget is None:
+        return default
+    if budget <= 0:
+        raise exceeded(operation)
+    return budget if default is None else min(default, budget)
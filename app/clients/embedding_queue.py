@@ -0,0 +1,240 @@
+"""
+Background embedding of scraped movies.
+
+Usage:
+    python -m app.clients.embedding_queue stats [--db movies_recommender.db]
+    python -m app.clients.embedding_queue requeue-dead [--db movies_recommender.db]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Optional
+
+from app.clients.rate_limiter import background_priority
+from app.clients.sqlite import SQLiteClient, sqlite_client
+from app.observability.metrics import (
+    EMBEDDING_BATCH_SECONDS,
+    EMBEDDING_JOBS,
+    EMBEDDING_QUEUE_DEPTH,
+    EMBEDDING_QUEUE_LAG_SECONDS,
+)
+from app.observability.tracing import span, start_trace
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingWorkerPool:
+    """
+    Threads draining the persistent embedding_jobs queue of a SQLiteClient.
+
+    Each worker claims a batch of due jobs, embeds their overviews with one
+    embed_batch call and stores the vectors. When a batch fails its jobs are embedded
+    one by one, so a single bad overview only fails its own job. Failed jobs are
+    retried with exponential backoff and dead-lettered after `max_attempts`. Jobs are
+    leased, a job claimed by a worker which died is picked up again after
+    `lease_seconds`. The vector index is exported again whenever the queue drains.
+    """
+
+    def __init__(
+        self,
+        client: SQLiteClient,
+        workers: int = None,
+        batch_size: int = None,
+        max_attempts: int = None,
+        retry_base_seconds: float = None,
+        retry_max_seconds: float = None,
+        lease_seconds: float = None,
+        poll_seconds: float = None,
+    ):
+        self.client = client
+        self.workers = workers or settings.embedding_workers
+        self.batch_size = batch_size or settings.embedding_batch_size
+        self.max_attempts = max_attempts or settings.embedding_max_attempts
+        self.retry_base_seconds = (
+            retry_base_seconds
+            if retry_base_seconds is not None
+            else settings.embedding_retry_base_seconds
+        )
+        self.retry_max_seconds = (
+            retry_max_seconds or settings.embedding_retry_max_seconds
+        )
+        self.lease_seconds = lease_seconds or settings.embedding_job_lease_seconds
+        self.poll_seconds = poll_seconds or settings.embedding_queue_poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._export_lock = threading.Lock()
+        self._dirty = False
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(
+            self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1)
+        )
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(
+                target=self._run, name=f"embedding-worker-{index}", daemon=True
+            )
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """Wake the workers, e.g. after movies were queued."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        with background_priority():
+            while not self._stop.is_set():
+                try:
+                    processed = self.process_batch()
+                except Exception as e:
+                    logger.error(f"Error in embedding worker: {str(e)}")
+                    processed = 0
+                if not processed:
+                    self._export_if_drained()
+                    self._wake.wait(self.poll_seconds)
+                    self._wake.clear()
+
+    def process_batch(self) -> int:
+        """
+        Claim and embed one batch of due jobs.
+
+        Returns:
+            int: Number of jobs claimed
+        """
+        jobs = self.client.claim_embedding_jobs(self.batch_size, self.lease_seconds)
+        if not jobs:
+            return 0
+        with (
+            start_trace("embedding.batch", size=len(jobs)),
+            EMBEDDING_BATCH_SECONDS.time(),
+        ):
+            backend = self.client.embedding_backend
+            try:
+                embeddings = backend.embed_batch([text for _, text, _ in jobs])
+                if len(embeddings) != len(jobs):
+                    raise ValueError(
+                        f"Got {len(embeddings)} embeddings for {len(jobs)} texts"
+                    )
+                self._complete(
+                    [(job[0], embedding) for job, embedding in zip(jobs, embeddings)]
+                )
+            except Exception as e:
+                if len(jobs) == 1:
+                    self._fail(jobs, e)
+                    return 1
+                logger.warning(
+                    f"Embedding batch of {len(jobs)} failed, embedding one by one: "
+                    f"{str(e)}"
+                )
+                for job in jobs:
+                    try:
+                        with span("embedding.single", movie_id=job[0]):
+                            self._complete([(job[0], backend.embed(job[1]))])
+                    except Exception as error:
+                        self._fail([job], error)
+        return len(jobs)
+
+    def _complete(self, embeddings: list[tuple[int, list[float]]]) -> None:
+        stored = self.client.complete_embedding_jobs(embeddings)
+        if stored:
+            self._dirty = True
+            EMBEDDING_JOBS.inc(stored, outcome="embedded")
+
+    def _fail(self, jobs: list[tuple[int, str, int]], error: Exception) -> None:
+        logger.error(f"Error embedding movies {[job[0] for job in jobs]}: {str(error)}")
+        dead = self.client.fail_embedding_jobs(
+            [(movie_id, attempts) for movie_id, _, attempts in jobs],
+            str(error)[:500],
+            self.max_attempts,
+            self.retry_delay,
+        )
+        if dead:
+            EMBEDDING_JOBS.inc(dead, outcome="dead")
+        if len(jobs) > dead:
+            EMBEDDING_JOBS.inc(len(jobs) - dead, outcome="retried")
+
+    def _export_if_drained(self) -> None:
+        """
+        Publish the vectors embedded since the last export, and the genre and decade
+        centroids computed from them, once the queue is idle.
+        """
+        if not self._dirty or not self._export_lock.acquire(blocking=False):
+            return
+        try:
+            stats = self.client.embedding_queue_stats()
+            if self._dirty and not stats["queued"] and not stats["running"]:
+                self._dirty = False
+                self.client.export_vector_index()
+                self.client.compute_centroids()
+        finally:
+            self._export_lock.release()
+
+    def drain(self, timeout: Optional[float] = None) -> int:
+        """
+        Process due jobs in the calling thread until none is left.
+
+        Returns:
+            int: Number of jobs processed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        processed = 0
+        while deadline is None or time.monotonic() < deadline:
+            batch = self.process_batch()
+            if not batch:
+                break
+            processed += batch
+        self._export_if_drained()
+        return processed
+
+
+embedding_workers = EmbeddingWorkerPool(sqlite_client)
+
+for _status in ("queued", "running", "dead"):
+    EMBEDDING_QUEUE_DEPTH.set_function(
+        lambda status=_status: embedding_workers.client.embedding_queue_stats()[status],
+        status=_status,
+    )
+EMBEDDING_QUEUE_LAG_SECONDS.set_function(
+    lambda: embedding_workers.client.embedding_queue_stats()["lag_seconds"]
+)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=["stats", "requeue-dead"])
+    parser.add_argument("--db", help="SQLite database, defaults to SQLITE_DB_PATH")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    client = SQLiteClient(db_path=args.db) if args.db else sqlite_client
+    if args.command == "requeue-dead":
+        # The running workers pick the jobs up on their next poll
+        count = client.requeue_dead_embedding_jobs()
+        sys.stdout.write(f"Queued {count} dead embedding jobs again\n")
+    sys.stdout.write(json.dumps(client.embedding_queue_stats()) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,14 @@
-from openai import InternalServerError, OpenAI, RateLimitError
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+from openai import (
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
 from openai.types.chat import (
     ChatCompletionMessageParam,
     ChatCompletionSystemMessageParam,
@@ -12,6 +22,17 @@ from tenacity import (
     wait_exponential,
 )
 
+from app.clients.aio import io_loop, on_io_loop
+from app.clients.cassette import recorded
+from app.clients.deadline import call_timeout, exceeded, expired
+from app.clients.rate_limiter import embedding_limiter, parse_retry_after
+from app.clients.singleflight import embedding_flight
+from app.observability.metrics import (
+    LLM_TOKENS,
+    OPENAI_REQUEST_ERRORS,
+    OPENAI_REQUEST_SECONDS,
+)
+from app.observability.tracing import span
 from app.settings import settings
 
 USER_ROLE = "user"
@@ -22,21 +43,79 @@ SYSTEM_PROMPT = (
     "Answer short and concise."
 )
 
+_retry_upstream = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(exp_base=1.5, multiplier=1),
+    retry=retry_if_exception_type(RateLimitError)
+    | retry_if_exception_type(InternalServerError),
+    reraise=True,
+)
+
+
+@contextmanager
+def _request_errors(operation: str, upstream: str, **attributes) -> Iterator[None]:
+    """
+    Time a request to the API and count its errors, a timeout after the request's
+    deadline is raised as DeadlineExceeded.
+    """
+    try:
+        with (
+            span("http.openai", operation=operation, **attributes),
+            OPENAI_REQUEST_SECONDS.time(operation=operation),
+        ):
+            yield
+    except APITimeoutError as e:
+        OPENAI_REQUEST_ERRORS.inc(operation=operation)
+        if expired():
+            raise exceeded(upstream) from e
+        raise
+    except Exception:
+        OPENAI_REQUEST_ERRORS.inc(operation=operation)
+        raise
+
+
+@contextmanager
+def _embedding_request(operation: str, slot, **attributes) -> Iterator[None]:
+    """_request_errors of an embedding request, a 429 throttles the limiter `slot`."""
+    try:
+        with _request_errors(operation, "embedding", **attributes):
+            yield
+    except RateLimitError as e:
+        slot.mark_throttled(parse_retry_after(e.response.headers.get("retry-after")))
+        raise
+
+
+def _count_embedding_tokens(response) -> None:
+    if response.usage:
+        LLM_TOKENS.inc(response.usage.prompt_tokens, source="embedding", kind="prompt")
+
 
 class OpenAIClient:
-    def __init__(self):
+    def __init__(
+        self,
+        http_client: httpx.Client = None,
+        async_http_client: httpx.AsyncClient = None,
+    ):
+        # Retries are left to tenacity, which goes through the limiter and stops at
+        # the request's deadline, the SDK would retry on its own
         self.client = OpenAI(
             base_url=f"{str(settings.llm_host)}",  # pydantic adds trailing slash
             api_key=settings.llm_api_key,  # required, but unused
+            timeout=settings.http_timeout_seconds,
+            max_retries=0,
+            http_client=http_client,
+        )
+        # Shares the pooled connections and limits of the I/O loop's HTTP client
+        self.async_client = AsyncOpenAI(
+            base_url=f"{str(settings.llm_host)}",
+            api_key=settings.llm_api_key,
+            max_retries=0,
+            http_client=async_http_client or io_loop.http_client,
         )
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(exp_base=1.5, multiplier=1),
-        retry=retry_if_exception_type(RateLimitError)
-        | retry_if_exception_type(InternalServerError),
-        reraise=True,
-    )
+    @on_io_loop
+    @recorded("chat")
+    @_retry_upstream
     async def generate_response(self, question: str) -> str:
         system_prompt = ChatCompletionSystemMessageParam(
             role=SYSTEM_ROLE, content=SYSTEM_PROMPT
@@ -44,16 +123,74 @@ class OpenAIClient:
         message: ChatCompletionMessageParam = ChatCompletionUserMessageParam(
             role=USER_ROLE, content=question
         )
-        response: ChatCompletion = await self.client.chat.completions.create(
-            model=settings.llm_name,
-            messages=[system_prompt, message],
-        )
+        with _request_errors("chat", "llm"):
+            response: ChatCompletion = await self.async_client.chat.completions.create(
+                model=settings.llm_name,
+                messages=[system_prompt, message],
+                timeout=call_timeout(settings.http_timeout_seconds, "llm"),
+            )
+        if response.usage:
+            LLM_TOKENS.inc(response.usage.prompt_tokens, source="chat", kind="prompt")
+            LLM_TOKENS.inc(
+                response.usage.completion_tokens, source="chat", kind="completion"
+            )
         return response.choices[0].message.content
 
     def get_embedding(self, text: str) -> list[float]:
-        response: ChatCompletion = self.client.embeddings.create(
-            model=settings.embedding_model_name, input=text
+        # identical texts embedded concurrently share one request
+        return embedding_flight.do(
+            (settings.embedding_model_name, text), lambda: self._embed(text)
         )
+
+    @recorded("embedding")
+    @_retry_upstream
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """Embed a batch of texts with one request, in the order of `texts`."""
+        with (
+            embedding_limiter.slot() as slot,
+            _embedding_request("embedding_batch", slot, size=len(texts)),
+        ):
+            response = self.client.embeddings.create(
+                model=settings.embedding_model_name,
+                input=texts,
+                timeout=call_timeout(settings.http_timeout_seconds, "embedding"),
+            )
+        _count_embedding_tokens(response)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    @on_io_loop
+    async def aget_embedding(self, text: str) -> list[float]:
+        return await embedding_flight.ado(
+            (settings.embedding_model_name, text), lambda: self._aembed(text)
+        )
+
+    @recorded("embedding")
+    @_retry_upstream
+    def _embed(self, text: str) -> list[float]:
+        # every retry goes through the shared limiter, which backs off after a 429
+        with (
+            embedding_limiter.slot() as slot,
+            _embedding_request("embedding", slot),
+        ):
+            response = self.client.embeddings.create(
+                model=settings.embedding_model_name,
+                input=text,
+                timeout=call_timeout(settings.http_timeout_seconds, "embedding"),
+            )
+        _count_embedding_tokens(response)
+        return response.data[0].embedding
+
+    @recorded("embedding")
+    @_retry_upstream
+    async def _aembed(self, text: str) -> list[float]:
+        async with embedding_limiter.aslot() as slot:
+            with _embedding_request("embedding", slot):
+                response = await self.async_client.embeddings.create(
+                    model=settings.embedding_model_name,
+                    input=text,
+                    timeout=call_timeout(settings.http_timeout_seconds, "embedding"),
+                )
+        _count_embedding_tokens(response)
         return response.data[0].embedding
 
 
@@ -0,0 +1,273 @@
+import asyncio
+import contextvars
+import enum
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+from app.clients.deadline import exceeded, remaining
+from app.observability.metrics import (
+    UPSTREAM_CONCURRENCY_LIMIT,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_LIMITER_WAIT_SECONDS,
+    UPSTREAM_THROTTLED,
+)
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "upstream_priority", default=Priority.INTERACTIVE
+)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Run upstream calls made in the block behind interactive traffic."""
+    token = _priority.set(Priority.BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Slot:
+    """Handle returned by UpstreamLimiter.slot() to report how the call went."""
+
+    def __init__(self):
+        self.throttled = False
+        self.retry_after: float | None = None
+
+    def mark_throttled(self, retry_after: float | None = None) -> None:
+        self.throttled = True
+        self.retry_after = retry_after
+
+
+class UpstreamLimiter:
+    """
+    Process-wide token bucket with adaptive concurrency for one upstream API.
+
+    Interactive calls are always admitted before waiting background calls, and
+    background calls may only use `background_share` of the concurrency limit so a
+    scrape can't starve user requests. The concurrency limit follows AIMD: it is
+    halved on a 429 (and the bucket pauses for Retry-After), shrinks slowly while
+    latency is above `target_latency` and grows back by one slot per window otherwise.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int = None,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        target_latency: float = 2.0,
+        background_share: float = 0.5,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.background_share = background_share
+
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiting = {priority: 0 for priority in Priority}
+        self._blocked_until = 0.0
+        UPSTREAM_CONCURRENCY_LIMIT.set_function(lambda: self.limit, upstream=name)
+        UPSTREAM_IN_FLIGHT.set_function(lambda: self._in_flight, upstream=name)
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_time(self, priority: Priority, now: float) -> float | None:
+        """0 if a call may start now, else seconds to wait (None: until notified)."""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if priority > Priority.INTERACTIVE and self._waiting[Priority.INTERACTIVE]:
+            return None
+        capacity = self.limit
+        if priority == Priority.BACKGROUND:
+            capacity = max(1, int(capacity * self.background_share))
+        if self._in_flight >= capacity:
+            return None
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0
+
+    @staticmethod
+    def _wait_budget(timeout: float | None) -> tuple[float | None, bool]:
+        """The time a call may wait for a slot and whether the deadline limits it."""
+        budget = remaining()
+        if budget is not None and (timeout is None or budget < timeout):
+            return max(budget, 0.0), True
+        return timeout, False
+
+    def _timed_out(self, by_deadline: bool) -> TimeoutError:
+        if by_deadline:
+            return exceeded(f"{self.name}_limiter")
+        return TimeoutError(f"Timed out waiting for the {self.name} rate limiter")
+
+    def acquire(self, priority: Priority = None, timeout: float = None) -> None:
+        """
+        Block until a call may start, raise TimeoutError after `timeout` seconds or
+        DeadlineExceeded when the request's deadline passes first.
+        """
+        priority = current_priority() if priority is None else priority
+        timeout, by_deadline = self._wait_budget(timeout)
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(priority, now)
+                    if wait == 0:
+                        self._tokens -= 1
+                        self._in_flight += 1
+                        break
+                    # Re-check periodically, tokens refill without a notification
+                    wait = 0.1 if wait is None else min(wait, 0.1)
+                    if timeout is not None:
+                        left = timeout - (now - start)
+                        if left <= 0:
+                            raise self._timed_out(by_deadline)
+                        wait = min(wait, left)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+        UPSTREAM_LIMITER_WAIT_SECONDS.observe(
+            time.monotonic() - start, upstream=self.name, priority=priority.name.lower()
+        )
+
+    async def acquire_async(
+        self, priority: Priority = None, timeout: float = None
+    ) -> None:
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking."""
+        priority = current_priority() if priority is None else priority
+        timeout, by_deadline = self._wait_budget(timeout)
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(priority, now)
+                    if wait == 0:
+                        self._tokens -= 1
+                        self._in_flight += 1
+                        break
+                # Slots are freed by other threads, poll instead of being notified
+                wait = 0.01 if wait is None else min(wait, 0.1)
+                if timeout is not None:
+                    left = timeout - (now - start)
+                    if left <= 0:
+                        raise self._timed_out(by_deadline)
+                    wait = min(wait, left)
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+        UPSTREAM_LIMITER_WAIT_SECONDS.observe(
+            time.monotonic() - start, upstream=self.name, priority=priority.name.lower()
+        )
+
+    def release(
+        self, latency: float, throttled: bool = False, retry_after: float = None
+    ) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._limit = max(self.min_concurrency, self._limit / 2)
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + (retry_after or 1.0)
+                )
+                UPSTREAM_THROTTLED.inc(upstream=self.name)
+                logger.warning(
+                    f"{self.name} throttled, concurrency limit lowered to {self.limit}"
+                )
+            elif latency > self.target_latency:
+                self._limit = max(self.min_concurrency, self._limit * 0.9)
+            else:
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: Priority = None, timeout: float = None) -> Iterator[Slot]:
+        """Hold a slot for one upstream call, report 429s via Slot.mark_throttled()."""
+        self.acquire(priority, timeout)
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        finally:
+            self.release(time.monotonic() - start, slot.throttled, slot.retry_after)
+
+    @asynccontextmanager
+    async def aslot(
+        self, priority: Priority = None, timeout: float = None
+    ) -> AsyncIterator[Slot]:
+        """slot() for coroutines."""
+        await self.acquire_async(priority, timeout)
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        finally:
+            self.release(time.monotonic() - start, slot.throttled, slot.retry_after)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            return {
+                "concurrency_limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": {p.name.lower(): n for p, n in self._waiting.items()},
+                "throttled_for": round(max(0.0, self._blocked_until - now), 3),
+            }
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+tmdb_limiter = UpstreamLimiter(
+    "tmdb",
+    rate=settings.tmdb_rate_limit,
+    max_concurrency=settings.tmdb_max_concurrency,
+)
+embedding_limiter = UpstreamLimiter(
+    "embeddings",
+    rate=settings.embedding_rate_limit,
+    max_concurrency=settings.embedding_max_concurrency,
+)
@@ -3,8 +3,21 @@ import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from app.bot.bot_core import bot
+from app.clients.aio import io_loop
+from app.clients.embedding_queue import embedding_workers
+from app.clients.rate_limiter import background_priority
 from app.clients.sqlite import sqlite_client
 from app.clients.tmdb import tmdb_client
+from app.observability.health import scrape_status
+from app.observability.metrics import (
+    CATALOG_MOVIES_PRUNED,
+    DATABASE_BYTES_RECLAIMED,
+    DATABASE_SIZE_BYTES,
+    SCRAPER_MOVIES_INGESTED,
+    SCRAPER_RUN_SECONDS,
+)
+from app.observability.tracing import start_trace
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
@@ -12,15 +25,58 @@ logger = logging.getLogger(__name__)
 def scrape_trending_movies(pages: int = 20):
     logger.info("Scraping trending movies")
     print("Scraping trending movies")
-    for page in range(1, pages + 1):
-        trending_movies = tmdb_client.get_trending_movies(page=page)
-        for movie in trending_movies.trending_movies:
-            genres = tmdb_client.get_movie_genres(movie)
-            sqlite_client.insert_movie(movie, genres)
+    with (
+        start_trace("scraper.trending", pages=pages),
+        background_priority(),
+        SCRAPER_RUN_SECONDS.time(),
+        scrape_status.track(),
+    ):
+        # Movies embedded by a previously configured backend
+        sqlite_client.reembed_movies()
+        # Movies stored before EMBEDDING_QUANTIZATION changed, searches quantize
+        # them on the fly and skip the index until it is exported in the new format
+        if sqlite_client.backfill_quantized_embeddings():
+            sqlite_client.export_vector_index()
+        # Fetch all pages concurrently, the limiter keeps them behind user requests
+        trending_pages = io_loop.gather(
+            *(
+                tmdb_client.aget_trending_movies(page=page)
+                for page in range(1, pages + 1)
+            )
+        )
+        for trending_movies in trending_pages:
+            for movie in trending_movies.trending_movies:
+                genres = tmdb_client.get_movie_genres(movie)
+                # Stored right away, the embedding workers embed it in the background
+                if sqlite_client.insert_movie(movie, genres, refresh=True):
+                    SCRAPER_MOVIES_INGESTED.inc()
+        # The workers publish the index and centroids once they embedded these
+        embedding_workers.notify()
+
+
+def maintain_catalog():
+    """Prune stale movies, then compact the database and refresh its statistics."""
+    with start_trace("maintenance.catalog"), background_priority():
+        pruned = sqlite_client.prune_catalog() or {}
+        for reason, count in pruned.items():
+            CATALOG_MOVIES_PRUNED.inc(count, reason=reason)
+        compacted = sqlite_client.compact_database()
+        if compacted:
+            DATABASE_BYTES_RECLAIMED.inc(compacted["reclaimed_bytes"])
+            DATABASE_SIZE_BYTES.set(compacted["size_bytes"])
+        logger.info(
+            f"Catalog maintenance pruned {sum(pruned.values())} movies {pruned}, "
+            f"reclaimed {(compacted or {}).get('reclaimed_bytes', 0)} bytes"
+        )
+        return pruned, compacted
 
 
 scheduler = BackgroundScheduler()
 # scrape immediately when the app starts
 scheduler.add_job(scrape_trending_movies, "date", run_date=None)
 scheduler.add_job(scrape_trending_movies, "interval", days=1)
-scheduler.add_job(bot.infinity_polling, "date", run_date=None)
+scheduler.add_job(
+    maintain_catalog, "interval", hours=settings.catalog_maintenance_interval_hours
+)
+if settings.run_telegram_bot:
+    scheduler.add_job(bot.infinity_polling, "date", run_date=None)
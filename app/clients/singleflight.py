@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from app.clients.deadline import DeadlineExceeded, exceeded, expired, remaining
+from app.observability.metrics import UPSTREAM_CALLS, UPSTREAM_COALESCED
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent upstream calls.
+
+    The first caller for a key runs the call, callers arriving with the same key while
+    it is in flight wait for it and get its result or exception instead of issuing
+    their own request. Sync callers (threads) and async callers share the in-flight
+    calls, so a search started by a Telegram worker is joined by the same search from
+    an agent tool on the I/O loop. Nothing is cached once the call finished, and
+    results are shared between callers, so they must not be mutated. Waiters stop
+    waiting at their own deadline, and run the call themselves when it failed because
+    the caller which started it ran out of time.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            UPSTREAM_CALLS.inc(upstream=self.name)
+        else:
+            UPSTREAM_COALESCED.inc(upstream=self.name)
+        return future, leader
+
+    def _finish(self, key: Hashable, future: Future, result: Any, error: BaseException):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, call: Callable[[], T]) -> T:
+        """Run `call`, or wait for the identical call already in flight."""
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                return future.result(remaining())
+            except DeadlineExceeded:
+                if expired():
+                    raise
+                return self.do(key, call)
+            except TimeoutError:
+                if future.done():
+                    raise
+                raise exceeded(self.name)
+        try:
+            result = call()
+        except BaseException as e:
+            self._finish(key, future, None, e)
+            raise
+        self._finish(key, future, result, None)
+        return result
+
+    async def ado(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Await `call()`, or the identical call already in flight."""
+        future, leader = self._join(key)
+        if leader:
+            # Runs as a task, so the waiters still get a result when the caller that
+            # started it is cancelled
+            task = asyncio.ensure_future(call())
+
+            def done(task: asyncio.Task) -> None:
+                if task.cancelled():
+                    self._finish(key, future, None, asyncio.CancelledError())
+                elif task.exception() is not None:
+                    self._finish(key, future, None, task.exception())
+                else:
+                    self._finish(key, future, task.result(), None)
+
+            task.add_done_callback(done)
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), remaining()
+            )
+        except DeadlineExceeded:
+            if expired():
+                raise
+            return await self.ado(key, call)
+        except TimeoutError:
+            if future.done():
+                raise
+            raise exceeded(self.name)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+            }
+
+
+tmdb_flight = SingleFlight("tmdb")
+embedding_flight = SingleFlight("embeddings")
@@ -1,29 +1,91 @@
+import hashlib
 import json
 import logging
+import re
 import sqlite3
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import numpy as np
 
-from app.agent.agent import PreferenceData
-from app.clients.openai import openai_client
-from app.schemas.schemas import MovieInfo
+from app.clients.titles import normalize_title
+from app.observability.metrics import (
+    CENTROID_QUERIES,
+    SQLITE_QUERY_SECONDS,
+    VECTOR_SEARCH_CANDIDATES,
+    VECTOR_SEARCH_SECONDS,
+    timed,
+)
+from app.observability.tracing import span, traced
+from app.schemas.schemas import MovieInfo, PreferenceData
+from app.settings import settings
+from app.vectors.embeddings import EmbeddingBackend, embedding_backend
+from app.vectors.index import IndexSnapshot, VectorIndex
+from app.vectors.quantization import QUANTIZATION_DTYPES, cosine_scores, quantize
+from app.vectors.snapshot import (
+    MOVIE_COLUMNS,
+    CatalogSnapshot,
+    json_vectors,
+    now,
+    read_snapshot,
+    write_snapshot,
+)
 
 logger = logging.getLogger(__name__)
 
+# Words of a request which say nothing about the movie it asks for
+_QUERY_STOPWORDS = frozenset(
+    "a about an and any are as at be but by can film films for from give i in is it "
+    "like me movie movies my of on or please recommend show some something suggest "
+    "that the to want watch with".split()
+)
+# BM25 weights of the title and overview columns of movie_fts
+_FTS_WEIGHTS = (2.0, 1.0)
+
 
 class SQLiteClient:
     """Client for interacting with SQLite database to store user film preferences."""
 
-    def __init__(self, db_path: str = "movies_recommender.db"):
+    def __init__(
+        self,
+        db_path: str = "movies_recommender.db",
+        quantization: str = None,
+        rerank_factor: int = None,
+        vector_index_dir: str = None,
+        backend: EmbeddingBackend = None,
+    ):
         """
         Initialize the SQLite client.
 
         Args:
             db_path: Path to the SQLite database file
+            quantization: Format of the stored and scored catalog vectors ("none",
+                "float16" or "int8"), defaults to settings.embedding_quantization
+            rerank_factor: With quantization, `limit * rerank_factor` candidates are
+                re-ranked at full precision, defaults to
+                settings.embedding_rerank_factor
+            vector_index_dir: Directory of the memory-mapped vector index, defaults to
+                settings.vector_index_dir or "<database name>.vectors" next to the
+                database. Unused when settings.vector_index_enabled is false
+            backend: Embedding backend of movies and preferences, defaults to the one
+                selected by settings.embedding_backend
         """
         self.db_path = db_path
+        self.quantization = quantization or settings.embedding_quantization
+        if self.quantization not in QUANTIZATION_DTYPES:
+            raise ValueError(f"Unknown embedding quantization: {self.quantization}")
+        self.rerank_factor = rerank_factor or settings.embedding_rerank_factor
+        self.embedding_backend = backend or embedding_backend
+        self.vector_index = None
+        if settings.vector_index_enabled:
+            self.vector_index = VectorIndex(
+                vector_index_dir
+                or settings.vector_index_dir
+                or Path(db_path).with_suffix(".vectors")
+            )
+        # Genre and decade centroids of the catalog, by embedding model
+        self._centroids: Dict[str, tuple[Optional[float], Dict[tuple, Any]]] = {}
         # Flag to track if tables need to be recreated
         self.tables_dropped = False
         self._initialize_db()
@@ -45,6 +107,10 @@ class SQLiteClient:
             conn = self._get_connection()
             cursor = conn.cursor()
 
+            # Lets compact_database return the pages of pruned movies to the file
+            # system, only takes effect before the first table of a new database
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
             cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -75,7 +141,7 @@ class SQLiteClient:
             CREATE TABLE IF NOT EXISTS movie_embeddings (
                 id INTEGER PRIMARY KEY,
                 title TEXT NOT NULL,
-                embedding TEXT NOT NULL,
+                embedding TEXT,
                 genre_ids TEXT,
                 overview TEXT,
                 poster_path TEXT,
@@ -86,6 +152,138 @@ class SQLiteClient:
             )
             """)
 
+            # Columns added after the tables were first released
+            for table, column, column_type in (
+                ("movie_embeddings", "embedding_q", "BLOB"),
+                ("movie_embeddings", "embedding_scale", "REAL"),
+                ("movie_embeddings", "embedding_format", "TEXT"),
+                ("movie_embeddings", "embedding_dim", "INTEGER"),
+                ("movie_embeddings", "embedding_model", "TEXT"),
+                ("movie_embeddings", "embedding_status", "TEXT"),
+                ("movie_embeddings", "last_seen_at", "REAL"),
+                ("preferences", "embedding_dim", "INTEGER"),
+                ("preferences", "embedding_model", "TEXT"),
+            ):
+                columns = {
+                    row[1] for row in cursor.execute(f"PRAGMA table_info({table})")
+                }
+                if column in columns:
+                    continue
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                if column == "embedding_model":
+                    # Vectors stored before backends were recorded came from the API
+                    cursor.execute(
+                        f"""
+                        UPDATE {table}
+                        SET embedding_model = ?,
+                            embedding_dim = json_array_length(embedding)
+                        WHERE embedding IS NOT NULL
+                        """,
+                        (f"openai:{settings.embedding_model_name}",),
+                    )
+                elif column == "embedding_status":
+                    cursor.execute(
+                        f"""
+                        UPDATE {table} SET embedding_status = 'ready'
+                        WHERE embedding IS NOT NULL
+                        """
+                    )
+
+            # Movies are stored before they are embedded, so embedding is nullable
+            if any(
+                row[1] == "embedding" and row[3]
+                for row in cursor.execute("PRAGMA table_info(movie_embeddings)")
+            ):
+                self._drop_not_null(cursor, "movie_embeddings", "embedding")
+
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_jobs (
+                movie_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                enqueued_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                locked_until REAL,
+                last_error TEXT
+            )
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS embedding_jobs_due
+            ON embedding_jobs (status, next_attempt_at)
+            """)
+
+            # Normalized titles and the titles users searched for, by movie
+            title_index_exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'movie_titles'"
+            ).fetchone()
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS movie_titles (
+                normalized_title TEXT NOT NULL,
+                movie_id INTEGER NOT NULL,
+                PRIMARY KEY (normalized_title, movie_id)
+            ) WITHOUT ROWID
+            """)
+            if not title_index_exists:
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO movie_titles VALUES (?, ?)",
+                    [
+                        (normalize_title(title)[0], movie_id)
+                        for movie_id, title in cursor.execute(
+                            "SELECT id, title FROM movie_embeddings"
+                        ).fetchall()
+                    ],
+                )
+
+            # Mean catalog vector of each genre and decade, by embedding model
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_centroids (
+                embedding_model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                movie_count INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (embedding_model, kind, name)
+            )
+            """)
+
+            # Full-text index of titles and overviews, kept in sync by triggers
+            fts_exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'movie_fts'"
+            ).fetchone()
+            cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS movie_fts USING fts5(
+                title, overview,
+                content = 'movie_embeddings', content_rowid = 'id',
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )
+            """)
+            cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS movie_fts_insert
+            AFTER INSERT ON movie_embeddings BEGIN
+                INSERT INTO movie_fts (rowid, title, overview)
+                VALUES (new.id, new.title, new.overview);
+            END
+            """)
+            cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS movie_fts_delete
+            AFTER DELETE ON movie_embeddings BEGIN
+                INSERT INTO movie_fts (movie_fts, rowid, title, overview)
+                VALUES ('delete', old.id, old.title, old.overview);
+            END
+            """)
+            cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS movie_fts_update
+            AFTER UPDATE OF title, overview ON movie_embeddings BEGIN
+                INSERT INTO movie_fts (movie_fts, rowid, title, overview)
+                VALUES ('delete', old.id, old.title, old.overview);
+                INSERT INTO movie_fts (rowid, title, overview)
+                VALUES (new.id, new.title, new.overview);
+            END
+            """)
+            if not fts_exists:
+                cursor.execute("INSERT INTO movie_fts (movie_fts) VALUES ('rebuild')")
+
             # Add default user with user_id 1 if it doesn't exist
             cursor.execute("SELECT id FROM users WHERE user_id = '1'")
             if cursor.fetchone() is None:
@@ -97,6 +295,31 @@ class SQLiteClient:
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
 
+    @staticmethod
+    def _drop_not_null(cursor: sqlite3.Cursor, table: str, column: str) -> None:
+        """Rebuild `table` without the NOT NULL constraint of `column`."""
+        definitions = []
+        for _, name, column_type, notnull, default, pk in cursor.execute(
+            f"PRAGMA table_info({table})"
+        ).fetchall():
+            definition = f"{name} {column_type}"
+            if pk:
+                definition += " PRIMARY KEY"
+            if notnull and name != column:
+                definition += " NOT NULL"
+            if default is not None:
+                definition += f" DEFAULT {default}"
+            definitions.append(definition)
+        columns = ", ".join(definition.split()[0] for definition in definitions)
+        cursor.execute(f"CREATE TABLE {table}_rebuilt ({', '.join(definitions)})")
+        cursor.execute(
+            f"INSERT INTO {table}_rebuilt ({columns}) SELECT {columns} FROM {table}"
+        )
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_rebuilt RENAME TO {table}")
+
+    @timed(SQLITE_QUERY_SECONDS, operation="create_user")
+    @traced("db.create_user")
     def create_user(self, user_id: str) -> bool:
         """
         Create a new user if it doesn't exist.
@@ -124,12 +347,15 @@ class SQLiteClient:
             logger.error(f"Error creating user: {str(e)}")
             return False
 
+    @timed(SQLITE_QUERY_SECONDS, operation="update_preferences")
+    @traced("db.update_preferences")
     def update_preferences(
         self,
         user_id: str,
         preferences: PreferenceData,
         preference_text: str,
         embedding: Optional[List[float]] = None,
+        embedding_model: str = None,
     ) -> bool:
         """
         Update user preferences.
@@ -138,6 +364,8 @@ class SQLiteClient:
             user_id: Unique identifier for the user
             preferences: Dictionary containing preference data
             embedding: Optional embedding vector for the preferences
+            embedding_model: Backend which produced the embedding, defaults to the
+                client's embedding backend
 
         Returns:
             bool: True if successful, False otherwise
@@ -155,6 +383,8 @@ class SQLiteClient:
 
             # Convert embedding to JSON string if provided
             embedding_json = json.dumps(embedding) if embedding else None
+            embedding_model = embedding_model or self.embedding_backend.model_id
+            embedding_dim = len(embedding) if embedding else None
 
             if existing:
                 # Update existing preferences
@@ -162,7 +392,8 @@ class SQLiteClient:
                     """
                     UPDATE preferences 
                     SET genre = ?, favourite_movies = ?, preference_text = ?, year_range = ?, rating_min = ?, embedding = ?, 
-                        last_updated = CURRENT_TIMESTAMP 
+                        embedding_model = ?, embedding_dim = ?,
+                        last_updated = CURRENT_TIMESTAMP
                     WHERE user_id = ?
                     """,
                     (
@@ -176,6 +407,8 @@ class SQLiteClient:
                         else None,
                         preferences.rating_min,
                         embedding_json,
+                        embedding_model if embedding else None,
+                        embedding_dim,
                         user_id,
                     ),
                 )
@@ -184,8 +417,9 @@ class SQLiteClient:
                 cursor.execute(
                     """
                     INSERT INTO preferences 
-                    (user_id, genre, favourite_movies, preference_text, year_range, rating_min, embedding) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    (user_id, genre, favourite_movies, preference_text, year_range,
+                     rating_min, embedding, embedding_model, embedding_dim)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """,
                     (
                         user_id,
@@ -199,6 +433,8 @@ class SQLiteClient:
                         else None,
                         preferences.rating_min,
                         embedding_json,
+                        embedding_model if embedding else None,
+                        embedding_dim,
                     ),
                 )
 
@@ -209,6 +445,8 @@ class SQLiteClient:
             logger.error(f"Error updating preferences: {str(e)}")
             return False
 
+    @timed(SQLITE_QUERY_SECONDS, operation="get_preferences")
+    @traced("db.get_preferences")
     def get_preferences(
         self, user_id: str, include_embedding: bool = True
     ) -> Optional[Dict[str, Any]]:
@@ -228,7 +466,8 @@ class SQLiteClient:
 
             if include_embedding:
                 cursor.execute(
-                    "SELECT genre, favourite_movies, year_range, rating_min, embedding FROM preferences WHERE user_id = ?",
+                    "SELECT genre, favourite_movies, year_range, rating_min, embedding, "
+                    "embedding_model, preference_text FROM preferences WHERE user_id = ?",
                     (user_id,),
                 )
             else:
@@ -253,6 +492,17 @@ class SQLiteClient:
                     # Parse embedding if it exists
                     if result[4]:
                         preferences["embedding"] = json.loads(result[4])
+                        preferences["embedding_model"] = result[5]
+                    # Embedded by another backend, or stored without an embedding
+                    # when the request ran out of time. The stored embedding is kept
+                    # when the backend fails or this request runs out of time too.
+                    if result[6] and result[5] != self.embedding_backend.model_id:
+                        try:
+                            preferences.update(
+                                self._reembed_preferences(user_id, result[6])
+                            )
+                        except Exception as e:
+                            logger.error(f"Error embedding preferences: {str(e)}")
 
                     return preferences
                 else:
@@ -269,137 +519,1494 @@ class SQLiteClient:
             logger.error(f"Error getting preferences: {str(e)}")
             return None
 
-    def _cosine_similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+    def _reembed_preferences(self, user_id: str, preference_text: str) -> dict:
         """
-        Calculate cosine similarity between two vectors.
-
-        Args:
-            a: First vector
-            b: Second vector
-
-        Returns:
-            float: Cosine similarity (-1 to 1)
+        Embed the preference text with the current backend after a backend switch,
+        so the preferences are only compared with movies embedded the same way.
         """
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+        embedding = self.embedding_backend.embed(preference_text)
+        conn = self._get_connection()
+        conn.execute(
+            """
+            UPDATE preferences
+            SET embedding = ?, embedding_model = ?, embedding_dim = ?
+            WHERE user_id = ?
+            """,
+            (
+                json.dumps(embedding),
+                self.embedding_backend.model_id,
+                len(embedding),
+                user_id,
+            ),
+        )
+        conn.commit()
+        conn.close()
+        return {
+            "embedding": embedding,
+            "embedding_model": self.embedding_backend.model_id,
+        }
 
-    def insert_movie(self, movie: MovieInfo, genres: list[str]):
+    @timed(SQLITE_QUERY_SECONDS, operation="insert_movie")
+    @traced("db.insert_movie")
+    def insert_movie(
+        self, movie: MovieInfo, genres: list[str], refresh: bool = False
+    ) -> bool:
         """
-        Insert a movie into the movie_embeddings table.
+        Insert a movie into the movie_embeddings table. The movie is stored right
+        away with embedding_status "pending" and queued for the embedding workers,
+        searches skip it until it is embedded.
 
         Args:
             movie: MovieInfo object containing movie details
+            refresh: Whether the movie was seen trending, refreshes the popularity,
+                rating and last_seen_at of a stored movie, which prune_catalog
+                relies on
 
+        Returns:
+            bool: True if the movie was inserted, False if it existed or failed
         """
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
 
+            now = time.time()
             # Check if movie already exists
             cursor.execute("SELECT id FROM movie_embeddings WHERE id = ?", (movie.id,))
-            if cursor.fetchone() is None:
+            inserted = cursor.fetchone() is None
+            if not inserted and refresh:
+                cursor.execute(
+                    """
+                    UPDATE movie_embeddings
+                    SET last_seen_at = ?, popularity = IFNULL(?, popularity),
+                        vote_average = IFNULL(?, vote_average)
+                    WHERE id = ?
+                    """,
+                    (now, movie.popularity, movie.vote_average, movie.id),
+                )
+            elif inserted:
                 # Insert new movie
                 cursor.execute(
                     """
-                INSERT INTO movie_embeddings (id, title, embedding, genre_ids, overview, poster_path, release_date, vote_average, popularity)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO movie_embeddings (id, title, genre_ids, overview, poster_path,
+                    release_date, vote_average, popularity, embedding_status, last_seen_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?)
                 """,
                     (
                         movie.id,
                         movie.title,
-                        json.dumps(openai_client.get_embedding(movie.overview)),
                         json.dumps(genres) if genres else None,
                         movie.overview,
                         movie.poster_path,
                         movie.release_date,
                         movie.vote_average,
                         movie.popularity,
+                        now,
                     ),
                 )
+                cursor.execute(
+                    """
+                    INSERT OR REPLACE INTO embedding_jobs
+                    (movie_id, enqueued_at, next_attempt_at) VALUES (?, ?, ?)
+                    """,
+                    (movie.id, now, now),
+                )
+                cursor.execute(
+                    "INSERT OR IGNORE INTO movie_titles VALUES (?, ?)",
+                    (normalize_title(movie.title)[0], movie.id),
+                )
 
             conn.commit()
             conn.close()
+            return inserted
         except Exception as e:
             logger.error(f"Error inserting movie: {str(e)}")
+            return False
+
+    def claim_embedding_jobs(
+        self, limit: int, lease_seconds: float
+    ) -> List[tuple[int, str, int]]:
+        """
+        Claim up to `limit` due embedding jobs for `lease_seconds`. Jobs of a worker
+        which died are claimed again once their lease expired.
+
+        Returns:
+            List[tuple[int, str, int]]: (movie id, text to embed, previous attempts)
+        """
+        conn = None
+        try:
+            conn = self._get_connection()
+            # Takes the write lock first, so concurrent workers never claim a job twice
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            jobs = conn.execute(
+                """
+                SELECT j.movie_id, COALESCE(NULLIF(m.overview, ''), m.title), j.attempts
+                FROM embedding_jobs j JOIN movie_embeddings m ON m.id = j.movie_id
+                WHERE (j.status = 'queued' AND j.next_attempt_at <= ?)
+                   OR (j.status = 'running' AND j.locked_until <= ?)
+                ORDER BY j.next_attempt_at LIMIT ?
+                """,
+                (now, now, limit),
+            ).fetchall()
+            conn.executemany(
+                """
+                UPDATE embedding_jobs SET status = 'running', locked_until = ?
+                WHERE movie_id = ?
+                """,
+                [(now + lease_seconds, job[0]) for job in jobs],
+            )
+            conn.commit()
+            conn.close()
+            return jobs
+        except Exception as e:
+            logger.error(f"Error claiming embedding jobs: {str(e)}")
+            if conn:
+                conn.close()
+            return []
+
+    def complete_embedding_jobs(self, embeddings: List[tuple[int, List[float]]]) -> int:
+        """
+        Store the embeddings of claimed jobs and remove the jobs from the queue.
+
+        Returns:
+            int: Number of movies embedded
+        """
+        model_id = self.embedding_backend.model_id
+        try:
+            conn = self._get_connection()
+            conn.executemany(
+                """
+                UPDATE movie_embeddings
+                SET embedding = ?, embedding_model = ?, embedding_dim = ?,
+                    embedding_q = ?, embedding_scale = ?, embedding_format = ?,
+                    embedding_status = 'ready'
+                WHERE id = ?
+                """,
+                [
+                    (
+                        json.dumps(embedding),
+                        model_id,
+                        len(embedding),
+                        *self._quantized_columns(embedding),
+                        movie_id,
+                    )
+                    for movie_id, embedding in embeddings
+                ],
+            )
+            conn.executemany(
+                "DELETE FROM embedding_jobs WHERE movie_id = ?",
+                [(movie_id,) for movie_id, _ in embeddings],
+            )
+            conn.commit()
+            conn.close()
+            return len(embeddings)
+        except Exception as e:
+            logger.error(f"Error storing embeddings: {str(e)}")
+            return 0
+
+    def fail_embedding_jobs(
+        self,
+        jobs: List[tuple[int, int]],
+        error: str,
+        max_attempts: int,
+        retry_delay: Callable[[int], float],
+    ) -> int:
+        """
+        Schedule claimed jobs for another attempt after `retry_delay(attempts)`
+        seconds, or move them to the dead letter status "dead" (and the movie to
+        embedding_status "failed") after `max_attempts`.
+
+        Args:
+            jobs: (movie id, previous attempts) of the failed jobs
+
+        Returns:
+            int: Number of jobs dead-lettered
+        """
+        now = time.time()
+        retried = [
+            (attempts + 1, now + retry_delay(attempts + 1), error, movie_id)
+            for movie_id, attempts in jobs
+            if attempts + 1 < max_attempts
+        ]
+        dead = [
+            (attempts + 1, error, movie_id)
+            for movie_id, attempts in jobs
+            if attempts + 1 >= max_attempts
+        ]
+        try:
+            conn = self._get_connection()
+            conn.executemany(
+                """
+                UPDATE embedding_jobs
+                SET status = 'queued', attempts = ?, next_attempt_at = ?,
+                    last_error = ?, locked_until = NULL
+                WHERE movie_id = ?
+                """,
+                retried,
+            )
+            conn.executemany(
+                """
+                UPDATE embedding_jobs
+                SET status = 'dead', attempts = ?, last_error = ?, locked_until = NULL
+                WHERE movie_id = ?
+                """,
+                dead,
+            )
+            conn.executemany(
+                "UPDATE movie_embeddings SET embedding_status = 'failed' WHERE id = ?",
+                [(movie_id,) for _, _, movie_id in dead],
+            )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error rescheduling embedding jobs: {str(e)}")
+        return len(dead)
+
+    def requeue_dead_embedding_jobs(self) -> int:
+        """
+        Give dead-lettered embedding jobs a fresh set of attempts.
+
+        Returns:
+            int: Number of jobs queued again
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.execute(
+                """
+                UPDATE embedding_jobs
+                SET status = 'queued', attempts = 0, next_attempt_at = ?
+                WHERE status = 'dead'
+                """,
+                (time.time(),),
+            )
+            conn.execute(
+                """
+                UPDATE movie_embeddings SET embedding_status = 'pending'
+                WHERE id IN (
+                    SELECT movie_id FROM embedding_jobs WHERE status = 'queued'
+                )
+                """
+            )
+            conn.commit()
+            conn.close()
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error requeueing embedding jobs: {str(e)}")
+            return 0
+
+    def embedding_queue_stats(self) -> Dict[str, float]:
+        """Jobs per status and the age in seconds of the oldest job not dead yet."""
+        stats = {"queued": 0, "running": 0, "dead": 0, "lag_seconds": 0.0}
+        try:
+            conn = self._get_connection()
+            rows = conn.execute(
+                """
+                SELECT status, COUNT(*), MIN(enqueued_at) FROM embedding_jobs
+                GROUP BY status
+                """
+            ).fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error reading embedding queue stats: {str(e)}")
+            return stats
+        now = time.time()
+        for status, count, oldest in rows:
+            stats[status] = count
+            if status != "dead":
+                stats["lag_seconds"] = max(stats["lag_seconds"], now - oldest)
+        return stats
+
+    def catalog_stats(self) -> Optional[Dict[str, float]]:
+        """
+        Movies in the catalog, movies embedded by the client's backend and the time
+        the catalog last changed (a movie stored, or seen again by the scraper).
+
+        Returns:
+            Optional[Dict[str, float]]: The stats, None if they couldn't be read
+        """
+        try:
+            conn = self._get_connection()
+            movies, embedded, updated_at = conn.execute(
+                """
+                SELECT COUNT(*),
+                       IFNULL(SUM(embedding_model = ? AND embedding IS NOT NULL), 0),
+                       MAX(COALESCE(last_seen_at, strftime('%s', created_at)))
+                FROM movie_embeddings
+                """,
+                (self.embedding_backend.model_id,),
+            ).fetchone()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error reading catalog stats: {str(e)}")
+            return None
+        return {
+            "movies": movies,
+            "embedded": embedded,
+            "updated_at": float(updated_at) if updated_at is not None else None,
+        }
+
+    def _quantized_columns(self, embedding: List[float]) -> tuple:
+        """Values of embedding_q, embedding_scale and embedding_format for a vector."""
+        if self.quantization == "none":
+            return None, None, None
+        codes, scales = quantize(embedding, self.quantization)
+        return codes.tobytes(), float(scales[0]), self.quantization
+
+    @timed(SQLITE_QUERY_SECONDS, operation="reembed_movies")
+    @traced("db.reembed_movies")
+    def reembed_movies(self, batch_size: int = 500) -> int:
+        """
+        Re-embed the overviews of movies embedded by another backend, e.g. after
+        switching settings.embedding_backend, so the whole catalog stays searchable.
+
+        Returns:
+            int: Number of movies updated
+        """
+        model_id = self.embedding_backend.model_id
+        updated = 0
+        try:
+            conn = self._get_connection()
+            while True:
+                rows = conn.execute(
+                    """
+                    SELECT id, overview FROM movie_embeddings
+                    WHERE embedding_model IS NOT ? AND embedding IS NOT NULL LIMIT ?
+                    """,
+                    (model_id, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                values = []
+                for movie_id, overview in rows:
+                    embedding = self.embedding_backend.embed(overview or "")
+                    values.append(
+                        (
+                            json.dumps(embedding),
+                            model_id,
+                            len(embedding),
+                            *self._quantized_columns(embedding),
+                            movie_id,
+                        )
+                    )
+                conn.executemany(
+                    """
+                    UPDATE movie_embeddings
+                    SET embedding = ?, embedding_model = ?, embedding_dim = ?,
+                        embedding_q = ?, embedding_scale = ?, embedding_format = ?
+                    WHERE id = ?
+                    """,
+                    values,
+                )
+                conn.commit()
+                updated += len(rows)
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error re-embedding movies: {str(e)}")
+        if updated:
+            logger.info(f"Re-embedded {updated} movies with {model_id}")
+        return updated
+
+    @timed(SQLITE_QUERY_SECONDS, operation="backfill_quantized_embeddings")
+    @traced("db.backfill_quantized_embeddings")
+    def backfill_quantized_embeddings(self, batch_size: int = 500) -> int:
+        """
+        Store the quantized embedding of movies without one in the current format.
+
+        Returns:
+            int: Number of movies updated
+        """
+        if self.quantization == "none":
+            return 0
+        updated = 0
+        try:
+            conn = self._get_connection()
+            while True:
+                rows = conn.execute(
+                    """
+                    SELECT id, embedding FROM movie_embeddings
+                    WHERE embedding_format IS NOT ? AND embedding IS NOT NULL
+                    LIMIT ?
+                    """,
+                    (self.quantization, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                codes, scales = quantize(
+                    [json.loads(row[1]) for row in rows], self.quantization
+                )
+                conn.executemany(
+                    """
+                    UPDATE movie_embeddings
+                    SET embedding_q = ?, embedding_scale = ?, embedding_format = ?
+                    WHERE id = ?
+                    """,
+                    [
+                        (code.tobytes(), float(scale), self.quantization, row[0])
+                        for row, code, scale in zip(rows, codes, scales)
+                    ],
+                )
+                conn.commit()
+                updated += len(rows)
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error backfilling quantized embeddings: {str(e)}")
+        return updated
+
+    @timed(SQLITE_QUERY_SECONDS, operation="prune_catalog")
+    @traced("db.prune_catalog")
+    def prune_catalog(
+        self,
+        retention_days: float = None,
+        min_popularity: float = None,
+        max_movies: int = None,
+    ) -> Optional[Dict[str, int]]:
+        """
+        Delete movies which stopped trending, so searches scan a bounded catalog.
+        A movie is pruned when it was last seen trending more than `retention_days`
+        ago, when its popularity is below `min_popularity`, or when it is among the
+        least recently seen movies beyond `max_movies`. A limit of 0 disables the
+        rule. The vector index is exported again when movies were pruned.
+
+        Returns:
+            Optional[Dict[str, int]]: Movies pruned by reason ("expired",
+            "unpopular", "over_capacity"), None if the pruning failed
+        """
+        retention_days = (
+            settings.catalog_retention_days
+            if retention_days is None
+            else retention_days
+        )
+        min_popularity = (
+            settings.catalog_min_popularity
+            if min_popularity is None
+            else min_popularity
+        )
+        max_movies = settings.catalog_max_movies if max_movies is None else max_movies
+        # Movies stored before last_seen_at was recorded were last seen when added
+        last_seen = "COALESCE(last_seen_at, CAST(strftime('%s', created_at) AS REAL))"
+        pruned = {"expired": 0, "unpopular": 0, "over_capacity": 0}
+        conn = None
+        try:
+            conn = self._get_connection()
+            conn.execute("BEGIN IMMEDIATE")
+            if retention_days:
+                pruned["expired"] = conn.execute(
+                    f"DELETE FROM movie_embeddings WHERE {last_seen} < ?",
+                    (time.time() - retention_days * 86400,),
+                ).rowcount
+            if min_popularity:
+                pruned["unpopular"] = conn.execute(
+                    "DELETE FROM movie_embeddings WHERE IFNULL(popularity, 0) < ?",
+                    (min_popularity,),
+                ).rowcount
+            if max_movies:
+                pruned["over_capacity"] = conn.execute(
+                    f"""
+                    DELETE FROM movie_embeddings WHERE id IN (
+                        SELECT id FROM movie_embeddings
+                        ORDER BY {last_seen} DESC, IFNULL(popularity, 0) DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (max_movies,),
+                ).rowcount
+            for table in ("embedding_jobs", "movie_titles"):
+                conn.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE movie_id NOT IN (SELECT id FROM movie_embeddings)
+                    """
+                )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error pruning catalog: {str(e)}")
+            if conn:
+                conn.close()
+            return None
+
+        if sum(pruned.values()):
+            logger.info(f"Pruned movies from the catalog: {pruned}")
+            self.export_vector_index()
+        return pruned
+
+    @timed(SQLITE_QUERY_SECONDS, operation="compact_database")
+    @traced("db.compact_database")
+    def compact_database(self) -> Optional[Dict[str, int]]:
+        """
+        Return free pages to the file system with an incremental vacuum and refresh
+        the query planner statistics with ANALYZE. Databases created without
+        incremental auto-vacuum are converted by one full VACUUM.
+
+        Returns:
+            Optional[Dict[str, int]]: The database size in bytes ("size_bytes") and
+            the bytes reclaimed ("reclaimed_bytes"), None if the compaction failed
+        """
+
+        def size(conn: sqlite3.Connection) -> int:
+            (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+            (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+            return page_count * page_size
+
+        try:
+            conn = self._get_connection()
+            before = size(conn)
+            (auto_vacuum,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+            if auto_vacuum != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            else:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+            conn.execute("ANALYZE")
+            conn.commit()
+            after = size(conn)
+            conn.close()
+            return {"size_bytes": after, "reclaimed_bytes": max(before - after, 0)}
+        except Exception as e:
+            logger.error(f"Error compacting database: {str(e)}")
+            return None
+
+    def _embedding_columns(self) -> tuple[str, List[Any]]:
+        """
+        Columns (embedding_q, embedding) read for scoring. With quantization the JSON
+        embedding is only read for rows not stored in the current format.
+        """
+        if self.quantization == "none":
+            return "NULL, embedding", []
+        return (
+            "embedding_q, CASE WHEN embedding_format IS ? THEN NULL ELSE embedding END",
+            [self.quantization],
+        )
+
+    def _embedding_matrix(self, rows: List[tuple]) -> np.ndarray:
+        """Stack the embeddings of `rows` (embedding_q, embedding) into one matrix."""
+        if self.quantization == "none":
+            return np.array(
+                [json.loads(embedding) for _, embedding in rows], dtype=np.float32
+            )
+        blobs = [
+            blob
+            if embedding is None
+            else quantize(json.loads(embedding), self.quantization)[0].tobytes()
+            for blob, embedding in rows
+        ]
+        dtype = QUANTIZATION_DTYPES[self.quantization]
+        return np.frombuffer(b"".join(blobs), dtype=dtype).reshape(len(rows), -1)
+
+    def _embedding_rows(
+        self,
+        conn: sqlite3.Connection,
+        movie_ids: List[int],
+        columns: str = None,
+        column_params: List[Any] = None,
+        batch_size: int = 500,
+    ) -> List[tuple]:
+        """
+        Embedding columns (by default those of _embedding_columns) of the given movies,
+        in the order of the ids.
+        """
+        if columns is None:
+            columns, column_params = self._embedding_columns()
+        rows = {}
+        for start in range(0, len(movie_ids), batch_size):
+            batch = movie_ids[start : start + batch_size]
+            placeholders = ", ".join("?" for _ in batch)
+            for row in conn.execute(
+                f"SELECT id, {columns} FROM movie_embeddings "
+                f"WHERE id IN ({placeholders})",
+                [*(column_params or []), *batch],
+            ):
+                rows[row[0]] = row[1:]
+        return [rows[movie_id] for movie_id in movie_ids]
+
+    def _full_precision_matrix(
+        self, conn: sqlite3.Connection, movie_ids: List[int]
+    ) -> np.ndarray:
+        """Full precision embeddings of the given movies, in the order of the ids."""
+        return np.array(
+            [
+                json.loads(row[0])
+                for row in self._embedding_rows(conn, movie_ids, "embedding")
+            ],
+            dtype=np.float32,
+        )
+
+    def _index_snapshot(
+        self, embedding_model: str, dim: int
+    ) -> Optional[IndexSnapshot]:
+        """The mapped vector index, if it matches the backend, format and dimension."""
+        if self.vector_index is None:
+            return None
+        snapshot = self.vector_index.snapshot()
+        if (
+            snapshot is None
+            or snapshot.embedding_model != embedding_model
+            or snapshot.format != self.quantization
+            or snapshot.matrix.shape[1] != dim
+        ):
+            return None
+        return snapshot
+
+    def _similarities(
+        self,
+        conn: sqlite3.Connection,
+        snapshot: IndexSnapshot,
+        movie_ids: np.ndarray,
+        query_vector: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Similarity of the given movies to the query, scored on the mapped index.
+        Movies inserted after the index was exported are read from SQLite.
+        """
+        rows, found = snapshot.locate(movie_ids)
+        similarity = np.empty(len(movie_ids), dtype=np.float32)
+        similarity[found] = cosine_scores(
+            snapshot.matrix, query_vector, rows=rows[found]
+        )
+        if not found.all():
+            missing = self._embedding_rows(conn, movie_ids[~found].tolist())
+            similarity[~found] = cosine_scores(
+                self._embedding_matrix(missing), query_vector
+            )
+        return similarity
+
+    @timed(SQLITE_QUERY_SECONDS, operation="export_vector_index")
+    @traced("db.export_vector_index")
+    def export_vector_index(self, batch_size: int = 1000) -> Optional[int]:
+        """
+        Export the catalog vectors to a new version of the memory-mapped vector index.
+        Only movies embedded by the client's embedding backend are exported.
+
+        Returns:
+            Optional[int]: The new version, None if the index is disabled, the catalog
+            is empty or the export failed
+        """
+        if self.vector_index is None:
+            return None
+        conn = None
+        try:
+            conn = self._get_connection()
+            # Read the count and the rows from one snapshot of the database
+            conn.execute("BEGIN")
+            model_id = self.embedding_backend.model_id
+            count, dim = conn.execute(
+                """
+                SELECT COUNT(*), MAX(embedding_dim) FROM movie_embeddings
+                WHERE embedding_model = ?
+                """,
+                (model_id,),
+            ).fetchone()
+            if not count:
+                conn.close()
+                return None
+
+            cursor = conn.execute(
+                """
+                SELECT id, embedding FROM movie_embeddings
+                WHERE embedding_model = ? ORDER BY id
+                """,
+                (model_id,),
+            )
+            with self.vector_index.write(
+                count,
+                dim,
+                QUANTIZATION_DTYPES[self.quantization],
+                self.quantization,
+                model_id,
+            ) as (ids, matrix):
+                offset = 0
+                while rows := cursor.fetchmany(batch_size):
+                    end = offset + len(rows)
+                    ids[offset:end] = [row[0] for row in rows]
+                    matrix[offset:end] = quantize(
+                        [json.loads(row[1]) for row in rows], self.quantization
+                    )[0]
+                    offset = end
+            conn.close()
+            version = self.vector_index.read_manifest()["version"]
+            logger.info(f"Exported {count} movies to vector index version {version}")
+            return version
+        except Exception as e:
+            logger.error(f"Error exporting vector index: {str(e)}")
+            if conn:
+                conn.close()
+            return None
+
+    @timed(SQLITE_QUERY_SECONDS, operation="compute_centroids")
+    @traced("db.compute_centroids")
+    def compute_centroids(self, batch_size: int = 1000) -> Optional[int]:
+        """
+        Compute the centroid of the catalog vectors of each genre and each release
+        decade, for the client's embedding backend, and replace the stored ones.
+        Movies still waiting for the embedding workers are left out.
+
+        Returns:
+            Optional[int]: Number of stored centroids, None if the computation failed
+        """
+        conn = None
+        try:
+            model_id = self.embedding_backend.model_id
+            sums: Dict[tuple, np.ndarray] = {}
+            counts: Dict[tuple, int] = {}
+            conn = self._get_connection()
+            cursor = conn.execute(
+                """
+                SELECT genre_ids, release_date, embedding FROM movie_embeddings
+                WHERE embedding_model = ? AND embedding IS NOT NULL
+                """,
+                (model_id,),
+            )
+            while rows := cursor.fetchmany(batch_size):
+                matrix = np.array(
+                    [json.loads(row[2]) for row in rows], dtype=np.float64
+                )
+                for (genres, release_date, _), vector in zip(rows, matrix):
+                    keys = [("genre", genre) for genre in json.loads(genres or "[]")]
+                    if release_date and release_date[:4].isdigit():
+                        keys.append(("decade", str(int(release_date[:4]) // 10 * 10)))
+                    for key in keys:
+                        if key in sums:
+                            sums[key] += vector
+                            counts[key] += 1
+                        else:
+                            sums[key] = vector.copy()
+                            counts[key] = 1
+
+            updated_at = time.time()
+            rows = []
+            for (kind, name), total in sums.items():
+                norm = np.linalg.norm(total)
+                if norm:
+                    vector = (total / norm).astype(np.float32)
+                    rows.append(
+                        (
+                            model_id,
+                            kind,
+                            name,
+                            counts[kind, name],
+                            vector.tobytes(),
+                            updated_at,
+                        )
+                    )
+            conn.execute("BEGIN")
+            conn.execute(
+                "DELETE FROM embedding_centroids WHERE embedding_model = ?", (model_id,)
+            )
+            conn.executemany(
+                "INSERT INTO embedding_centroids VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            conn.commit()
+            conn.close()
+            logger.info(f"Computed {len(rows)} genre and decade centroids")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error computing centroids: {str(e)}")
+            if conn:
+                conn.close()
+            return None
+
+    def _load_centroids(self, embedding_model: str) -> Dict[tuple, Any]:
+        """
+        Centroids of the embedding model as {(kind, name): (movie_count, vector)},
+        read from the database only when they were computed again since last time.
+        """
+        conn = self._get_connection()
+        try:
+            (updated_at,) = conn.execute(
+                """
+                SELECT MAX(updated_at) FROM embedding_centroids
+                WHERE embedding_model = ?
+                """,
+                (embedding_model,),
+            ).fetchone()
+            cached_at, centroids = self._centroids.get(embedding_model, (None, {}))
+            if updated_at != cached_at:
+                centroids = {
+                    (kind, name.casefold()): (
+                        count,
+                        np.frombuffer(vector, dtype=np.float32),
+                    )
+                    for kind, name, count, vector in conn.execute(
+                        """
+                        SELECT kind, name, movie_count, vector
+                        FROM embedding_centroids WHERE embedding_model = ?
+                        """,
+                        (embedding_model,),
+                    )
+                }
+                self._centroids[embedding_model] = (updated_at, centroids)
+            return centroids
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _parse_genres(genres: str | List[str] | None) -> List[str]:
+        """Genres given as a list or stored as "Drama,Thriller"."""
+        if not genres:
+            return []
+        if isinstance(genres, str):
+            genres = genres.split(",")
+        return [genre.strip() for genre in genres if genre and genre.strip()]
+
+    @staticmethod
+    def _parse_year_range(year_range: str | tuple | None) -> Optional[tuple]:
+        """Year range given as a tuple or stored as "1990-2020"."""
+        if isinstance(year_range, str):
+            year_range = year_range.split("-")
+        if not year_range or len(year_range) != 2:
+            return None
+        try:
+            return int(year_range[0]), int(year_range[1])
+        except (TypeError, ValueError):
+            return None
+
+    def centroid_embedding(
+        self,
+        genres: str | List[str] | None = None,
+        year_range: str | tuple | None = None,
+        embedding_model: str = None,
+    ) -> Optional[List[float]]:
+        """
+        Query vector built from the centroids of the given genres and of the decades
+        in the year range, without any embedding call. A year range covering every
+        decade of the catalog says nothing about the user and is ignored.
+
+        Args:
+            genres: Genre names, as a list or stored as "Drama,Thriller"
+            year_range: (start_year, end_year), or stored as "1990-2020"
+            embedding_model: Model of the centroids, defaults to the client's
+                embedding backend
+
+        Returns:
+            Optional[List[float]]: The unit query vector, None if none of the genres
+            and decades has a centroid
+        """
+        try:
+            centroids = self._load_centroids(
+                embedding_model or self.embedding_backend.model_id
+            )
+        except Exception as e:
+            logger.error(f"Error loading centroids: {str(e)}")
+            return None
+        if not centroids:
+            return None
+
+        parts = []
+        genre_vectors = [
+            centroids["genre", genre.casefold()][1]
+            for genre in dict.fromkeys(self._parse_genres(genres))
+            if ("genre", genre.casefold()) in centroids
+        ]
+        if genre_vectors:
+            parts.append(np.mean(genre_vectors, axis=0))
+
+        year_range = self._parse_year_range(year_range)
+        if year_range:
+            start_year, end_year = year_range
+            decades = [key for key in centroids if key[0] == "decade"]
+            selected = [
+                centroids[key]
+                for key in decades
+                if int(key[1]) + 9 >= start_year and int(key[1]) <= end_year
+            ]
+            if selected and len(selected) < len(decades):
+                # Decades weighted by their number of movies
+                counts = np.array([count for count, _ in selected], dtype=np.float64)
+                vectors = np.array([vector for _, vector in selected])
+                parts.append(counts @ vectors / counts.sum())
+
+        if not parts:
+            return None
+        vector = np.sum(parts, axis=0)
+        norm = np.linalg.norm(vector)
+        return (vector / norm).tolist() if norm else None
+
+    def _query_embedding(
+        self,
+        preferences: Dict[str, Any],
+        genres: List[str] = None,
+        year_range: tuple = None,
+    ) -> tuple[Optional[List[float]], str]:
+        """
+        Query vector of a search and its embedding model. Without a preference
+        embedding it is the centroid of the requested (or stored) genres and years.
+        Otherwise the centroid is blended into the preference embedding, weighted
+        less the more favourite movies the embedding was made from.
+        """
+        embedding = preferences.get("embedding")
+        embedding_model = (
+            preferences.get("embedding_model") or self.embedding_backend.model_id
+        )
+        weight = settings.centroid_blend_weight
+        if embedding and not weight:
+            return embedding, embedding_model
+
+        centroid = self.centroid_embedding(
+            genres or preferences.get("genre"),
+            year_range or preferences.get("year_range"),
+            embedding_model,
+        )
+        if centroid is None or (embedding and len(centroid) != len(embedding)):
+            return embedding, embedding_model
+        if not embedding:
+            CENTROID_QUERIES.inc(mode="cold_start")
+            return centroid, embedding_model
+
+        CENTROID_QUERIES.inc(mode="blended")
+        weight /= 1 + len(self._watched_titles(preferences.get("favourite_movies")))
+        vector = (1 - weight) * np.asarray(embedding) + weight * np.asarray(centroid)
+        return (vector / np.linalg.norm(vector)).tolist(), embedding_model
+
+    @timed(SQLITE_QUERY_SECONDS, operation="export_snapshot")
+    @traced("db.export_snapshot")
+    def export_snapshot(
+        self, path: str | Path, batch_size: int = 1000
+    ) -> Optional[int]:
+        """
+        Export the movies embedded by the client's embedding backend, with their
+        metadata and packed embeddings, to a catalog snapshot file.
+
+        Returns:
+            Optional[int]: Number of exported movies, None if the export failed
+        """
+        conn = None
+        try:
+            conn = self._get_connection()
+            conn.execute("BEGIN")
+            model_id = self.embedding_backend.model_id
+            count, dim = conn.execute(
+                """
+                SELECT COUNT(*), IFNULL(MAX(embedding_dim), 0) FROM movie_embeddings
+                WHERE embedding_model = ?
+                """,
+                (model_id,),
+            ).fetchone()
+            ids = np.empty(count, dtype=np.int64)
+            embeddings = np.empty((count, dim), dtype=np.float32)
+            movies = []
+            cursor = conn.execute(
+                """
+                SELECT id, embedding, title, genre_ids, overview, poster_path,
+                       release_date, vote_average, popularity
+                FROM movie_embeddings WHERE embedding_model = ? ORDER BY id
+                """,
+                (model_id,),
+            )
+            offset = 0
+            while rows := cursor.fetchmany(batch_size):
+                for index, row in enumerate(rows, start=offset):
+                    ids[index] = row[0]
+                    embeddings[index] = json.loads(row[1])
+                    movie = dict(zip(MOVIE_COLUMNS, row[2:]))
+                    movie["genres"] = json.loads(movie["genres"] or "null")
+                    movies.append(movie)
+                offset += len(rows)
+            conn.close()
+            write_snapshot(
+                path, CatalogSnapshot(model_id, ids, embeddings, movies, now())
+            )
+            logger.info(f"Exported {count} movies to catalog snapshot {path}")
+            return count
+        except Exception as e:
+            logger.error(f"Error exporting catalog snapshot: {str(e)}")
+            if conn:
+                conn.close()
+            return None
+
+    @timed(SQLITE_QUERY_SECONDS, operation="import_snapshot")
+    @traced("db.import_snapshot")
+    def import_snapshot(self, path: str | Path, replace: bool = False) -> Optional[int]:
+        """
+        Bulk-load a catalog snapshot without any embedding or TMDB calls. Movies of
+        the snapshot replace stored movies with the same id, the vector index is
+        exported again afterwards.
+
+        Args:
+            path: Snapshot written by export_snapshot
+            replace: Delete all stored movies first
+
+        Returns:
+            Optional[int]: Number of imported movies, None if the snapshot was made
+            with another embedding model or the import failed
+        """
+        conn = None
+        try:
+            snapshot = read_snapshot(path)
+            model_id = self.embedding_backend.model_id
+            if snapshot.embedding_model != model_id:
+                logger.error(
+                    f"Catalog snapshot {path} was embedded with "
+                    f"{snapshot.embedding_model}, the embedding backend is {model_id}"
+                )
+                return None
+            if self.quantization == "none":
+                quantized = [(None, None, None)] * len(snapshot.ids)
+            else:
+                codes, scales = quantize(snapshot.embeddings, self.quantization)
+                quantized = [
+                    (code.tobytes(), float(scale), self.quantization)
+                    for code, scale in zip(codes, scales)
+                ]
+            dim = snapshot.embeddings.shape[1] if len(snapshot.ids) else None
+
+            conn = self._get_connection()
+            conn.execute("BEGIN")
+            if replace:
+                conn.execute("DELETE FROM movie_embeddings")
+                conn.execute("DELETE FROM embedding_jobs")
+                conn.execute("DELETE FROM movie_titles")
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO movie_embeddings
+                (id, title, embedding, genre_ids, overview, poster_path, release_date,
+                 vote_average, popularity, embedding_model, embedding_dim,
+                 embedding_q, embedding_scale, embedding_format, embedding_status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'ready')
+                """,
+                (
+                    (
+                        int(movie_id),
+                        movie["title"],
+                        embedding,
+                        json.dumps(movie["genres"]) if movie["genres"] else None,
+                        movie["overview"],
+                        movie["poster_path"],
+                        movie["release_date"],
+                        movie["vote_average"],
+                        movie["popularity"],
+                        model_id,
+                        dim,
+                        *quantized_columns,
+                    )
+                    for movie_id, embedding, movie, quantized_columns in zip(
+                        snapshot.ids,
+                        json_vectors(snapshot.embeddings),
+                        snapshot.movies,
+                        quantized,
+                    )
+                ),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO movie_titles VALUES (?, ?)",
+                (
+                    (normalize_title(movie["title"])[0], int(movie_id))
+                    for movie_id, movie in zip(snapshot.ids, snapshot.movies)
+                ),
+            )
+            # Movies of the snapshot no longer wait for the embedding workers
+            conn.execute(
+                """
+                DELETE FROM embedding_jobs WHERE movie_id IN
+                (SELECT id FROM movie_embeddings WHERE embedding_status = 'ready')
+                """
+            )
+            # INSERT OR REPLACE doesn't fire the delete trigger for replaced rows
+            conn.execute("INSERT INTO movie_fts (movie_fts) VALUES ('rebuild')")
+            (stored,) = conn.execute(
+                "SELECT COUNT(*) FROM movie_embeddings WHERE embedding_model = ?",
+                (model_id,),
+            ).fetchone()
+            conn.commit()
+            conn.close()
+            logger.info(f"Imported {len(snapshot.ids)} movies from {path}")
+        except Exception as e:
+            logger.error(f"Error importing catalog snapshot: {str(e)}")
+            if conn:
+                conn.close()
+            return None
+
+        if self.vector_index is not None and len(snapshot.ids):
+            if stored == len(snapshot.ids):
+                # The snapshot is the whole catalog, index it without reading it back
+                order = np.argsort(snapshot.ids)
+                with self.vector_index.write(
+                    len(order),
+                    dim,
+                    QUANTIZATION_DTYPES[self.quantization],
+                    self.quantization,
+                    model_id,
+                ) as (ids, matrix):
+                    vectors, _ = quantize(snapshot.embeddings[order], self.quantization)
+                    ids[:] = snapshot.ids[order]
+                    matrix[:] = vectors
+            else:
+                self.export_vector_index()
+        return len(snapshot.ids)
+
+    @staticmethod
+    def _watched_titles(favourite_movies: str | List[str] | None) -> List[str]:
+        """Title index keys of the stored favourite movies ("a;b" or a list)."""
+        if not favourite_movies:
+            return []
+        if isinstance(favourite_movies, str):
+            favourite_movies = favourite_movies.split(";")
+        keys = {normalize_title(title)[0] for title in favourite_movies if title}
+        return sorted(keys - {""})
+
+    @staticmethod
+    def _candidate_filters(
+        embedding_model: str,
+        embedding_dim: Optional[int],
+        genres: List[str] = None,
+        year_range: tuple = None,
+        rating_min: float = None,
+        watched_titles: List[str] = None,
+    ) -> tuple[List[str], List[Any]]:
+        """Build the SQL predicates which select the movies eligible for scoring."""
+        # Only compare vectors produced by the same backend, movies still waiting
+        # for the embedding workers have no embedding_model yet
+        conditions = ["embedding_model = ?"]
+        params = [embedding_model]
+        if embedding_dim is not None:
+            conditions.append("embedding_dim = ?")
+            params.append(embedding_dim)
+
+        # Apply genre filter if provided
+        if genres and len(genres) > 0:
+            genre_conditions = []
+            for genre in genres:
+                genre_conditions.append("json_extract(genre_ids, '$') LIKE ?")
+                params.append(f'%"{genre}"%')
+            conditions.append(f"({' OR '.join(genre_conditions)})")
+
+        # Apply year range filter if provided
+        if year_range and len(year_range) == 2:
+            start_year, end_year = year_range
+            conditions.append(
+                "substr(release_date, 1, 4) >= ? AND substr(release_date, 1, 4) <= ?"
+            )
+            params.extend([str(start_year), str(end_year)])
+
+        # Skip movies rated below the user's threshold
+        if rating_min is not None:
+            conditions.append("vote_average >= ?")
+            params.append(rating_min)
+
+        # Skip movies the user already named, under any title of the title index
+        if watched_titles:
+            placeholders = ", ".join("?" for _ in watched_titles)
+            conditions.append(
+                "id NOT IN (SELECT movie_id FROM movie_titles"
+                f" WHERE normalized_title IN ({placeholders}))"
+            )
+            params.extend(watched_titles)
+
+        return conditions, params
+
+    @staticmethod
+    def _prior_scores(
+        vote_average: np.ndarray,
+        popularity: np.ndarray,
+        popularity_weight: float = 0.0,
+        rating_weight: float = 0.0,
+    ) -> np.ndarray:
+        """
+        Score added to the similarity: weighted popularity (log-scaled to 0-1 over the
+        candidates) plus weighted vote average (scaled to 0-1).
+        """
+        prior = np.zeros(len(vote_average), dtype=np.float32)
+        if popularity_weight:
+            log_popularity = np.log1p(np.nan_to_num(popularity))
+            prior += popularity_weight * log_popularity / max(log_popularity.max(), 1)
+        if rating_weight:
+            prior += rating_weight * np.nan_to_num(vote_average) / 10
+        return prior
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+        """Indices of the `limit` highest scores, best first."""
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    @staticmethod
+    def _fetch_movies(
+        conn: sqlite3.Connection, movie_ids: List[int]
+    ) -> List[MovieInfo]:
+        """Load the movies with the given ids, keeping the order of `movie_ids`."""
+        if not movie_ids:
+            return []
+        placeholders = ", ".join("?" for _ in movie_ids)
+        rows = conn.execute(
+            "SELECT id, title, genre_ids, overview, poster_path, release_date, "
+            "vote_average, popularity FROM movie_embeddings "
+            f"WHERE id IN ({placeholders})",
+            movie_ids,
+        ).fetchall()
+        fields = (
+            "id",
+            "title",
+            "genres",
+            "overview",
+            "poster_path",
+            "release_date",
+            "vote_average",
+            "popularity",
+        )
+        movies = {}
+        for row in rows:
+            movie = dict(zip(fields, row))
+            movie["genres"] = json.loads(movie["genres"]) if movie["genres"] else None
+            # MovieInfo fields are not nullable, leave missing values at the default
+            movies[movie["id"]] = MovieInfo(
+                **{key: value for key, value in movie.items() if value is not None}
+            )
+        return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
+    def _vector_top(
+        self,
+        conn: sqlite3.Connection,
+        embedding: List[float],
+        embedding_model: str,
+        conditions: List[str],
+        params: List[Any],
+        limit: int,
+        popularity_weight: float,
+        rating_weight: float,
+    ) -> List[int]:
+        """Ids of the `limit` eligible movies closest to the embedding, best first."""
+        quantized = self.quantization != "none"
+        snapshot = self._index_snapshot(embedding_model, len(embedding))
+        # Without the mapped index the embeddings are read with the candidates
+        columns, column_params = "NULL, NULL", []
+        if snapshot is None:
+            columns, column_params = self._embedding_columns()
+        query = f"SELECT id, vote_average, popularity, {columns} FROM movie_embeddings"
+        query += " WHERE " + " AND ".join(conditions)
+        movies = conn.execute(query, column_params + params).fetchall()
+
+        VECTOR_SEARCH_CANDIDATES.observe(len(movies))
+        if not movies:
+            return []
+
+        with (
+            span(
+                "vector.search",
+                candidates=len(movies),
+                quantization=self.quantization,
+                index_version=snapshot.version if snapshot else None,
+            ),
+            VECTOR_SEARCH_SECONDS.time(),
+        ):
+            movie_ids = np.array([movie[0] for movie in movies])
+            query_vector = np.asarray(embedding, dtype=np.float32)
+            prior = self._prior_scores(
+                np.array([movie[1] for movie in movies], dtype=np.float64),
+                np.array([movie[2] for movie in movies], dtype=np.float64),
+                popularity_weight,
+                rating_weight,
+            )
+            if snapshot is None:
+                matrix = self._embedding_matrix(
+                    [(movie[3], movie[4]) for movie in movies]
+                )
+                similarity = cosine_scores(matrix, query_vector)
+            else:
+                similarity = self._similarities(conn, snapshot, movie_ids, query_vector)
+            scores = similarity + prior
+
+            if quantized:
+                candidates = self._top_k(scores, limit * self.rerank_factor)
+                # Re-rank the best candidates at full precision
+                matrix = self._full_precision_matrix(
+                    conn, movie_ids[candidates].tolist()
+                )
+                scores = cosine_scores(matrix, query_vector) + prior[candidates]
+                top = candidates[self._top_k(scores, limit)]
+            else:
+                top = self._top_k(scores, limit)
+        return movie_ids[top].tolist()
+
+    @staticmethod
+    def _fts_query(text: Optional[str]) -> Optional[str]:
+        """
+        FTS5 query matching any word of `text` but the stopwords, None when no word is
+        left. The words are quoted, so FTS5 operators in the text are searched for.
+        """
+        if not text:
+            return None
+        words = dict.fromkeys(
+            word
+            for word in re.findall(r"\w+", text.casefold())
+            if len(word) > 1 and word not in _QUERY_STOPWORDS
+        )
+        return " OR ".join(f'"{word}"' for word in words) or None
+
+    def _hybrid_top(
+        self,
+        conn: sqlite3.Connection,
+        match: str,
+        embedding: Optional[List[float]],
+        embedding_model: str,
+        conditions: List[str],
+        params: List[Any],
+        limit: int,
+        popularity_weight: float,
+        rating_weight: float,
+    ) -> List[int]:
+        """
+        Ids of the `limit` best eligible movies matching the FTS5 query, best first.
+        The best BM25 matches are ranked again by similarity to the embedding (and by
+        the popularity and rating prior), and both rankings are combined with
+        reciprocal rank fusion.
+        """
+        movies = conn.execute(
+            f"""
+            WITH lexical AS (
+                SELECT rowid AS id, bm25(movie_fts, ?, ?) AS score
+                FROM movie_fts WHERE movie_fts MATCH ?
+            )
+            SELECT id, vote_average, popularity
+            FROM lexical JOIN movie_embeddings USING (id)
+            WHERE {" AND ".join(conditions)}
+            ORDER BY lexical.score
+            LIMIT ?
+            """,
+            [*_FTS_WEIGHTS, match, *params, settings.hybrid_search_candidates],
+        ).fetchall()
+
+        VECTOR_SEARCH_CANDIDATES.observe(len(movies))
+        if not movies:
+            return []
+
+        with (
+            span("hybrid.search", candidates=len(movies), vector=bool(embedding)),
+            VECTOR_SEARCH_SECONDS.time(),
+        ):
+            movie_ids = np.array([movie[0] for movie in movies])
+            scores = self._prior_scores(
+                np.array([movie[1] for movie in movies], dtype=np.float64),
+                np.array([movie[2] for movie in movies], dtype=np.float64),
+                popularity_weight,
+                rating_weight,
+            )
+            if embedding:
+                query_vector = np.asarray(embedding, dtype=np.float32)
+                snapshot = self._index_snapshot(embedding_model, len(embedding))
+                if snapshot is None:
+                    matrix = self._full_precision_matrix(conn, movie_ids.tolist())
+                    scores += cosine_scores(matrix, query_vector)
+                else:
+                    scores += self._similarities(
+                        conn, snapshot, movie_ids, query_vector
+                    )
+            # The movies come in BM25 order, so a movie's index is its lexical rank
+            lexical_rank = np.arange(len(movies))
+            if embedding or scores.any():
+                semantic_rank = np.empty(len(movies), dtype=np.int64)
+                semantic_rank[np.argsort(-scores, kind="stable")] = lexical_rank
+                k = settings.hybrid_search_rrf_k
+                fused = 1 / (k + 1 + lexical_rank) + 1 / (k + 1 + semantic_rank)
+            else:
+                fused = -lexical_rank.astype(np.float64)
+            top = self._top_k(fused, limit)
+        return movie_ids[top].tolist()
 
+    @timed(SQLITE_QUERY_SECONDS, operation="get_most_similar_movies")
+    @traced("db.get_most_similar_movies")
     def get_most_similar_movies(
         self,
         preferences: Dict[str, Any],
         limit: int = 5,
         genres: List[str] = None,
         year_range: tuple = None,
+        popularity_weight: float = None,
+        rating_weight: float = None,
+        query: str = None,
     ) -> List[MovieInfo]:
         """
-        Get the most similar movies to a given embedding.
+        Get the movies most similar to the user's preference embedding.
+
+        The genre and year filters, the user's rating_min and the movies they already
+        named are applied in SQL, so only eligible movies are scored. All candidates
+        are scored in one matrix product, optionally blended with popularity and vote
+        average, and the top `limit` are selected before any MovieInfo is built.
+
+        With quantization the candidates are scored on their float16/int8 copies and
+        the best `limit * rerank_factor` are re-ranked with the full precision vectors.
+        When a vector index has been exported, the vectors are read from its memory
+        map instead of being decoded from SQLite.
+
+        With a `query`, only the settings.hybrid_search_candidates best BM25 matches
+        of its words in titles and overviews are scored against the embedding, and
+        the lexical and vector rankings are fused. When fewer than `limit` movies
+        match, the rest are the best movies of the vector search.
+
+        Users without a preference embedding are served from the centroids of the
+        requested (or stored) genres and decades, once compute_centroids has run.
+        Users with one get settings.centroid_blend_weight of the centroid blended in.
 
         Args:
-            embedding: Embedding vector
+            preferences: User preferences with the embedding, genre, year_range,
+                favourite_movies and rating_min
             limit: Maximum number of similar movies to return
             genres: Optional list of genres to filter by
             year_range: Optional tuple of (start_year, end_year) to filter by
+            popularity_weight: Weight of the popularity in the score, defaults to
+                settings.recommendation_popularity_weight
+            rating_weight: Weight of the vote average in the score, defaults to
+                settings.recommendation_rating_weight
+            query: Optional free text, such as "heist" or "space station", which the
+                titles or overviews should contain
 
         Returns:
             List[MovieInfo]: List of most similar movies
         """
-        embedding = preferences["embedding"]
-        watched_movies = preferences["favourite_movies"]
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        embedding, embedding_model = self._query_embedding(
+            preferences, genres, year_range
+        )
+        match = self._fts_query(query)
+        if not embedding and match is None:
+            return []
+        if popularity_weight is None:
+            popularity_weight = settings.recommendation_popularity_weight
+        if rating_weight is None:
+            rating_weight = settings.recommendation_rating_weight
 
+        conn = self._get_connection()
         try:
-            # Build the query based on filters
-            query = "SELECT id, title, embedding, genre_ids, overview, poster_path, release_date, vote_average, popularity FROM movie_embeddings"
-            params = []
-            conditions = []
-
-            # Apply genre filter if provided
-            if genres and len(genres) > 0:
-                genre_conditions = []
-                for genre in genres:
-                    genre_conditions.append("json_extract(genre_ids, '$') LIKE ?")
-                    params.append(f'%"{genre}"%')
-                conditions.append(f"({' OR '.join(genre_conditions)})")
-
-            # Apply year range filter if provided
-            if year_range and len(year_range) == 2:
-                start_year, end_year = year_range
-                conditions.append(
-                    "substr(release_date, 1, 4) >= ? AND substr(release_date, 1, 4) <= ?"
-                )
-                params.extend([str(start_year), str(end_year)])
-
-            # Finalize query with conditions
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-
-            # Execute the query
-            cursor.execute(query, params)
-            movies = cursor.fetchall()
-
-            # Calculate similarity scores for each movie
-            movie_similarities = []
-            for movie in movies:
-                movie_embedding = json.loads(movie[2])  # Parse the embedding JSON
-                similarity = self._cosine_similarity(
-                    np.array(embedding), np.array(movie_embedding)
-                )
-
-                movie_info = MovieInfo(
-                    id=movie[0],
-                    title=movie[1],
-                    overview=movie[4],
-                    poster_path=movie[5],
-                    release_date=movie[6],
-                    vote_average=movie[7],
-                    popularity=movie[8],
+            conditions, params = self._candidate_filters(
+                embedding_model,
+                len(embedding) if embedding else None,
+                genres,
+                year_range,
+                preferences.get("rating_min"),
+                self._watched_titles(preferences.get("favourite_movies")),
+            )
+            movie_ids = []
+            if match is not None:
+                movie_ids = self._hybrid_top(
+                    conn,
+                    match,
+                    embedding,
+                    embedding_model,
+                    conditions,
+                    params,
+                    limit,
+                    popularity_weight,
+                    rating_weight,
                 )
+            if embedding and len(movie_ids) < limit:
+                # Too few movies match the query, fill up with the vector search
+                picked = set(movie_ids)
+                movie_ids += [
+                    movie_id
+                    for movie_id in self._vector_top(
+                        conn,
+                        embedding,
+                        embedding_model,
+                        conditions,
+                        params,
+                        limit + len(picked),
+                        popularity_weight,
+                        rating_weight,
+                    )
+                    if movie_id not in picked
+                ][: limit - len(picked)]
 
-                movie_similarities.append((movie_info, similarity))
-
-            # Sort by similarity score (highest first)
-            movie_similarities.sort(key=lambda x: x[1], reverse=True)
-
-            # Return the top N movies
-            result = [movie for movie, _ in movie_similarities[:limit]]
+            result = self._fetch_movies(conn, movie_ids)
             conn.close()
             return result
 
@@ -409,6 +2016,124 @@ class SQLiteClient:
                 conn.close()
             return []
 
+    @timed(SQLITE_QUERY_SECONDS, operation="find_movie_by_title")
+    @traced("db.find_movie_by_title")
+    def find_movie_by_title(self, title: str) -> Optional[MovieInfo]:
+        """
+        Look up a movie of the catalog by title, ignoring case, accents and
+        punctuation. A year in brackets after the title ("Heat (1995)") must match
+        the release year, otherwise the most popular movie with the title is
+        returned. The genres of the result are genre names.
+
+        Returns:
+            Optional[MovieInfo]: The movie, None if no movie of the catalog matches
+        """
+        normalized, year = normalize_title(title)
+        if not normalized:
+            return None
+        try:
+            conn = self._get_connection()
+            row = conn.execute(
+                """
+                SELECT m.id, m.title, m.overview, m.release_date, m.vote_average,
+                       m.popularity, m.poster_path, m.genre_ids
+                FROM movie_titles t JOIN movie_embeddings m ON m.id = t.movie_id
+                WHERE t.normalized_title = ?
+                  AND (? IS NULL OR substr(m.release_date, 1, 4) = ?)
+                ORDER BY IFNULL(m.popularity, 0) DESC LIMIT 1
+                """,
+                (normalized, year, str(year)),
+            ).fetchone()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error looking up movie title: {str(e)}")
+            return None
+        if row is None:
+            return None
+        movie = dict(
+            zip(
+                (
+                    "id",
+                    "title",
+                    "overview",
+                    "release_date",
+                    "vote_average",
+                    "popularity",
+                    "poster_path",
+                ),
+                row,
+            )
+        )
+        # MovieInfo fields are not nullable, leave missing values at the default
+        return MovieInfo(
+            **{key: value for key, value in movie.items() if value is not None},
+            genres=json.loads(row[7]) if row[7] else [],
+        )
+
+    @timed(SQLITE_QUERY_SECONDS, operation="add_title_alias")
+    def add_title_alias(self, title: str, movie_id: int) -> bool:
+        """
+        Make find_movie_by_title resolve `title` to the movie, e.g. a title which
+        TMDB resolved to a movie with a differently spelled title.
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        normalized, _ = normalize_title(title)
+        if not normalized:
+            return False
+        try:
+            conn = self._get_connection()
+            conn.execute(
+                "INSERT OR IGNORE INTO movie_titles VALUES (?, ?)",
+                (normalized, movie_id),
+            )
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error adding title alias: {str(e)}")
+            return False
+
+    @timed(SQLITE_QUERY_SECONDS, operation="data_version")
+    def data_version(self, user_id: str = None) -> tuple[str, Optional[str]]:
+        """
+        Versions of the catalog and of the user's preferences, which change whenever
+        movies are embedded or removed or the preferences are stored again.
+
+        Returns:
+            tuple[str, Optional[str]]: The catalog version and the preferences version
+            (None if the user has no preferences)
+        """
+        try:
+            conn = self._get_connection()
+            count, last_id = conn.execute(
+                """
+                SELECT COUNT(*), IFNULL(MAX(rowid), 0) FROM movie_embeddings
+                WHERE embedding IS NOT NULL
+                """
+            ).fetchone()
+            preferences = conn.execute(
+                """
+                SELECT genre, favourite_movies, year_range, rating_min, embedding_model,
+                       last_updated
+                FROM preferences WHERE user_id = ?
+                """,
+                (user_id,),
+            ).fetchone()
+            conn.close()
+            catalog_version = f"{self.embedding_backend.model_id}:{count}:{last_id}"
+            if preferences is None:
+                return catalog_version, None
+            return catalog_version, hashlib.sha1(
+                json.dumps(preferences).encode()
+            ).hexdigest()[:16]
+        except Exception as e:
+            logger.error(f"Error reading data version: {str(e)}")
+            return "", None
+
+    @timed(SQLITE_QUERY_SECONDS, operation="add_new_user")
+    @traced("db.add_new_user")
     def add_new_user(self, user_id: str, username: str, first_name: str, last_name: str):
         """
         Add a new user to the database.
@@ -424,4 +2149,4 @@ class SQLiteClient:
 
 
 # Create a singleton instance
-sqlite_client = SQLiteClient()
+sqlite_client = SQLiteClient(db_path=settings.sqlite_db_path)
@@ -0,0 +1,91 @@
+import logging
+import time
+from typing import List, Optional
+
+from app.clients.aio import io_loop
+from app.clients.embedding_queue import embedding_workers
+from app.clients.sqlite import SQLiteClient, sqlite_client
+from app.clients.tmdb import TMDBClient, tmdb_client
+from app.observability.metrics import TITLE_RESOLUTION_SECONDS, TITLE_RESOLUTIONS
+from app.schemas.schemas import MovieInfo
+
+logger = logging.getLogger(__name__)
+
+
+class TitleResolver:
+    """
+    Resolves the movie titles users mention, from the catalog's title index first
+    and with a TMDB search only for titles the catalog doesn't know. Movies found on
+    TMDB are added to the catalog and the searched title is remembered as an alias,
+    so the next mention of either title is resolved locally.
+    """
+
+    def __init__(self, client: SQLiteClient, tmdb: TMDBClient):
+        self.client = client
+        self.tmdb = tmdb
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of the resolved titles which didn't need a TMDB search."""
+        lookups = self.local_hits + self.remote_hits + self.misses
+        return self.local_hits / lookups if lookups else 0.0
+
+    def _record(self, source: str, seconds: float) -> None:
+        TITLE_RESOLUTIONS.inc(source=source)
+        TITLE_RESOLUTION_SECONDS.observe(seconds, source=source)
+
+    async def _search(self, title: str) -> Optional[MovieInfo]:
+        start = time.perf_counter()
+        try:
+            movie = await self.tmdb.asearch_movie(title)
+        except Exception as e:
+            logger.warning(f"Could not look up movie '{title}': {str(e)}")
+            movie = None
+        self._record("tmdb" if movie else "miss", time.perf_counter() - start)
+        return movie
+
+    def _write_back(self, title: str, movie: MovieInfo) -> None:
+        genres = self.tmdb.get_movie_genres(movie)
+        if self.client.insert_movie(movie, genres):
+            embedding_workers.notify()
+        self.client.add_title_alias(title, movie.id)
+
+    def resolve(self, titles: List[str]) -> List[Optional[MovieInfo]]:
+        """
+        Resolve titles to movies, in the order of `titles`. Titles missing from the
+        catalog are searched on TMDB concurrently.
+
+        Returns:
+            List[Optional[MovieInfo]]: The movies, None for titles which couldn't be
+            resolved. Movies from the catalog carry genre names in `genres`, movies
+            from TMDB genre ids in `genre_ids`
+        """
+        movies = []
+        for title in titles:
+            start = time.perf_counter()
+            movie = self.client.find_movie_by_title(title)
+            if movie is not None:
+                self.local_hits += 1
+                self._record("local", time.perf_counter() - start)
+            movies.append(movie)
+
+        missing = [index for index, movie in enumerate(movies) if movie is None]
+        if missing:
+            results = io_loop.gather(*(self._search(titles[i]) for i in missing))
+            for index, movie in zip(missing, results):
+                movies[index] = movie
+                if movie is None:
+                    self.misses += 1
+                    continue
+                self.remote_hits += 1
+                try:
+                    self._write_back(titles[index], movie)
+                except Exception as e:
+                    logger.error(f"Error indexing movie '{movie.title}': {str(e)}")
+        return movies
+
+
+title_resolver = TitleResolver(sqlite_client, tmdb_client)
@@ -0,0 +1,27 @@
+import re
+import unicodedata
+from typing import Optional
+
+# A release year in brackets at the end of a title, as in "Heat (1995)"
+_YEAR_SUFFIX = re.compile(r"[\(\[]\s*((?:18|19|20)\d{2})\s*[\)\]]\s*$")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_title(title: str) -> tuple[str, Optional[int]]:
+    """
+    Key of a movie title in the title index, and the release year the title ends
+    with. Case, accents, punctuation and "&" are ignored, so "Amélie" and "amelie",
+    or "Heat (1995)" and "heat" with year 1995, have the same key.
+    """
+    year = None
+    match = _YEAR_SUFFIX.search(title)
+    if match and title[: match.start()].strip():
+        year = int(match.group(1))
+        title = title[: match.start()]
+    text = "".join(
+        char
+        for char in unicodedata.normalize("NFKD", title.casefold())
+        if not unicodedata.combining(char)
+    )
+    text = _NON_WORD.sub(" ", text.replace("&", " and ")).strip()
+    return text, year
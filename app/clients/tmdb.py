@@ -1,8 +1,16 @@
 import functools
 import logging
 
+import httpx
 import requests
 
+from app.clients.aio import io_loop, on_io_loop
+from app.clients.cassette import recorded
+from app.clients.deadline import call_timeout, exceeded, expired
+from app.clients.rate_limiter import parse_retry_after, tmdb_limiter
+from app.clients.singleflight import tmdb_flight
+from app.observability.metrics import TMDB_REQUEST_SECONDS, TMDB_REQUESTS
+from app.observability.tracing import span
 from app.schemas.schemas import MovieInfo, TrendingMovie
 from app.settings import settings
 
@@ -10,24 +18,112 @@ logger = logging.getLogger(__name__)
 
 
 class TMDBClient:
-    BASE_URL = "https://api.themoviedb.org/3"
-
-    def __init__(self, api_key: str = None):
+    """
+    TMDB API client. The `a`-prefixed coroutines are the async variants of the
+    methods of the same name, they share the pooled HTTP client of the I/O loop.
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        http_client: httpx.AsyncClient = None,
+    ):
         self.api_key = api_key or settings.tmdb_api_key
+        self.base_url = (base_url or settings.tmdb_base_url).rstrip("/")
+        self._http_client = http_client
+        self._genre_lists: dict[str, dict[int, str]] = {}
         if not self.api_key:
             raise ValueError(
                 "TMDB API Key is missing. Please set it in your environment variables."
             )
 
-    def _make_request(self, endpoint: str, params: dict = None):
-        if params is None:
-            params = {}
-        url = f"{self.BASE_URL}{endpoint}"
-        headers = {
+    @property
+    def headers(self) -> dict:
+        return {
             "accept": "application/json",
             "Authorization": f"Bearer {self.api_key}",
         }
-        response = requests.get(url, params=params, headers=headers)
+
+    def _request_key(self, endpoint: str, params: dict) -> tuple:
+        return (self.base_url, endpoint, tuple(sorted(params.items())))
+
+    def _make_request(self, endpoint: str, params: dict = None):
+        params = params or {}
+        return tmdb_flight.do(
+            self._request_key(endpoint, params),
+            lambda: self._fetch(endpoint, params),
+        )
+
+    @on_io_loop
+    async def _amake_request(self, endpoint: str, params: dict = None):
+        params = params or {}
+        return await tmdb_flight.ado(
+            self._request_key(endpoint, params),
+            lambda: self._afetch(endpoint, params),
+        )
+
+    @recorded("tmdb")
+    def _fetch(self, endpoint: str, params: dict):
+        url = f"{self.base_url}{endpoint}"
+        with tmdb_limiter.slot() as slot:
+            try:
+                with (
+                    span("http.tmdb", endpoint=endpoint),
+                    TMDB_REQUEST_SECONDS.time(endpoint=endpoint),
+                ):
+                    response = requests.get(
+                        url,
+                        params=params,
+                        headers=self.headers,
+                        timeout=(
+                            call_timeout(settings.http_connect_timeout_seconds, "tmdb"),
+                            call_timeout(settings.http_timeout_seconds, "tmdb"),
+                        ),
+                    )
+            except requests.RequestException as e:
+                TMDB_REQUESTS.inc(endpoint=endpoint, status="error")
+                if isinstance(e, requests.Timeout) and expired():
+                    raise exceeded("tmdb") from e
+                raise
+            if response.status_code == 429:
+                slot.mark_throttled(
+                    parse_retry_after(response.headers.get("Retry-After"))
+                )
+        TMDB_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        response.raise_for_status()
+        return response.json()
+
+    @recorded("tmdb")
+    async def _afetch(self, endpoint: str, params: dict):
+        http_client = self._http_client or io_loop.http_client
+        async with tmdb_limiter.aslot() as slot:
+            try:
+                with (
+                    span("http.tmdb", endpoint=endpoint),
+                    TMDB_REQUEST_SECONDS.time(endpoint=endpoint),
+                ):
+                    response = await http_client.get(
+                        f"{self.base_url}{endpoint}",
+                        params=params,
+                        headers=self.headers,
+                        timeout=httpx.Timeout(
+                            call_timeout(settings.http_timeout_seconds, "tmdb"),
+                            connect=call_timeout(
+                                settings.http_connect_timeout_seconds, "tmdb"
+                            ),
+                        ),
+                    )
+            except httpx.HTTPError as e:
+                TMDB_REQUESTS.inc(endpoint=endpoint, status="error")
+                if isinstance(e, httpx.TimeoutException) and expired():
+                    raise exceeded("tmdb") from e
+                raise
+            if response.status_code == 429:
+                slot.mark_throttled(
+                    parse_retry_after(response.headers.get("Retry-After"))
+                )
+        TMDB_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
         response.raise_for_status()
         return response.json()
 
@@ -43,6 +139,13 @@ class TMDBClient:
             **self._make_request(endpoint, params)["results"][0]
         )  # always get the first result
 
+    async def asearch_movie(
+        self, query: str, language: str = "en-US", page: int = 1
+    ) -> MovieInfo:
+        params = {"query": query, "language": language, "page": page}
+        response = await self._amake_request("/search/movie", params)
+        return MovieInfo(**response["results"][0])
+
     def get_trending_movies(self, language: str = "en-US", page: int = 1):
         """
         Get trending movies.
@@ -56,6 +159,15 @@ class TMDBClient:
             ]
         )
 
+    async def aget_trending_movies(
+        self, language: str = "en-US", page: int = 1
+    ) -> TrendingMovie:
+        params = {"language": language, "page": page}
+        response = await self._amake_request("/trending/movie/day", params)
+        return TrendingMovie(
+            trending_movies=[MovieInfo(**movie) for movie in response["results"]]
+        )
+
     @functools.lru_cache(maxsize=32)
     def get_genre_list(self, language: str = "en-US"):
         """
@@ -78,6 +190,16 @@ class TMDBClient:
 
         return genre_mapping
 
+    async def aget_genre_list(self, language: str = "en-US") -> dict[int, str]:
+        if language not in self._genre_lists:
+            response = await self._amake_request(
+                "/genre/movie/list", {"language": language}
+            )
+            self._genre_lists[language] = {
+                genre["id"]: genre["name"] for genre in response["genres"]
+            }
+        return self._genre_lists[language]
+
     def get_movie_genres(self, movie_info: MovieInfo) -> list[str]:
         """
         Get the genres of a movie by its name.
@@ -104,5 +226,19 @@ class TMDBClient:
             )
             return []
 
+    async def aget_movie_genres(self, movie_info: MovieInfo) -> list[str]:
+        try:
+            genre_list = await self.aget_genre_list()
+            return [
+                genre_list[genre_id]
+                for genre_id in movie_info.genre_ids or []
+                if genre_id in genre_list
+            ]
+        except Exception as e:
+            logger.error(
+                f"Error getting movie genres for '{movie_info.title}': {str(e)}"
+            )
+            return []
+
 
 tmdb_client = TMDBClient()
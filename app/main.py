@@ -1,25 +1,64 @@
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
 
-from app.agent.agent import agent
+from app.agent.agent import answer_question
+from app.bot.bot_core import bot
+from app.clients.aio import io_loop
+from app.clients.cassette import cassette_from_settings
+from app.clients.deadline import DeadlineExceeded, request_deadline
+from app.clients.embedding_queue import embedding_workers
+from app.clients.rate_limiter import embedding_limiter, tmdb_limiter
 from app.clients.scheduled_tasks import scheduler
+from app.clients.sqlite import sqlite_client
+from app.observability.health import HealthMonitor
+from app.observability.metrics import REGISTRY
+from app.observability.profiling import sampling_profile
+from app.observability.tracing import start_trace
 from app.schemas.schemas import Question, Response
-from app.settings import APP_TITLE
+from app.settings import APP_TITLE, settings
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    scheduler.start()
-    yield
-    scheduler.shutdown()
+    with cassette_from_settings():
+        embedding_workers.start()
+        scheduler.start()
+        yield
+        scheduler.shutdown()
+        embedding_workers.stop()
+    io_loop.close()
 
 
 app = FastAPI(title=APP_TITLE, lifespan=lifespan)
+health = HealthMonitor(
+    sqlite_client,
+    limiters=[tmdb_limiter, embedding_limiter],
+    queues={"telegram": bot.worker_pool.tasks.qsize} if bot.threaded else {},
+)
+# Polled by load balancers, not worth a trace each
+UNTRACED_PATHS = {"/healthz", "/readyz"}
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Trace every request, profile it when the X-Profile header is set."""
+    if request.url.path in UNTRACED_PATHS:
+        return await call_next(request)
+    profile = request.headers.get("x-profile", "").lower() in ("1", "true", "yes")
+    with (
+        start_trace(f"{request.method} {request.url.path}") as trace,
+        sampling_profile(trace, enabled=profile),
+    ):
+        response = await call_next(request)
+    if trace is not None:
+        response.headers["X-Trace-Id"] = trace.trace_id
+    return response
 
 
 @app.get("/", include_in_schema=False)
@@ -27,6 +66,34 @@ def docs_redirect() -> RedirectResponse:
     return RedirectResponse("/docs")
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> PlainTextResponse:
+    if not REGISTRY.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled"
+        )
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/healthz", include_in_schema=False)
+def healthz() -> JSONResponse:
+    """Liveness: the worker answers, with its health report."""
+    return JSONResponse(health.report())
+
+
+@app.get("/readyz", include_in_schema=False)
+def readyz() -> JSONResponse:
+    """Readiness: 503 until the worker meets the settings.readiness_* thresholds."""
+    report = health.report()
+    ready, reasons = health.readiness(report)
+    code = status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(
+        {"ready": ready, "reasons": reasons, **report}, status_code=code
+    )
+
+
 @app.post(
     "/question",
     response_model=Response,
@@ -35,9 +102,19 @@ def docs_redirect() -> RedirectResponse:
 )
 async def question(question: Question) -> Response:
     try:
-        response = agent.run(question.text, reset=False)
-        agent.write_memory_to_messages()
+        # Run in a worker thread so the event loop keeps serving other requests, the
+        # deadline follows the request into the agent, its tools and upstream calls
+        with request_deadline(settings.request_deadline_seconds):
+            response = await run_in_threadpool(
+                answer_question, question.text, question.user_id
+            )
         return Response(text=response)
+    except DeadlineExceeded as e:
+        logger.error(f"Error generating response: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Timed out generating response",
+        )
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
         raise HTTPException(
@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus:
+    """Whether a background job is running and when it last succeeded or failed."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.running = False
+        self.runs = 0
+        self.last_success_at: Optional[float] = None
+        self.last_failure_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        self.running = True
+        try:
+            yield
+        except Exception as e:
+            self.last_failure_at = time.time()
+            self.last_error = str(e)
+            raise
+        else:
+            self.last_success_at = time.time()
+        finally:
+            self.running = False
+            self.runs += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lag = None
+        if self.last_success_at is not None:
+            lag = round(time.time() - self.last_success_at, 3)
+        return {
+            "running": self.running,
+            "runs": self.runs,
+            "last_success_at": self.last_success_at,
+            "lag_seconds": lag,
+            "last_failure_at": self.last_failure_at,
+            "last_error": self.last_error,
+        }
+
+
+class InFlight:
+    """Number of calls currently inside `track()`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        with self._lock:
+            self.value += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.value -= 1
+
+
+scrape_status = JobStatus("scrape_trending_movies")
+# Questions being answered or waiting for the agent
+agent_runs = InFlight()
+
+
+class HealthMonitor:
+    """
+    Health report of one worker: catalog, vector index, last scrape, agent runs,
+    queue depths and upstream limiter state, and whether the worker is ready for
+    traffic by the settings.readiness_* thresholds.
+
+    In-memory state is read on every call, the catalog and embedding queue counts
+    are read from SQLite at most every `cache_seconds`, so the routes can be polled
+    every second.
+    """
+
+    def __init__(
+        self,
+        client,
+        limiters: List = None,
+        queues: Dict[str, Callable[[], int]] = None,
+        scrape: JobStatus = None,
+        runs: InFlight = None,
+        cache_seconds: float = None,
+    ):
+        self.client = client
+        self.limiters = limiters or []
+        self.queues = queues or {}
+        self.scrape = scrape or scrape_status
+        self.runs = runs or agent_runs
+        self.cache_seconds = (
+            settings.health_cache_seconds if cache_seconds is None else cache_seconds
+        )
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._stats: Optional[tuple] = None
+        self._stats_read_at = 0.0
+
+    def _database_stats(self) -> tuple[Optional[dict], dict]:
+        """Catalog and embedding queue stats, cached for `cache_seconds`."""
+        with self._lock:
+            now = time.monotonic()
+            if self._stats is None or now - self._stats_read_at >= self.cache_seconds:
+                self._stats = (
+                    self.client.catalog_stats(),
+                    self.client.embedding_queue_stats(),
+                )
+                self._stats_read_at = now
+            return self._stats
+
+    def _index(self) -> Dict[str, Any]:
+        vector_index = self.client.vector_index
+        if vector_index is None:
+            return {"enabled": False, "loaded": False}
+        snapshot = vector_index.snapshot()
+        manifest = vector_index.read_manifest() if snapshot is not None else None
+        if snapshot is None or manifest is None:
+            return {"enabled": True, "loaded": False}
+        age = None
+        if manifest.get("created_at"):
+            created_at = datetime.fromisoformat(manifest["created_at"]).timestamp()
+            age = round(time.time() - created_at, 3)
+        return {
+            "enabled": True,
+            "loaded": True,
+            "generation": snapshot.version,
+            "movies": len(snapshot.ids),
+            "format": snapshot.format,
+            "age_seconds": age,
+        }
+
+    def _queue_depths(self, embedding_queue: dict) -> Dict[str, Any]:
+        depths: Dict[str, Any] = {"embedding": embedding_queue}
+        for name, depth in self.queues.items():
+            try:
+                depths[name] = depth()
+            except Exception as e:
+                logger.error(f"Error reading the {name} queue depth: {str(e)}")
+                depths[name] = None
+        return depths
+
+    def report(self) -> Dict[str, Any]:
+        catalog, embedding_queue = self._database_stats()
+        if catalog is not None:
+            catalog = dict(catalog)
+            updated_at = catalog["updated_at"]
+            catalog["age_seconds"] = (
+                None if updated_at is None else round(time.time() - updated_at, 3)
+            )
+        upstreams = {}
+        for limiter in self.limiters:
+            state = limiter.snapshot()
+            # Calls are held back while the upstream asks us to back off
+            state["state"] = "throttled" if state["throttled_for"] else "ok"
+            upstreams[limiter.name] = state
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "catalog": catalog,
+            "index": self._index(),
+            "scrape": self.scrape.snapshot(),
+            "agent": {"in_flight": self.runs.value},
+            "queues": self._queue_depths(embedding_queue),
+            "upstreams": upstreams,
+        }
+
+    def readiness(self, report: Dict[str, Any] = None) -> tuple[bool, List[str]]:
+        """
+        Whether the worker should receive traffic, and the reasons it shouldn't.
+        Thresholds set to 0 are not checked.
+        """
+        report = report or self.report()
+        reasons = []
+        catalog = report["catalog"]
+        if catalog is None:
+            reasons.append("catalog unavailable")
+        elif catalog["embedded"] < settings.readiness_min_catalog_movies:
+            reasons.append(
+                f"catalog has {catalog['embedded']} embedded movies, "
+                f"{settings.readiness_min_catalog_movies} required"
+            )
+        index = report["index"]
+        if settings.readiness_require_vector_index and index["enabled"]:
+            if not index["loaded"]:
+                reasons.append("vector index not loaded")
+
+        scrape = report["scrape"]
+        if (
+            settings.readiness_wait_for_startup_scrape
+            and scrape["running"]
+            and scrape["last_success_at"] is None
+        ):
+            reasons.append("startup scrape running")
+        max_lag = settings.readiness_max_scrape_lag_hours * 3600
+        # A worker which never scraped lags since it started
+        lag = scrape["lag_seconds"]
+        lag = report["uptime_seconds"] if lag is None else lag
+        if max_lag and lag > max_lag:
+            reasons.append(f"no successful scrape for {lag:.0f}s")
+
+        max_queued = settings.readiness_max_embedding_queue_depth
+        queued = report["queues"]["embedding"]["queued"]
+        if max_queued and queued > max_queued:
+            reasons.append(f"{queued} movies waiting for embedding")
+        max_runs = settings.readiness_max_agent_runs
+        if max_runs and report["agent"]["in_flight"] >= max_runs:
+            reasons.append(f"{report['agent']['in_flight']} agent runs in flight")
+        return not reasons, reasons
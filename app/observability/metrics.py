@@ -0,0 +1,363 @@
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from app.settings import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100, 500, 1000, 10000, 100000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base class for metrics exposed in the Prometheus text format.
+
+    All updates are no-ops when metrics are disabled, so instrumented hot paths only
+    pay for one attribute check.
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, description: str, registry: "Registry" = None):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: dict[tuple[tuple[str, str], ...], object] = {}
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    @property
+    def enabled(self) -> bool:
+        return self.registry.enabled
+
+    @staticmethod
+    def _key(labels: dict) -> tuple[tuple[str, str], ...]:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def collect(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.description)}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self.collect())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}_total{_format_labels(key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, registry: "Registry" = None):
+        super().__init__(name, description, registry)
+        self._callbacks: dict[tuple[tuple[str, str], ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], float], **labels) -> None:
+        """Evaluate `callback` on every scrape instead of storing a value."""
+        self._callbacks[self._key(labels)] = callback
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        if key in self._callbacks:
+            return self._callbacks[key]()
+        return self._values.get(key, 0)
+
+    @contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, callback in self._callbacks.items():
+            try:
+                items.append((key, callback()))
+            except Exception:
+                continue
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        registry: "Registry" = None,
+    ):
+        super().__init__(name, description, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of the wrapped block in seconds."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = [
+                (key, (list(state[0]), state[1], state[2]))
+                for key, state in self._values.items()
+            ]
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(key + (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def timed(histogram: Histogram, **labels) -> Callable:
+    """Decorator observing the wall time of each call in `histogram`."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Registry:
+    """Collection of metrics rendered together by the /metrics endpoint."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry(enabled=settings.metrics_enabled)
+
+# Upstream calls
+OPENAI_REQUEST_SECONDS = Histogram(
+    "openai_request_seconds",
+    "Latency of OpenAIClient calls by operation",
+    buckets=LLM_BUCKETS,
+)
+OPENAI_REQUEST_ERRORS = Counter(
+    "openai_request_errors", "Failed OpenAIClient calls by operation"
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "Latency of agent LLM calls", buckets=LLM_BUCKETS
+)
+LLM_TOKENS = Counter("llm_tokens", "LLM tokens used by source and kind")
+TMDB_REQUEST_SECONDS = Histogram(
+    "tmdb_request_seconds", "Latency of TMDB API requests by endpoint"
+)
+TMDB_REQUESTS = Counter("tmdb_requests", "TMDB API requests by endpoint and status")
+
+UPSTREAM_LIMITER_WAIT_SECONDS = Histogram(
+    "upstream_limiter_wait_seconds",
+    "Time spent waiting for the upstream rate limiter by priority",
+)
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    "upstream_concurrency_limit", "Adaptive concurrency limit per upstream"
+)
+UPSTREAM_IN_FLIGHT = Gauge("upstream_in_flight", "Upstream calls in flight")
+UPSTREAM_THROTTLED = Counter(
+    "upstream_throttled", "Responses with status 429 per upstream"
+)
+UPSTREAM_CALLS = Counter(
+    "upstream_calls", "Upstream calls issued after request coalescing per upstream"
+)
+UPSTREAM_COALESCED = Counter(
+    "upstream_coalesced",
+    "Calls that joined an identical in-flight upstream call per upstream",
+)
+
+# SQLite and vector search
+SQLITE_QUERY_SECONDS = Histogram(
+    "sqlite_query_seconds", "Latency of SQLiteClient operations"
+)
+VECTOR_SEARCH_SECONDS = Histogram(
+    "vector_search_seconds", "Time spent scoring candidate movies"
+)
+VECTOR_SEARCH_CANDIDATES = Histogram(
+    "vector_search_candidates",
+    "Number of candidate movies scored per search",
+    buckets=COUNT_BUCKETS,
+)
+
+# Agent
+AGENT_RUN_SECONDS = Histogram(
+    "agent_run_seconds", "Wall time of agent runs", buckets=LLM_BUCKETS
+)
+AGENT_STEPS_PER_RUN = Histogram(
+    "agent_steps_per_run", "Agent steps per run", buckets=COUNT_BUCKETS
+)
+AGENT_TOOL_CALLS_PER_RUN = Histogram(
+    "agent_tool_calls_per_run", "Tool calls per agent run", buckets=COUNT_BUCKETS
+)
+AGENT_TOOL_CALLS = Counter("agent_tool_calls", "Tool calls by tool and outcome")
+AGENT_TOOL_SECONDS = Histogram("agent_tool_seconds", "Latency of agent tool calls")
+AGENT_RUNS_IN_PROGRESS = Gauge("agent_runs_in_progress", "Agent runs in flight")
+AGENT_STEP_PROMPT_TOKENS = Histogram(
+    "agent_step_prompt_tokens",
+    "Prompt tokens of each agent LLM call",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000),
+)
+AGENT_TOOL_OUTPUT_TOKENS = Histogram(
+    "agent_tool_output_tokens",
+    "Estimated tokens of tool outputs added to the agent context by tool",
+    buckets=COUNT_BUCKETS,
+)
+TITLE_RESOLUTIONS = Counter(
+    "title_resolutions", "Favourite movie titles resolved by source (local, tmdb, miss)"
+)
+TITLE_RESOLUTION_SECONDS = Histogram(
+    "title_resolution_seconds", "Latency of resolving a movie title by source"
+)
+DEADLINE_EXCEEDED = Counter(
+    "deadline_exceeded",
+    "Work abandoned because its request ran out of time by operation",
+)
+CENTROID_QUERIES = Counter(
+    "centroid_queries",
+    "Searches using genre and decade centroids by mode (cold_start or blended)",
+)
+ANSWER_CACHE_LOOKUPS = Counter(
+    "answer_cache_lookups", "Semantic answer cache lookups by result (hit or miss)"
+)
+ANSWER_CACHE_ENTRIES = Gauge("answer_cache_entries", "Answers in the semantic cache")
+
+# Background work
+SCRAPER_RUN_SECONDS = Histogram(
+    "scraper_run_seconds",
+    "Duration of trending movie scrapes",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+SCRAPER_MOVIES_INGESTED = Counter(
+    "scraper_movies_ingested", "Movies inserted into the catalog by the scraper"
+)
+EMBEDDING_QUEUE_DEPTH = Gauge(
+    "embedding_queue_depth", "Embedding jobs by status (queued, running or dead)"
+)
+EMBEDDING_QUEUE_LAG_SECONDS = Gauge(
+    "embedding_queue_lag_seconds", "Age of the oldest embedding job not embedded yet"
+)
+EMBEDDING_JOBS = Counter(
+    "embedding_jobs", "Processed embedding jobs by outcome (embedded, retried, dead)"
+)
+EMBEDDING_BATCH_SECONDS = Histogram(
+    "embedding_batch_seconds", "Latency of embedding a batch of queued movies"
+)
+CATALOG_MOVIES_PRUNED = Counter(
+    "catalog_movies_pruned",
+    "Movies pruned from the catalog by reason (expired, unpopular, over_capacity)",
+)
+DATABASE_BYTES_RECLAIMED = Counter(
+    "database_bytes_reclaimed", "Bytes returned to the file system by compaction"
+)
+DATABASE_SIZE_BYTES = Gauge(
+    "database_size_bytes", "Size of the SQLite database after the last compaction"
+)
+TELEGRAM_QUEUE_DEPTH = Gauge(
+    "telegram_queue_depth", "Telegram updates waiting for a worker thread"
+)
@@ -0,0 +1,97 @@
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.observability.tracing import Trace
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads working on a trace at a fixed interval.
+
+    Only threads with an active span of the trace are sampled, so work handed to worker
+    threads is included while other requests served by the same process are not.
+    Stacks are written in the collapsed ("folded") format understood by flamegraph.pl,
+    speedscope and inferno.
+    """
+
+    def __init__(self, trace: Trace, interval: float = None):
+        self.trace = trace
+        self.interval = interval or settings.profile_interval_ms / 1000
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"profiler-{trace.trace_id}", daemon=True
+        )
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.trace.active_threads():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, directory: str = None) -> Path:
+        path = Path(directory or settings.profile_dir) / f"{self.trace.trace_id}.folded"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+        )
+        return path
+
+
+def should_sample() -> bool:
+    """Decide whether to profile a message according to PROFILE_SAMPLE_RATE."""
+    return settings.profile_sample_rate > 0 and (
+        random.random() < settings.profile_sample_rate
+    )
+
+
+@contextmanager
+def sampling_profile(
+    trace: Optional[Trace], enabled: bool = True
+) -> Iterator[Optional[SamplingProfiler]]:
+    """Profile the wrapped block and dump a folded stack file named after the trace."""
+    if not enabled or trace is None:
+        yield None
+        return
+
+    profiler = SamplingProfiler(trace)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        try:
+            path = profiler.write()
+            logger.info(f"Profile for trace {trace.trace_id} written to {path}")
+        except OSError as e:
+            logger.error(f"Error writing profile: {str(e)}")
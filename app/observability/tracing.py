@@ -0,0 +1,200 @@
+import contextvars
+import functools
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: str | None
+    start: float
+    thread: str
+    attributes: dict[str, Any] = field(default_factory=dict)
+    duration: float | None = None
+    error: str | None = None
+
+    @property
+    def kind(self) -> str:
+        """First component of the span name, e.g. "llm", "tool", "http" or "db"."""
+        return self.name.split(".", 1)[0]
+
+
+class Trace:
+    """
+    All spans recorded while handling one request or message.
+
+    The trace is shared by every thread which runs with a copy of the request context,
+    spans are appended under a lock.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = secrets.token_hex(8)
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration: float | None = None
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+        self._active_threads: dict[int, int] = defaultdict(int)
+
+    def _enter(self, span: Span, thread_id: int, track_thread: bool) -> None:
+        with self._lock:
+            self.spans.append(span)
+            if track_thread:
+                self._active_threads[thread_id] += 1
+
+    def _exit(self, thread_id: int, track_thread: bool) -> None:
+        if not track_thread:
+            return
+        with self._lock:
+            self._active_threads[thread_id] -= 1
+            if self._active_threads[thread_id] <= 0:
+                del self._active_threads[thread_id]
+
+    def active_threads(self) -> list[int]:
+        """Threads currently executing a (non-root) span of this trace."""
+        with self._lock:
+            return list(self._active_threads)
+
+    def self_times(self) -> dict[str, float]:
+        """
+        Exclusive time by span kind.
+
+        Children are subtracted from their parent, so LLM, tool, HTTP and DB time add up
+        to the request duration instead of being counted twice.
+        """
+        with self._lock:
+            spans = [span for span in self.spans if span.duration is not None]
+        child_time: dict[str, float] = defaultdict(float)
+        for span in spans:
+            if span.parent_id:
+                child_time[span.parent_id] += span.duration
+        totals: dict[str, float] = defaultdict(float)
+        for span in spans:
+            totals[span.kind] += max(0.0, span.duration - child_time[span.span_id])
+        return dict(totals)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [asdict(span) for span in self.spans]
+        for span in spans:
+            span["start"] = round(span["start"] - self.start, 6)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "self_times": self.self_times(),
+            "spans": spans,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Record a span in the current trace, a no-op outside of a traced request."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    thread_id = threading.get_ident()
+    current = Span(
+        name=name,
+        span_id=secrets.token_hex(4),
+        parent_id=parent.span_id if parent else None,
+        start=time.perf_counter(),
+        thread=threading.current_thread().name,
+        attributes=attributes,
+    )
+    track_thread = parent is not None
+    token = _current_span.set(current)
+    trace._enter(current, thread_id, track_thread)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        trace._exit(thread_id, track_thread)
+        _current_span.reset(token)
+
+
+def traced(name: str) -> Callable:
+    """Decorator recording each call as a span named `name`."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Optional[Trace]]:
+    """Start a request-scoped trace, export it when the block exits."""
+    if not settings.tracing_enabled or _current_trace.get() is not None:
+        yield _current_trace.get()
+        return
+
+    trace = Trace(name, **attributes)
+    token = _current_trace.set(trace)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.duration = time.perf_counter() - trace.start
+        export_trace(trace)
+
+
+def export_trace(trace: Trace) -> None:
+    """Log slow traces with their time breakdown and append them to the export file."""
+    if trace.duration >= settings.trace_log_threshold_seconds:
+        breakdown = ", ".join(
+            f"{kind} {seconds:.3f}s"
+            for kind, seconds in sorted(
+                trace.self_times().items(), key=lambda item: item[1], reverse=True
+            )
+        )
+        logger.info(
+            f"Trace {trace.trace_id} {trace.name} took {trace.duration:.3f}s: "
+            f"{breakdown}"
+        )
+    if settings.trace_export_path:
+        try:
+            with open(settings.trace_export_path, "a") as f:
+                f.write(json.dumps(trace.to_dict(), default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Error exporting trace: {str(e)}")
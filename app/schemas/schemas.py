@@ -13,6 +13,7 @@ class Question(BaseModel):
         max_length=settings.max_question_length,
         min_length=1,
     )
+    user_id: str = Field("1", description="Unique identifier for the user")
 
 
 class Response(BaseModel):
@@ -139,5 +140,6 @@ class UserPreferencesResponse(BaseModel):
     year_range: str | None = None
     rating_min: float | None = None
     embedding: List[float] | None = None
+    embedding_model: str | None = None
     message: str | None = None
     error: str | None = None
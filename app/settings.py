@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import AnyUrl, Field
 from pydantic_settings import BaseSettings
 
@@ -9,9 +11,67 @@ class Settings(BaseSettings):
     llm_name: str = Field(default="llama3.2")
     llm_api_key: str = Field(default="ollama")
     tmdb_api_key: str = Field(default="")
+    tmdb_base_url: str = Field(default="https://api.themoviedb.org/3")
+    tmdb_rate_limit: float = Field(default=40.0)
+    tmdb_max_concurrency: int = Field(default=20)
+    http_max_connections: int = Field(default=100)
+    http_max_keepalive_connections: int = Field(default=20)
+    http_timeout_seconds: float = Field(default=30.0)
+    http_connect_timeout_seconds: float = Field(default=5.0)
+    sqlite_db_path: str = Field(default="movies_recommender.db")
+    recommendation_popularity_weight: float = Field(default=0.0)
+    recommendation_rating_weight: float = Field(default=0.0)
+    centroid_blend_weight: float = Field(default=0.3)
+    hybrid_search_candidates: int = Field(default=100)
+    hybrid_search_rrf_k: int = Field(default=60)
     max_question_length: int = Field(default=512)
+    request_deadline_seconds: float = Field(default=60.0)
+    tool_output_token_budget: int = Field(default=300)
+    tool_overview_max_chars: int = Field(default=200)
+    agent_max_sessions: int = Field(default=1000)
+    answer_cache_enabled: bool = Field(default=False)
+    answer_cache_max_entries: int = Field(default=1024)
+    answer_cache_ttl_seconds: float = Field(default=600.0)
+    answer_cache_similarity_threshold: float = Field(default=0.95)
+    embedding_backend: Literal["openai", "local"] = Field(default="openai")
     embedding_model_name: str = Field(default="text-embedding-3-small")
+    local_embedding_dim: int = Field(default=384)
+    embedding_rate_limit: float = Field(default=50.0)
+    embedding_max_concurrency: int = Field(default=8)
+    embedding_quantization: Literal["none", "float16", "int8"] = Field(default="none")
+    embedding_rerank_factor: int = Field(default=10)
+    embedding_workers: int = Field(default=2)
+    embedding_batch_size: int = Field(default=32)
+    embedding_max_attempts: int = Field(default=5)
+    embedding_retry_base_seconds: float = Field(default=5.0)
+    embedding_retry_max_seconds: float = Field(default=600.0)
+    embedding_job_lease_seconds: float = Field(default=300.0)
+    embedding_queue_poll_seconds: float = Field(default=2.0)
+    catalog_retention_days: float = Field(default=365.0)
+    catalog_min_popularity: float = Field(default=0.0)
+    catalog_max_movies: int = Field(default=50000)
+    catalog_maintenance_interval_hours: float = Field(default=24.0)
+    vector_index_enabled: bool = Field(default=True)
+    vector_index_dir: str = Field(default="")
+    health_cache_seconds: float = Field(default=5.0)
+    readiness_min_catalog_movies: int = Field(default=1)
+    readiness_require_vector_index: bool = Field(default=True)
+    readiness_wait_for_startup_scrape: bool = Field(default=True)
+    readiness_max_scrape_lag_hours: float = Field(default=0.0)
+    readiness_max_embedding_queue_depth: int = Field(default=0)
+    readiness_max_agent_runs: int = Field(default=0)
+    metrics_enabled: bool = Field(default=False)
+    tracing_enabled: bool = Field(default=True)
+    trace_log_threshold_seconds: float = Field(default=10.0)
+    trace_export_path: str = Field(default="")
+    profile_sample_rate: float = Field(default=0.0)
+    profile_interval_ms: float = Field(default=5.0)
+    profile_dir: str = Field(default="profiles")
+    cassette_mode: Literal["off", "record", "replay"] = Field(default="off")
+    cassette_path: str = Field(default="")
+    cassette_latency_scale: float = Field(default=1.0)
     telegram_bot_token: str = Field(default="")
+    run_telegram_bot: bool = Field(default=True)
 
 
 settings = Settings()
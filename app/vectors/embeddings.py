@@ -0,0 +1,132 @@
+import re
+from typing import Protocol
+
+import numpy as np
+
+from app.clients.openai import openai_client
+from app.settings import settings
+
+# Odd 64-bit constants for the polynomial n-gram hash and the splitmix64 finalizer
+_PRIME = np.uint64(0x100000001B3)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+class EmbeddingBackend(Protocol):
+    """Turns text into vectors, `model_id` is stored with every vector it produced."""
+
+    model_id: str
+
+    def embed(self, text: str) -> list[float]: ...
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]: ...
+
+    async def aembed(self, text: str) -> list[float]: ...
+
+
+class OpenAIEmbeddingBackend:
+    """Embeddings from the OpenAI compatible API (settings.embedding_model_name)."""
+
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name or settings.embedding_model_name
+        self.model_id = f"openai:{self.model_name}"
+
+    def embed(self, text: str) -> list[float]:
+        return openai_client.get_embedding(text)
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        # One request for the whole batch
+        return openai_client.get_embeddings(texts)
+
+    async def aembed(self, text: str) -> list[float]:
+        return await openai_client.aget_embedding(text)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, spreads the bits of the n-gram hashes."""
+    values = (values ^ (values >> np.uint64(30))) * _MIX_1
+    values = (values ^ (values >> np.uint64(27))) * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+class HashingEmbeddingBackend:
+    """
+    CPU-only embeddings: hashed character n-grams projected to `dim` dimensions.
+
+    Each distinct n-gram of the normalized text is weighted by its sublinear term
+    frequency (1 + log tf) and added with a random sign to `projections` positions
+    derived from its hash, which is a sparse random projection of the hashed n-gram
+    counts that never materializes the projection matrix. Vectors are L2-normalized,
+    deterministic across processes and take well under a millisecond per overview.
+    """
+
+    version = 1
+
+    def __init__(
+        self,
+        dim: int = 384,
+        min_n: int = 3,
+        max_n: int = 5,
+        projections: int = 4,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+        self.projections = projections
+        # One salt per projection, so each n-gram lands on independent positions
+        self._salts = _mix(np.arange(1, projections + 1, dtype=np.uint64) + seed)
+        self.model_id = (
+            f"local:hashing-v{self.version}-{dim}d-ngram{min_n}-{max_n}-"
+            f"p{projections}-s{seed}"
+        )
+
+    def _ngram_hashes(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        normalized = f" {' '.join(words)} "
+        data = np.frombuffer(normalized.encode(), dtype=np.uint8).astype(np.uint64)
+        hashes = []
+        for n in range(self.min_n, self.max_n + 1):
+            count = len(data) - n + 1
+            if count <= 0:
+                break
+            ngram = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                ngram = ngram * _PRIME + data[offset : offset + count]
+            hashes.append(ngram)
+        if not hashes:
+            return np.empty(0, dtype=np.uint64)
+        return np.concatenate(hashes)
+
+    def embed(self, text: str) -> list[float]:
+        features, counts = np.unique(self._ngram_hashes(text), return_counts=True)
+        weights = 1 + np.log(counts)
+        vector = np.zeros(self.dim, dtype=np.float64)
+        for salt in self._salts:
+            mixed = _mix(features ^ salt)
+            positions = (mixed % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where(mixed >> np.uint64(63), 1.0, -1.0)
+            vector += np.bincount(
+                positions, weights=signs * weights, minlength=self.dim
+            )
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.astype(np.float32).tolist()
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed(text) for text in texts]
+
+    async def aembed(self, text: str) -> list[float]:
+        # CPU-bound and sub-millisecond, not worth a thread hop
+        return self.embed(text)
+
+
+def create_embedding_backend(name: str = None) -> EmbeddingBackend:
+    name = name or settings.embedding_backend
+    if name == "local":
+        return HashingEmbeddingBackend(dim=settings.local_embedding_dim)
+    return OpenAIEmbeddingBackend()
+
+
+embedding_backend = create_embedding_backend()
@@ -0,0 +1,163 @@
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+LOCK = ".lock"
+
+
+class IndexSnapshot(NamedTuple):
+    version: int
+    ids: np.ndarray  # sorted movie ids, row i of the matrix belongs to ids[i]
+    matrix: np.ndarray
+    format: str
+    embedding_model: str
+
+    def locate(self, movie_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Matrix rows of `movie_ids` and a mask of the ids present in the snapshot."""
+        if not len(self.ids):
+            return np.zeros(len(movie_ids), dtype=np.int64), np.zeros(
+                len(movie_ids), dtype=bool
+            )
+        rows = np.minimum(np.searchsorted(self.ids, movie_ids), len(self.ids) - 1)
+        return rows, self.ids[rows] == movie_ids
+
+
+class VectorIndex:
+    """
+    Versioned, memory-mapped copy of the catalog vectors stored in a directory.
+
+    Each export writes `v<version>.npy` (the matrix) and `v<version>.ids.npy` (sorted
+    movie ids) and then atomically replaces `manifest.json` to point at them. Readers
+    map the files read-only, so worker processes share one copy through the page
+    cache, and switch to a new version the next time they see the manifest change.
+    Mapped versions stay valid after they are pruned from the directory. Exports of
+    all processes are serialized by an flock on `.lock` in the directory.
+    """
+
+    def __init__(self, directory: str | Path, keep_versions: int = 2):
+        self.directory = Path(directory)
+        self.keep_versions = keep_versions
+        self._manifest_stat: Optional[tuple[int, int]] = None
+        self._snapshot: Optional[IndexSnapshot] = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / MANIFEST
+
+    def read_manifest(self) -> Optional[dict]:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        """The current version of the index, reloaded when the manifest changed."""
+        try:
+            stat = self.manifest_path.stat()
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_ino)
+        if key != self._manifest_stat:
+            try:
+                manifest = self.read_manifest()
+                self._snapshot = IndexSnapshot(
+                    version=manifest["version"],
+                    ids=np.load(self.directory / manifest["ids"], mmap_mode="r"),
+                    matrix=np.load(self.directory / manifest["matrix"], mmap_mode="r"),
+                    format=manifest["format"],
+                    embedding_model=manifest.get("embedding_model"),
+                )
+                logger.info(f"Mapped vector index version {manifest['version']}")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error(f"Error loading vector index: {str(e)}")
+                self._snapshot = None
+            self._manifest_stat = key
+        return self._snapshot
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the directory's export lock, shared by all processes."""
+        with open(self.directory / LOCK, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @contextmanager
+    def write(
+        self,
+        count: int,
+        dim: int,
+        dtype: np.dtype,
+        format: str,
+        embedding_model: str = None,
+    ) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Write a new version: yields writable (ids, matrix) arrays to fill, sorted by
+        id, and publishes them when the block exits without an error.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Held from choosing the version until it is published, so exports of other
+        # workers neither claim the same version nor mix their files with ours
+        with self._locked():
+            manifest = self.read_manifest()
+            version = (manifest["version"] if manifest else 0) + 1
+            names = {"matrix": f"v{version}.npy", "ids": f"v{version}.ids.npy"}
+            temporary = {
+                key: self.directory / f"{name}.{os.getpid()}.tmp"
+                for key, name in names.items()
+            }
+            try:
+                ids = np.lib.format.open_memmap(
+                    temporary["ids"], mode="w+", dtype=np.int64, shape=(count,)
+                )
+                matrix = np.lib.format.open_memmap(
+                    temporary["matrix"], mode="w+", dtype=dtype, shape=(count, dim)
+                )
+                yield ids, matrix
+                ids.flush()
+                matrix.flush()
+                del ids, matrix
+                for key, name in names.items():
+                    os.replace(temporary[key], self.directory / name)
+            finally:
+                for path in temporary.values():
+                    path.unlink(missing_ok=True)
+
+            self._replace_manifest(
+                {
+                    "version": version,
+                    "format": format,
+                    "embedding_model": embedding_model,
+                    "count": count,
+                    "dim": dim,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    **names,
+                }
+            )
+            self._prune(version)
+
+    def _replace_manifest(self, manifest: dict) -> None:
+        temporary = self.directory / f"{MANIFEST}.{os.getpid()}.tmp"
+        temporary.write_text(json.dumps(manifest, indent=2))
+        os.replace(temporary, self.manifest_path)
+
+    def _prune(self, version: int) -> None:
+        for path in self.directory.glob("v*.npy"):
+            try:
+                path_version = int(path.name[1:].split(".")[0])
+            except ValueError:
+                continue
+            if path_version <= version - self.keep_versions:
+                path.unlink(missing_ok=True)
@@ -0,0 +1,58 @@
+import numpy as np
+
+# Storage formats of catalog vectors, "none" keeps full precision float32
+QUANTIZATION_DTYPES = {"none": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+def quantize(vectors: np.ndarray, mode: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize each row of `vectors`.
+
+    int8 codes are scaled per vector so that the largest component maps to 127, the
+    scale is returned alongside the codes (1.0 for the other formats).
+    """
+    if mode not in QUANTIZATION_DTYPES:
+        raise ValueError(f"Unknown embedding quantization: {mode}")
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if mode != "int8":
+        return vectors.astype(QUANTIZATION_DTYPES[mode]), scales
+
+    peaks = np.abs(vectors).max(axis=1)
+    np.divide(peaks, 127, out=scales, where=peaks > 0)
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return np.atleast_2d(codes).astype(np.float32) * scales[:, None]
+
+
+def cosine_scores(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    rows: np.ndarray = None,
+    chunk_size: int = 2048,
+) -> np.ndarray:
+    """
+    Cosine similarity of every row of `matrix` (or of the given `rows`) to `query`.
+
+    The matrix may hold quantized codes (per-vector scales cancel out of the cosine)
+    or be memory-mapped, rows are read and widened to float32 `chunk_size` at a time
+    so scoring never holds a full precision copy of the catalog.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    count = len(matrix) if rows is None else len(rows)
+    scores = np.empty(count, dtype=np.float32)
+    for start in range(0, count, chunk_size):
+        if rows is None:
+            chunk = matrix[start : start + chunk_size]
+        else:
+            chunk = matrix[rows[start : start + chunk_size]]
+        chunk = chunk.astype(np.float32, copy=False)
+        norms = np.linalg.norm(chunk, axis=1) * query_norm
+        scores[start : start + chunk_size] = (chunk @ query) / np.where(
+            norms == 0, 1, norms
+        )
+    return scores
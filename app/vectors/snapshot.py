@@ -0,0 +1,151 @@
+"""
+Catalog snapshots: movie metadata, genres and packed embeddings in one file, so a new
+instance can bulk-load the catalog instead of scraping and embedding it.
+
+Usage:
+    python -m app.vectors.snapshot export [PATH] [--db movies_recommender.db]
+    python -m app.vectors.snapshot import PATH [--db movies_recommender.db] [--replace]
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Metadata columns of movie_embeddings stored with every movie
+MOVIE_COLUMNS = (
+    "title",
+    "genres",
+    "overview",
+    "poster_path",
+    "release_date",
+    "vote_average",
+    "popularity",
+)
+
+
+class CatalogSnapshot(NamedTuple):
+    embedding_model: str
+    ids: np.ndarray  # int64, one per movie
+    embeddings: np.ndarray  # float32 (count, dim), row i belongs to ids[i]
+    movies: list[dict]  # MOVIE_COLUMNS of each movie
+    created_at: str
+
+
+def default_path(embedding_model: str, directory: str | Path = "snapshots") -> Path:
+    """Snapshots are named after the embedding model their vectors belong to."""
+    name = re.sub(r"[^\w.-]+", "_", embedding_model)
+    return Path(directory) / f"catalog-{name}.npz"
+
+
+def _json_array(value) -> np.ndarray:
+    return np.frombuffer(json.dumps(value).encode(), dtype=np.uint8)
+
+
+def write_snapshot(path: str | Path, snapshot: CatalogSnapshot) -> None:
+    """Write a snapshot atomically: a zip of the manifest, ids, vectors and movies."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "embedding_model": snapshot.embedding_model,
+        "count": len(snapshot.ids),
+        "dim": int(snapshot.embeddings.shape[1]) if len(snapshot.ids) else 0,
+        "created_at": snapshot.created_at,
+    }
+    temporary = path.with_name(f".{path.name}.tmp")
+    with open(temporary, "wb") as f:
+        np.savez(
+            f,
+            manifest=_json_array(manifest),
+            ids=snapshot.ids.astype(np.int64),
+            embeddings=snapshot.embeddings.astype(np.float32),
+            movies=_json_array(snapshot.movies),
+        )
+    temporary.replace(path)
+
+
+def read_manifest(path: str | Path) -> dict:
+    with np.load(path) as data:
+        return json.loads(data["manifest"].tobytes())
+
+
+def read_snapshot(path: str | Path) -> CatalogSnapshot:
+    with np.load(path) as data:
+        manifest = json.loads(data["manifest"].tobytes())
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot format: {manifest.get('format_version')}"
+            )
+        return CatalogSnapshot(
+            embedding_model=manifest["embedding_model"],
+            ids=data["ids"],
+            embeddings=data["embeddings"],
+            movies=json.loads(data["movies"].tobytes()),
+            created_at=manifest["created_at"],
+        )
+
+
+def json_vectors(matrix: np.ndarray) -> list[str]:
+    """
+    JSON arrays of the rows of a float32 matrix, as stored in SQLite. Nine
+    significant digits round-trip float32 exactly and format faster and shorter
+    than json.dumps of the widened floats.
+    """
+    if not len(matrix):
+        return []
+    row_format = "[" + ",".join(["%.9g"] * matrix.shape[1]) + "]"
+    return [row_format % tuple(row) for row in matrix.tolist()]
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", help="Snapshot file")
+    parser.add_argument("--db", help="SQLite database, defaults to SQLITE_DB_PATH")
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="Delete the movies of the database before importing",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app.clients.sqlite import SQLiteClient
+    from app.settings import settings
+
+    client = SQLiteClient(db_path=args.db or settings.sqlite_db_path)
+    if args.command == "export":
+        path = args.path or default_path(client.embedding_backend.model_id)
+        count = client.export_snapshot(path)
+        if count is None:
+            return 1
+        sys.stdout.write(f"Exported {count} movies to {path}\n")
+        return 0
+
+    if not args.path:
+        parser.error("import needs the path of a snapshot")
+    count = client.import_snapshot(args.path, replace=args.replace)
+    if count is None:
+        return 1
+    sys.stdout.write(f"Imported {count} movies from {args.path}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from app.clients.sqlite import SQLiteClient
+from app.clients.titles import normalize_title
+from app.schemas.schemas import PreferenceData
+
+GENRES = [
+    "Action",
+    "Adventure",
+    "Animation",
+    "Comedy",
+    "Crime",
+    "Documentary",
+    "Drama",
+    "Family",
+    "Fantasy",
+    "History",
+    "Horror",
+    "Music",
+    "Mystery",
+    "Romance",
+    "Science Fiction",
+    "TV Movie",
+    "Thriller",
+    "War",
+    "Western",
+]
+
+# Plot keywords of the synthetic overviews, for the full-text index
+THEMES = [
+    "heist",
+    "space",
+    "revenge",
+    "wedding",
+    "zombie",
+    "detective",
+    "pirate",
+    "robot",
+    "vampire",
+    "boxing",
+    "submarine",
+    "dragon",
+    "election",
+    "treasure",
+    "haunted",
+    "spy",
+    "cowboy",
+    "samurai",
+    "tornado",
+    "chess",
+]
+
+# Catalog sizes and embedding dimension can be overridden, e.g.
+# BENCHMARK_CATALOG_SIZES=1000,10000,100000 for the full run.
+CATALOG_SIZES = [
+    int(size)
+    for size in os.environ.get("BENCHMARK_CATALOG_SIZES", "1000,10000").split(",")
+]
+EMBEDDING_DIM = int(os.environ.get("BENCHMARK_EMBEDDING_DIM", "1536"))
+REPEATS = int(os.environ.get("BENCHMARK_REPEATS", "5"))
+
+
+class Catalog(NamedTuple):
+    client: SQLiteClient
+    size: int
+
+
+def random_unit_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    """Random unit vectors shaped like the output of an embedding model."""
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build_catalog(db_path: Path, size: int, dim: int, seed: int = 42) -> SQLiteClient:
+    """Create a SQLite catalog with `size` synthetic movies."""
+    rng = np.random.default_rng(seed)
+    client = SQLiteClient(db_path=str(db_path))
+    conn = client._get_connection()
+    batch_size = 1000
+    for start in range(0, size, batch_size):
+        count = min(batch_size, size - start)
+        vectors = random_unit_vectors(rng, count, dim)
+        rows = []
+        for offset in range(count):
+            movie_id = start + offset + 1
+            genres = list(
+                rng.choice(GENRES, size=int(rng.integers(1, 4)), replace=False)
+            )
+            year = int(rng.integers(1950, 2026))
+            rows.append(
+                (
+                    movie_id,
+                    f"Movie {movie_id}",
+                    json.dumps(vectors[offset].tolist()),
+                    json.dumps(genres),
+                    f"Synthetic overview for movie {movie_id}, a "
+                    f"{rng.choice(THEMES)} story.",
+                    f"/poster_{movie_id}.jpg",
+                    f"{year}-{int(rng.integers(1, 13)):02d}-01",
+                    round(float(rng.uniform(1, 10)), 1),
+                    round(float(rng.exponential(50)), 3),
+                    client.embedding_backend.model_id,
+                    dim,
+                )
+            )
+        conn.executemany(
+            """
+            INSERT INTO movie_embeddings
+            (id, title, embedding, genre_ids, overview, poster_path,
+             release_date, vote_average, popularity, embedding_model, embedding_dim)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO movie_titles VALUES (?, ?)",
+            [(normalize_title(row[1])[0], row[0]) for row in rows],
+        )
+        conn.commit()
+    conn.close()
+
+    preferences = PreferenceData(
+        genre=["Drama", "Thriller"],
+        favourite_movies=["Movie 1", "Movie 2"],
+        year_range=(1990, 2020),
+        rating_min=6.0,
+    )
+    client.update_preferences(
+        "1",
+        preferences,
+        "Synthetic preference text.",
+        random_unit_vectors(rng, 1, dim)[0].tolist(),
+    )
+    return client
+
+
+def measure(fn, repeats: int = REPEATS) -> dict:
+    """Run `fn` repeatedly and return latency statistics and the peak traced memory."""
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "repeats": repeats,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+        "peak_mib": round(peak / 2**20, 3),
+    }
@@ -0,0 +1,62 @@
+"""
+Compare two benchmark result files written by the benchmark suite.
+
+Usage:
+    python -m tests.benchmarks.compare baseline.json candidate.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import sys
+
+
+def _index(path: str) -> tuple[dict, dict]:
+    with open(path) as f:
+        data = json.load(f)
+    return data, {(r["name"], r["catalog_size"]): r for r in data["results"]}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", default="median_ms", help="Result field to compare")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown reported as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    baseline, baseline_results = _index(args.baseline)
+    candidate, candidate_results = _index(args.candidate)
+    sys.stdout.write(
+        f"{baseline.get('commit') or args.baseline} -> "
+        f"{candidate.get('commit') or args.candidate} ({args.metric})\n"
+    )
+
+    regressions = 0
+    for key, result in candidate_results.items():
+        previous = baseline_results.get(key)
+        if (
+            previous is None
+            or args.metric not in result
+            or not previous.get(args.metric)
+        ):
+            continue
+        change = result[args.metric] / previous[args.metric] - 1
+        marker = ""
+        if change > args.threshold:
+            marker = "  REGRESSION"
+            regressions += 1
+        name, size = key
+        sys.stdout.write(
+            f"{name:<50} {str(size):>8} {previous[args.metric]:>12.3f} "
+            f"{result[args.metric]:>12.3f} {change:>+8.1%}{marker}\n"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from tests.benchmarks.catalog import (
+    CATALOG_SIZES,
+    EMBEDDING_DIM,
+    Catalog,
+    build_catalog,
+)
+
+RESULTS_PATH = Path(os.environ.get("BENCHMARK_RESULTS", ".benchmarks/results.json"))
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@pytest.fixture(scope="session")
+def benchmark_results():
+    """Collects benchmark records and writes them to BENCHMARK_RESULTS as JSON."""
+    results: list[dict] = []
+    yield results
+
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    RESULTS_PATH.write_text(
+        json.dumps(
+            {
+                "commit": _git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "embedding_dim": EMBEDDING_DIM,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+@pytest.fixture(scope="session")
+def record(benchmark_results):
+    def _record(name: str, catalog_size: int | None, stats: dict, **extra) -> dict:
+        entry = {"name": name, "catalog_size": catalog_size, **stats, **extra}
+        benchmark_results.append(entry)
+        return entry
+
+    return _record
+
+
+@pytest.fixture(scope="session", params=CATALOG_SIZES, ids=lambda size: f"{size}")
+def catalog(request, tmp_path_factory):
+    db_path = tmp_path_factory.mktemp(f"catalog_{request.param}") / "movies.db"
+    return Catalog(build_catalog(db_path, request.param, EMBEDDING_DIM), request.param)
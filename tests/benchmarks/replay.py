@@ -0,0 +1,219 @@
+"""
+Replay recorded cassettes against the current code and report the wall time of
+every question and agent step, with the upstream latency taken from the cassette.
+
+Record a cassette with CASSETTE_MODE=record CASSETTE_PATH=cassettes/session.jsonl.gz
+and a normal session, then:
+
+Usage:
+    python -m tests.benchmarks.replay cassettes/*.jsonl.gz [--db movies.db]
+        [--snapshot catalog.npz] [--latency-scale 0] [--repeat 3]
+        [--results .benchmarks/replay.json]
+
+Every run starts from a copy of the catalog (`--db` or `--snapshot`) with empty
+agent memories. The results can be compared with tests.benchmarks.compare.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def _header(path: str) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+
+def _configure(headers: list[dict], workdir: Path) -> None:
+    """Settings of the replayed sessions, set before the app is imported."""
+    models = {header["embedding_model_name"] for header in headers}
+    if len(models) > 1:
+        raise SystemExit(
+            f"Cassettes recorded with different embedding models: {models}"
+        )
+    header = headers[0]
+    os.environ["LLM_NAME"] = header["llm_name"]
+    os.environ["EMBEDDING_BACKEND"] = header["embedding_backend"]
+    os.environ["EMBEDDING_MODEL_NAME"] = header["embedding_model_name"]
+    os.environ["SQLITE_DB_PATH"] = str(workdir / "movies.db")
+    os.environ["VECTOR_INDEX_DIR"] = str(workdir / "vectors")
+    os.environ["ANSWER_CACHE_ENABLED"] = "false"
+    os.environ["TRACING_ENABLED"] = "true"
+    os.environ["TRACE_LOG_THRESHOLD_SECONDS"] = "1000000"
+    os.environ["RUN_TELEGRAM_BOT"] = "false"
+    # Never reached, every upstream call is served from the cassette
+    os.environ.setdefault("LLM_HOST", "http://replay.invalid/")
+    os.environ.setdefault("TMDB_API_KEY", "replay")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _stats(timings: list[float]) -> dict:
+    timings = sorted(timings)
+    return {
+        "repeats": len(timings),
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("cassettes", nargs="+")
+    parser.add_argument("--db", help="SQLite catalog to start every run from")
+    parser.add_argument("--snapshot", help="Catalog snapshot to start every run from")
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="Factor of the recorded upstream latency, 0 replays without waiting",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--results", default=".benchmarks/replay.json")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="replay-"))
+    _configure([_header(path) for path in args.cassettes], workdir)
+
+    import numpy as np
+    from app.agent.agent import agents, answer_question, new_agent
+    from app.clients.cassette import Cassette, use_cassette
+    from app.clients.sqlite import SQLiteClient, sqlite_client
+    from app.observability.tracing import start_trace
+    from smolagents.monitoring import LogLevel
+
+    # The step logs would bury the report
+    agents.factory = lambda: new_agent(verbosity_level=LogLevel.OFF)
+
+    pristine = workdir / "pristine.db"
+    if args.db:
+        shutil.copyfile(args.db, pristine)
+    else:
+        client = SQLiteClient(
+            db_path=str(pristine), vector_index_dir=str(workdir / "pristine.vectors")
+        )
+        if args.snapshot and client.import_snapshot(args.snapshot) is None:
+            raise SystemExit(f"Could not import {args.snapshot}")
+    catalog = SQLiteClient(db_path=str(pristine)).catalog_stats() or {}
+
+    results = []
+    diverged = 0
+    stats: dict[str, int] = defaultdict(int)
+    for path in args.cassettes:
+        name = Path(path).name.split(".")[0]
+        questions = Cassette.load(path).channel("question")
+        totals: list[float] = []
+        timings: dict[int, list[float]] = defaultdict(list)
+        steps: dict[int, list[list[float]]] = defaultdict(list)
+        self_times: dict[int, dict[str, list[float]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        for _ in range(args.repeat):
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{sqlite_client.db_path}{suffix}").unlink(missing_ok=True)
+            shutil.copyfile(pristine, sqlite_client.db_path)
+            sqlite_client.export_vector_index()
+            agents.clear()
+            cassette = Cassette.load(path, args.latency_scale)
+            total = 0.0
+            with use_cassette(cassette):
+                for index, exchange in enumerate(questions):
+                    positional, keywords = exchange.request
+                    with start_trace(f"replay {name} #{index}") as trace:
+                        try:
+                            answer = answer_question(*positional, **keywords)
+                        except Exception as e:
+                            answer = f"{type(e).__name__}: {e}"
+                    diverged += str(answer) != str(exchange.result)
+                    timings[index].append(trace.duration * 1000)
+                    total += trace.duration * 1000
+                    steps[index].append(
+                        [
+                            span.duration * 1000
+                            for span in trace.spans
+                            if span.name == "agent.step"
+                        ]
+                    )
+                    for kind, seconds in trace.self_times().items():
+                        self_times[index][kind].append(seconds * 1000)
+            totals.append(total)
+            for key, value in cassette.stats.items():
+                stats[key] += value
+
+        size = catalog.get("movies")
+        results.append(
+            {"name": f"replay.{name}", "catalog_size": size, **_stats(totals)}
+        )
+        for index, exchange in enumerate(questions):
+            # Runs may take a different number of steps once the code changed
+            step_count = min(len(run) for run in steps[index])
+            results.append(
+                {
+                    "name": f"replay.{name}.{index}",
+                    "catalog_size": size,
+                    **_stats(timings[index]),
+                    "question": exchange.request[0][0],
+                    "steps_ms": [
+                        round(statistics.median(run[i] for run in steps[index]), 3)
+                        for i in range(step_count)
+                    ],
+                    "self_ms": {
+                        kind: round(statistics.median(values), 3)
+                        for kind, values in sorted(self_times[index].items())
+                    },
+                }
+            )
+
+    for result in results:
+        steps_ms = " ".join(f"{ms:.0f}" for ms in result.get("steps_ms", []))
+        sys.stdout.write(
+            f"{result['name']:<40} {result['median_ms']:>10.1f} ms"
+            f"{'  steps ' + steps_ms if steps_ms else ''}\n"
+        )
+    sys.stdout.write(
+        f"{diverged} answers differ from the recording, cassette lookups: "
+        f"{dict(stats)}\n"
+    )
+
+    results_path = Path(args.results)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    results_path.write_text(
+        json.dumps(
+            {
+                "commit": _git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "latency_scale": args.latency_scale,
+                "answers_diverged": diverged,
+                "cassette_stats": dict(stats),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from app.agent.outputs import compact_movies, compact_preferences, estimate_tokens
+from app.clients.embedding_queue import EmbeddingWorkerPool
+from app.clients.openai import openai_client
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import MovieInfo, PreferenceData, UserPreferencesResponse
+from app.vectors.embeddings import HashingEmbeddingBackend
+from app.vectors.quantization import QUANTIZATION_DTYPES
+
+from tests.benchmarks.catalog import EMBEDDING_DIM, measure, random_unit_vectors
+
+SEARCH_FILTERS = {
+    "no_filter": {},
+    "genre": {"genres": ["Drama", "Thriller"]},
+    "year": {"year_range": (1990, 2010)},
+    "genre_year": {"genres": ["Drama", "Thriller"], "year_range": (1990, 2010)},
+    "query": {"query": "a heist movie"},
+    "query_genre": {"query": "a heist movie", "genres": ["Drama", "Thriller"]},
+}
+RECALL_QUERIES = 20
+RECALL_K = 10
+
+
+@pytest.mark.parametrize("filter_name", SEARCH_FILTERS)
+def test_get_most_similar_movies(catalog, record, filter_name):
+    preferences = catalog.client.get_preferences("1", include_embedding=True)
+    filters = SEARCH_FILTERS[filter_name]
+
+    result = catalog.client.get_most_similar_movies(preferences, limit=5, **filters)
+    stats = measure(
+        lambda: catalog.client.get_most_similar_movies(preferences, limit=5, **filters)
+    )
+
+    assert 0 < len(result) <= 5
+    record(f"get_most_similar_movies[{filter_name}]", catalog.size, stats)
+
+
+@pytest.fixture(scope="session")
+def exact_neighbours(catalog):
+    """Random queries and the ids of their exact top RECALL_K movies."""
+    queries = random_unit_vectors(
+        np.random.default_rng(3), RECALL_QUERIES, EMBEDDING_DIM
+    ).tolist()
+    neighbours = [
+        {
+            movie.id
+            for movie in catalog.client.get_most_similar_movies(
+                {"embedding": query}, limit=RECALL_K
+            )
+        }
+        for query in queries
+    ]
+    return queries, neighbours
+
+
+@pytest.mark.parametrize("rerank_factor", [1, 10])
+@pytest.mark.parametrize("quantization", ["none", "float16", "int8"])
+def test_quantized_search(
+    catalog, record, exact_neighbours, quantization, rerank_factor
+):
+    if quantization == "none" and rerank_factor > 1:
+        pytest.skip("re-ranking only applies to quantized search")
+    client = SQLiteClient(
+        db_path=catalog.client.db_path,
+        quantization=quantization,
+        rerank_factor=rerank_factor,
+    )
+    client.backfill_quantized_embeddings()
+    queries, neighbours = exact_neighbours
+
+    recalls = [
+        len(
+            expected
+            & {
+                movie.id
+                for movie in client.get_most_similar_movies(
+                    {"embedding": query}, limit=RECALL_K
+                )
+            }
+        )
+        / RECALL_K
+        for query, expected in zip(queries, neighbours)
+    ]
+    stats = measure(
+        lambda: client.get_most_similar_movies({"embedding": queries[0]}, limit=5)
+    )
+
+    record(
+        f"quantized_search[{quantization},rerank={rerank_factor}]",
+        catalog.size,
+        stats,
+        matrix_mib=round(
+            catalog.size
+            * EMBEDDING_DIM
+            * np.dtype(QUANTIZATION_DTYPES[quantization]).itemsize
+            / 2**20,
+            3,
+        ),
+        recall_at_k=round(float(np.mean(recalls)), 4),
+        k=RECALL_K,
+    )
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_indexed_search(catalog, record, tmp_path, quantization):
+    def client():
+        return SQLiteClient(
+            db_path=catalog.client.db_path,
+            quantization=quantization,
+            vector_index_dir=str(tmp_path / "vectors"),
+        )
+
+    preferences = catalog.client.get_preferences("1", include_embedding=True)
+    start = time.perf_counter()
+    client().export_vector_index()
+    export_ms = (time.perf_counter() - start) * 1000
+
+    # First search of a fresh process: maps the index instead of decoding SQLite
+    cold_client = client()
+    start = time.perf_counter()
+    result = cold_client.get_most_similar_movies(preferences, limit=5)
+    cold_start_ms = (time.perf_counter() - start) * 1000
+    stats = measure(lambda: cold_client.get_most_similar_movies(preferences, limit=5))
+
+    assert 0 < len(result) <= 5
+    record(
+        f"indexed_search[{quantization}]",
+        catalog.size,
+        stats,
+        export_ms=round(export_ms, 3),
+        cold_start_ms=round(cold_start_ms, 3),
+        index_mib=round(
+            sum(f.stat().st_size for f in (tmp_path / "vectors").glob("*.npy")) / 2**20,
+            3,
+        ),
+    )
+
+
+def test_insert_movie_throughput(catalog, record):
+    count = 200
+    rng = np.random.default_rng(7)
+    vectors = random_unit_vectors(rng, count, EMBEDDING_DIM)
+    movies = [
+        MovieInfo(
+            id=10_000_000 + index,
+            title=f"Inserted movie {index}",
+            overview=f"Inserted overview {index}.",
+            release_date="2024-01-01",
+            vote_average=7.0,
+            popularity=10.0,
+        )
+        for index in range(count)
+    ]
+
+    embeddings = iter(vectors.tolist())
+    with patch.object(
+        openai_client,
+        "get_embeddings",
+        side_effect=lambda texts: [next(embeddings) for _ in texts],
+    ):
+        start = time.perf_counter()
+        for movie in movies:
+            catalog.client.insert_movie(movie, ["Drama"])
+        inserted = time.perf_counter()
+        EmbeddingWorkerPool(catalog.client).drain()
+        elapsed = time.perf_counter() - start
+
+    record(
+        "insert_movie",
+        catalog.size,
+        {
+            "count": count,
+            "insert_ms": round((inserted - start) * 1000, 3),
+            "embed_ms": round((elapsed - (inserted - start)) * 1000, 3),
+            "total_ms": round(elapsed * 1000, 3),
+            "per_movie_ms": round(elapsed * 1000 / count, 3),
+            "movies_per_s": round(count / elapsed, 1),
+        },
+    )
+
+
+def test_local_embedding(record):
+    backend = HashingEmbeddingBackend()
+    overview = (
+        "A thief who steals corporate secrets through the use of dream-sharing "
+        "technology is given the inverse task of planting an idea into the mind of "
+        "a C.E.O., but his tragic past may doom the project and his team to disaster."
+    )
+
+    stats = measure(lambda: backend.embed(overview), repeats=200)
+
+    record("embed[local]", None, stats, dim=backend.dim)
+
+
+def test_update_preferences(tmp_path, record):
+    client = SQLiteClient(db_path=str(tmp_path / "preferences.db"))
+    embedding = random_unit_vectors(np.random.default_rng(1), 1, EMBEDDING_DIM)[0]
+    preferences = PreferenceData(
+        genre=["Drama"], favourite_movies=["Movie 1"], rating_min=6.0
+    )
+
+    stats = measure(
+        lambda: client.update_preferences(
+            "1", preferences, "Synthetic preference text.", embedding.tolist()
+        )
+    )
+
+    assert client.get_preferences("1") is not None
+    record("update_preferences", None, stats)
+
+
+@pytest.mark.parametrize("include_embedding", [True, False])
+def test_get_preferences(tmp_path, record, include_embedding):
+    client = SQLiteClient(db_path=str(tmp_path / "preferences.db"))
+    embedding = random_unit_vectors(np.random.default_rng(1), 1, EMBEDDING_DIM)[0]
+    client.update_preferences(
+        "1",
+        PreferenceData(genre=["Drama"], favourite_movies=["Movie 1"]),
+        "Synthetic preference text.",
+        embedding.tolist(),
+    )
+
+    stats = measure(
+        lambda: client.get_preferences("1", include_embedding=include_embedding),
+        repeats=50,
+    )
+
+    record(f"get_preferences[embedding={include_embedding}]", None, stats)
+
+
+def test_tool_output_tokens(catalog, record):
+    """Tokens the agent tools add to every following prompt, before and after."""
+    preferences = catalog.client.get_preferences("1", include_embedding=True)
+    response = UserPreferencesResponse(**preferences)
+    movies = catalog.client.get_most_similar_movies(preferences, limit=5)
+
+    for tool, full, compact in [
+        ("get_user_preferences", response.model_dump(), compact_preferences(response)),
+        ("suggest_movies", movies, compact_movies(movies)),
+    ]:
+        record(
+            f"tool_output_tokens[{tool}]",
+            catalog.size,
+            {},
+            tokens_before=estimate_tokens(full),
+            tokens_after=estimate_tokens(compact),
+        )
+
+
+def test_snapshot_import(catalog, record, tmp_path):
+    # Other benchmarks add movies to the session's catalog
+    movies = catalog.client.catalog_stats()["embedded"]
+    path = tmp_path / "catalog.npz"
+    start = time.perf_counter()
+    assert catalog.client.export_snapshot(path) == movies
+    export_ms = (time.perf_counter() - start) * 1000
+
+    target = SQLiteClient(db_path=str(tmp_path / "warm_start.db"))
+    start = time.perf_counter()
+    assert target.import_snapshot(path) == movies
+    import_ms = (time.perf_counter() - start) * 1000
+
+    record(
+        "snapshot_import",
+        catalog.size,
+        {},
+        export_ms=round(export_ms, 3),
+        import_ms=round(import_ms, 3),
+        snapshot_mib=round(path.stat().st_size / 2**20, 3),
+    )
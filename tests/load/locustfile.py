@@ -0,0 +1,92 @@
+"""
+Conversation scenarios for load tests against the stand-ins in tests/load/stubs.py.
+
+Every simulated user picks its own user id and walks through a conversation:
+state preferences, ask for suggestions, then follow up. Scenarios are drawn from a
+seeded random generator so runs are reproducible (LOAD_SEED, LOAD_USER_POOL).
+"""
+
+import json
+import os
+import random
+from itertools import count
+from pathlib import Path
+
+from locust import HttpUser, SequentialTaskSet, between, task
+
+SEED = int(os.environ.get("LOAD_SEED", "42"))
+USER_POOL = int(os.environ.get("LOAD_USER_POOL", "1000"))
+
+TITLES = [
+    movie["title"]
+    for movie in json.loads(
+        (Path(__file__).parent / "fixtures" / "tmdb.json").read_text()
+    )["movies"]
+]
+GENRES = ["comedy", "drama", "thriller", "science fiction", "animation", "crime"]
+PREFERENCE_TEMPLATES = [
+    "Hi! I really like {first} and {second}.",
+    "I love {first}, {second} and {third}.",
+    "My favourite films... I enjoyed {first} and {second}.",
+]
+SUGGESTION_TEMPLATES = [
+    "Can you recommend me something to watch tonight?",
+    "Suggest a few movies for me, please.",
+    "What would you recommend for a {genre} night?",
+]
+FOLLOW_UP_TEMPLATES = [
+    "Anything older?",
+    "Do you have something more recent?",
+    "Suggest another {genre} one.",
+    "Thanks, that's it for today.",
+]
+
+_user_numbers = count()
+HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+
+class Conversation(SequentialTaskSet):
+    def on_start(self):
+        number = next(_user_numbers)
+        self.rng = random.Random(SEED + number)
+        self.user_id = f"load-{number % USER_POOL}"
+
+    def ask(self, text: str, name: str):
+        with self.client.post(
+            "/question",
+            json={"text": text, "user_id": self.user_id},
+            headers=HEADERS,
+            name=name,
+            catch_response=True,
+        ) as response:
+            if response.status_code == 200:
+                response.success()
+            else:
+                response.failure(f"Unexpected status code: {response.status_code}")
+
+    @task
+    def state_preferences(self):
+        first, second, third = self.rng.sample(TITLES, 3)
+        text = self.rng.choice(PREFERENCE_TEMPLATES).format(
+            first=first, second=second, third=third
+        )
+        self.ask(text, "/question [preferences]")
+
+    @task
+    def ask_for_suggestions(self):
+        text = self.rng.choice(SUGGESTION_TEMPLATES).format(
+            genre=self.rng.choice(GENRES)
+        )
+        self.ask(text, "/question [suggestions]")
+
+    @task
+    def follow_up(self):
+        text = self.rng.choice(FOLLOW_UP_TEMPLATES).format(
+            genre=self.rng.choice(GENRES)
+        )
+        self.ask(text, "/question [follow-up]")
+
+
+class ConversationUser(HttpUser):
+    wait_time = between(1, 3)
+    tasks = [Conversation]
@@ -0,0 +1,260 @@
+"""
+Local stand-ins for the upstream services, for load tests without network access.
+
+Serves an OpenAI-compatible API (chat completions with tool calls and embeddings)
+under /v1 and the TMDB endpoints used by TMDBClient under /3 from a single app:
+
+    uvicorn tests.load.stubs:app --port 8090
+
+then point the app at it with LLM_HOST=http://localhost:8090/v1, LLM_NAME=openai/stub
+and TMDB_BASE_URL=http://localhost:8090/3 (see tests/load/stub.env).
+
+Latencies are configurable through STUB_CHAT_LATENCY_MS, STUB_EMBEDDING_LATENCY_MS
+and STUB_TMDB_LATENCY_MS, the embedding size through STUB_EMBEDDING_DIM.
+Embeddings are deterministic: the same text always gets the same vector and
+texts sharing words get similar vectors.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import re
+import time
+from itertools import count
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from fastapi import FastAPI, Request
+
+CHAT_LATENCY_MS = float(os.environ.get("STUB_CHAT_LATENCY_MS", "200"))
+EMBEDDING_LATENCY_MS = float(os.environ.get("STUB_EMBEDDING_LATENCY_MS", "20"))
+TMDB_LATENCY_MS = float(os.environ.get("STUB_TMDB_LATENCY_MS", "30"))
+EMBEDDING_DIM = int(os.environ.get("STUB_EMBEDDING_DIM", "1536"))
+TRENDING_PAGES = 20
+PAGE_SIZE = 20
+
+FIXTURES = json.loads((Path(__file__).parent / "fixtures" / "tmdb.json").read_text())
+GENRES = {genre["id"]: genre["name"] for genre in FIXTURES["genres"]}
+
+app = FastAPI(title="Upstream stand-ins")
+_completion_ids = count(1)
+
+
+async def _sleep(latency_ms: float) -> None:
+    if latency_ms > 0:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+def _seed(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "little")
+
+
+@functools.lru_cache(maxsize=65536)
+def _token_vector(token: str) -> np.ndarray:
+    return np.random.default_rng(_seed(token)).standard_normal(EMBEDDING_DIM)
+
+
+def embed(text: str) -> list[float]:
+    """Deterministic bag-of-words embedding, normalized to unit length."""
+    tokens = re.findall(r"\w+", text.lower()) or [""]
+    vector = np.sum([_token_vector(token) for token in tokens], axis=0)
+    return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# OpenAI-compatible API
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content)
+    return content
+
+
+def _tool_call(name: str, arguments: dict) -> dict:
+    return {
+        "id": f"call_{next(_completion_ids)}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+
+
+def _titles(task: str) -> list[str]:
+    match = re.search(r"(?:like|love|enjoyed)\s+(.+?)(?:[.!?\n]|$)", task, re.I)
+    if not match:
+        return []
+    return [
+        title.strip()
+        for title in re.split(r",\s*|\s+and\s+", match.group(1))
+        if title.strip()
+    ]
+
+
+def _genres(task: str) -> list[str]:
+    return [name for name in GENRES.values() if name.lower() in task.lower()]
+
+
+def plan_tool_call(messages: list[dict]) -> dict:
+    """
+    Decide the next tool call the way a cooperative LLM would.
+
+    The latest "New task:" message drives the decision, an observation from a previous
+    tool call is turned into the final answer.
+    """
+    texts = [_message_text(message) for message in messages]
+    last = texts[-1] if texts else ""
+    task = next((text for text in reversed(texts) if "New task:" in text), last)
+    task = task.split("New task:", 1)[-1]
+    user_match = re.search(r"'user_id':\s*'?([^',}]+)'?", task)
+    user_id = user_match.group(1) if user_match else "1"
+
+    if "Observation:" in last or last.startswith("Call id") or "Error:" in last:
+        observation = last.split("Observation:", 1)[-1].strip()
+        return _tool_call(
+            "final_answer", {"answer": f"Here is what I found: {observation[:300]}"}
+        )
+
+    lowered = task.lower()
+    if re.search(r"\b(like|love|enjoyed)\b", lowered) and _titles(task):
+        return _tool_call(
+            "store_user_preference",
+            {
+                "user_id": user_id,
+                "preferences": {"favourite_movies": _titles(task), "genre": []},
+            },
+        )
+    if re.search(r"\b(suggest|recommend|older|newer|recent|another)\b", lowered):
+        arguments: dict[str, Any] = {"user_id": user_id}
+        if genres := _genres(task):
+            arguments["genres"] = genres
+        if "older" in lowered:
+            arguments["year_range"] = [1970, 2000]
+        elif "newer" in lowered or "recent" in lowered:
+            arguments["year_range"] = [2010, 2025]
+        return _tool_call("suggest_movies", arguments)
+    return _tool_call(
+        "final_answer",
+        {"answer": "Tell me a couple of films you like and I'll find similar ones."},
+    )
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request) -> dict:
+    body = await request.json()
+    await _sleep(CHAT_LATENCY_MS)
+
+    messages = body.get("messages", [])
+    if body.get("tools"):
+        tool_call = plan_tool_call(messages)
+        message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+        completion_text = tool_call["function"]["arguments"]
+        finish_reason = "tool_calls"
+    else:
+        completion_text = "I'd suggest revisiting your favourite films."
+        message = {"role": "assistant", "content": completion_text}
+        finish_reason = "stop"
+
+    prompt_tokens = sum(_count_tokens(_message_text(m)) for m in messages)
+    completion_tokens = _count_tokens(completion_text)
+    return {
+        "id": f"chatcmpl-stub-{next(_completion_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request) -> dict:
+    body = await request.json()
+    await _sleep(EMBEDDING_LATENCY_MS)
+
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    prompt_tokens = sum(_count_tokens(str(text)) for text in inputs)
+    return {
+        "object": "list",
+        "model": body.get("model", "stub-embedding"),
+        "data": [
+            {"object": "embedding", "index": index, "embedding": embed(str(text))}
+            for index, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+# TMDB API
+
+
+def _synthetic_movie(key: str) -> dict:
+    """Deterministic movie for titles and trending slots missing from the fixtures."""
+    rng = np.random.default_rng(_seed(key))
+    genre_ids = [int(g) for g in rng.choice(list(GENRES), size=2, replace=False)]
+    title = key if not key.startswith("trending:") else f"Stub Movie {key[9:]}"
+    return {
+        "id": 1_000_000 + _seed(key) % 1_000_000,
+        "title": title,
+        "original_title": title,
+        "overview": (
+            f"{title} is a {' and '.join(GENRES[g] for g in genre_ids).lower()} "
+            "film about people facing an unexpected turn of events."
+        ),
+        "release_date": f"{int(rng.integers(1970, 2025))}-01-01",
+        "genre_ids": genre_ids,
+        "vote_average": round(float(rng.uniform(4, 9)), 1),
+        "vote_count": int(rng.integers(10, 10000)),
+        "popularity": round(float(rng.exponential(30)), 3),
+        "poster_path": f"/stub_{_seed(key) % 1_000_000}.jpg",
+        "video": False,
+    }
+
+
+def _page(results: list[dict], page: int, total_results: int) -> dict:
+    return {
+        "page": page,
+        "results": results,
+        "total_pages": max(1, -(-total_results // PAGE_SIZE)),
+        "total_results": total_results,
+    }
+
+
+@app.get("/3/search/movie")
+async def search_movie(query: str, page: int = 1) -> dict:
+    await _sleep(TMDB_LATENCY_MS)
+    needle = query.strip().lower()
+    results = [
+        movie for movie in FIXTURES["movies"] if needle in movie["title"].lower()
+    ] or [_synthetic_movie(query.strip())]
+    return _page(results, page, len(results))
+
+
+@app.get("/3/trending/movie/day")
+async def trending_movies(page: int = 1) -> dict:
+    await _sleep(TMDB_LATENCY_MS)
+    total = TRENDING_PAGES * PAGE_SIZE
+    start = (page - 1) * PAGE_SIZE
+    results = [
+        FIXTURES["movies"][index]
+        if index < len(FIXTURES["movies"])
+        else _synthetic_movie(f"trending:{index}")
+        for index in range(start, min(start + PAGE_SIZE, total))
+    ]
+    return _page(results, page, total)
+
+
+@app.get("/3/genre/movie/list")
+async def genre_list() -> dict:
+    await _sleep(TMDB_LATENCY_MS)
+    return {"genres": FIXTURES["genres"]}
@@ -0,0 +1,42 @@
+import threading
+
+from app.agent import agent as agent_module
+from app.agent.runtime import AgentSessions, MovieAgent
+
+
+def test_every_user_gets_their_own_agent():
+    sessions = AgentSessions(agent_module.new_agent, max_sessions=2)
+
+    first, _ = sessions.get("1")
+    assert sessions.get("2")[0] is not first
+    assert sessions.get("1")[0] is first
+
+    # User 2 is the least recently active one
+    sessions.get("3")
+    assert len(sessions) == 2
+    assert sessions.get("1")[0] is first
+
+
+def test_runs_of_different_users_do_not_wait_for_each_other(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def run_with_tools(self, task, *args, **kwargs):
+        if kwargs["additional_args"]["user_id"] == "1":
+            started.set()
+            release.wait(5)
+        return f"answer to {task}", []
+
+    monkeypatch.setattr(agent_module, "agents", AgentSessions(agent_module.new_agent))
+    monkeypatch.setattr(MovieAgent, "run_with_tools", run_with_tools)
+    monkeypatch.setattr(MovieAgent, "write_memory_to_messages", lambda self: [])
+    slow = threading.Thread(target=agent_module.answer_question, args=("hi", "1"))
+    slow.start()
+    started.wait(5)
+
+    try:
+        assert agent_module.answer_question("hello", "2") == "answer to hello"
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join()
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+from app.agent import agent as agent_module
+from app.agent.answer_cache import SemanticAnswerCache
+from app.agent.runtime import AgentSessions, MovieAgent
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import PreferenceData
+from app.settings import settings
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+QUESTION = "Recommend me something like Inception"
+
+
+@pytest.fixture
+def client(tmp_path):
+    return SQLiteClient(
+        db_path=str(tmp_path / "movies.db"), backend=HashingEmbeddingBackend()
+    )
+
+
+@pytest.fixture
+def cache(client):
+    return SemanticAnswerCache(client, threshold=0.85)
+
+
+def test_near_duplicate_questions_hit_the_users_answer(cache):
+    assert cache.put(QUESTION, "1", "Try Interstellar.", ["suggest_movies"])
+
+    assert cache.get("recommend me something like inception, please", "1") == (
+        "Try Interstellar."
+    )
+    assert cache.get("Recommend me something like Titanic", "1") is None
+    assert cache.get(QUESTION, "2") is None
+    assert cache.hit_rate == pytest.approx(1 / 3)
+
+
+def test_answers_without_tools_are_not_shared_between_users(cache):
+    assert cache.put("Hello there", "1", "Which films do you like?", [])
+
+    assert cache.get("hello there!", "2") is None
+    assert cache.get("hello there!", "1") == "Which films do you like?"
+
+
+def test_runs_which_stored_preferences_are_not_cached(cache):
+    assert not cache.put(
+        "I like Heat", "1", "Stored.", ["store_user_preference", "suggest_movies"]
+    )
+    assert cache.get("I like Heat", "1") is None
+
+
+def test_new_preferences_invalidate_the_users_answers(client, cache):
+    cache.put(QUESTION, "1", "Try Interstellar.", ["suggest_movies"])
+
+    client.update_preferences("1", PreferenceData(genre=["Drama"]), "", None)
+
+    assert cache.get(QUESTION, "1") is None
+
+
+def test_entries_expire_and_least_recently_used_are_evicted(client):
+    cache = SemanticAnswerCache(client, max_entries=2, ttl_seconds=0.1)
+    cache.put("first question", "1", "first", [])
+    cache.put("second question", "1", "second", [])
+    assert cache.get("first question", "1") == "first"
+
+    cache.put("third question", "1", "third", [])
+
+    assert cache.get("second question", "1") is None
+    assert cache.get("first question", "1") == "first"
+    time.sleep(0.15)
+    assert cache.get("third question", "1") is None
+    assert len(cache) == 0
+
+
+def test_answers_cut_short_by_the_deadline_are_not_cached(cache, monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_enabled", True)
+    monkeypatch.setattr(agent_module, "answer_cache", cache)
+    monkeypatch.setattr(agent_module, "agents", AgentSessions(agent_module.new_agent))
+    monkeypatch.setattr(
+        MovieAgent,
+        "run_with_tools",
+        lambda self, *args, **kwargs: (self.deadline_answer, []),
+    )
+    monkeypatch.setattr(MovieAgent, "write_memory_to_messages", lambda self: [])
+
+    answer = agent_module.answer_question("Hello there", "1")
+
+    assert answer == MovieAgent.deadline_answer
+    assert len(cache) == 0
+    assert cache.get("hello there", "1") is None
+
+
+def test_only_runs_which_started_without_memory_are_cached(cache, monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_enabled", True)
+    monkeypatch.setattr(agent_module, "answer_cache", cache)
+    monkeypatch.setattr(agent_module, "agents", AgentSessions(agent_module.new_agent))
+
+    def run_with_tools(self, task, *args, **kwargs):
+        # Stands in for the step the run leaves in the user's memory
+        self.memory.steps.append(task)
+        return f"Answer {len(self.memory.steps)}", []
+
+    monkeypatch.setattr(MovieAgent, "run_with_tools", run_with_tools)
+    monkeypatch.setattr(MovieAgent, "write_memory_to_messages", lambda self: [])
+
+    assert agent_module.answer_question("Hello there", "1") == "Answer 1"
+    assert agent_module.answer_question("Which one is scarier?", "1") == "Answer 2"
+
+    assert len(cache) == 1
+    assert agent_module.answer_question("hello there", "1") == "Answer 1"
+    assert agent_module.answer_question("which one is scarier", "1") == "Answer 3"
+
+
+def test_an_explicit_zero_threshold_is_kept(client):
+    cache = SemanticAnswerCache(client, threshold=0.0)
+    cache.put("Hello there", "1", "Which films do you like?", [])
+
+    assert cache.threshold == 0.0
+    assert cache.get("hello friend", "1") == "Which films do you like?"
+
+
+def test_concurrent_lookups_are_all_counted(cache):
+    def lookup():
+        for _ in range(200):
+            cache.get(QUESTION, "1")
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.misses == 800
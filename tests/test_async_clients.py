@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from app.clients.aio import io_loop, on_io_loop
+from app.clients.rate_limiter import UpstreamLimiter
+from app.clients.tmdb import TMDBClient
+
+
+async def slow_tmdb(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(0.2)
+    query = request.url.params["query"]
+    return httpx.Response(200, json={"results": [{"id": 1, "title": query}]})
+
+
+def test_tmdb_requests_overlap_on_the_io_loop():
+    client = TMDBClient(
+        api_key="test",
+        base_url="http://tmdb.test/3",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(slow_tmdb)),
+    )
+    titles = ["Heat", "Ronin", "Thief", "Collateral", "Manhunter"]
+
+    start = time.monotonic()
+    movies = io_loop.gather(*(client.asearch_movie(title) for title in titles))
+
+    assert [movie.title for movie in movies] == titles
+    assert time.monotonic() - start < 0.6
+
+
+def test_coroutines_awaited_from_another_loop_run_on_the_io_loop():
+    @on_io_loop
+    async def thread_name():
+        return threading.current_thread().name
+
+    assert asyncio.run(thread_name()) == "io-loop"
+
+
+def test_async_slot_waits_without_blocking_and_times_out():
+    limiter = UpstreamLimiter("test", rate=1000, max_concurrency=1)
+    limiter.acquire()
+
+    async def acquire():
+        async with limiter.aslot(timeout=0.05):
+            pass
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(acquire())
+    limiter.release(latency=0.01)
+    asyncio.run(acquire())
@@ -0,0 +1,128 @@
+import base64
+import gzip
+import json
+import time
+
+import httpx
+import pytest
+from app.agent.runtime import MovieLiteLLMModel
+from app.clients.aio import io_loop
+from app.clients.cassette import (
+    Cassette,
+    CassetteMiss,
+    ReplayedError,
+    recorded,
+    use_cassette,
+)
+from app.clients.tmdb import TMDBClient
+from smolagents import LiteLLMModel
+from smolagents.models import ChatMessage
+
+
+def tmdb_client(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.params["query"])
+        if request.url.params["query"] == "missing":
+            return httpx.Response(404, json={})
+        time.sleep(0.05)
+        return httpx.Response(200, json={"results": [{"id": 1, "title": "Heat"}]})
+
+    return TMDBClient(
+        api_key="test",
+        base_url="http://tmdb.test/3",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+def replay(cassette, path, latency_scale=1.0):
+    cassette.save(path)
+    return Cassette.load(path, latency_scale)
+
+
+def test_tmdb_exchanges_are_replayed_without_requests(tmp_path):
+    calls = []
+    client = tmdb_client(calls)
+    with use_cassette(Cassette()) as cassette:
+        assert io_loop.run(client.asearch_movie("Heat")).title == "Heat"
+        with pytest.raises(httpx.HTTPStatusError):
+            io_loop.run(client.asearch_movie("missing"))
+    assert len(calls) == 2
+
+    with use_cassette(replay(cassette, tmp_path / "session.jsonl.gz")) as replayed:
+        start = time.perf_counter()
+        assert io_loop.run(client.asearch_movie("Heat")).title == "Heat"
+        assert time.perf_counter() - start >= 0.05
+        with pytest.raises(ReplayedError, match="HTTPStatusError"):
+            io_loop.run(client.asearch_movie("missing"))
+        with pytest.raises(CassetteMiss):
+            io_loop.run(client.asearch_movie("Ronin"))
+
+    assert len(calls) == 2
+    assert replayed.stats == {"served": 2, "reused": 0, "out_of_order": 0, "missed": 1}
+
+
+def test_latency_is_scaled(tmp_path):
+    @recorded("sleep")
+    def slow(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    with use_cassette(Cassette()) as cassette:
+        slow(0.2)
+
+    with use_cassette(replay(cassette, tmp_path / "session.jsonl.gz", 0.1)):
+        start = time.perf_counter()
+        assert slow(0.2) == 0.2
+        assert time.perf_counter() - start < 0.1
+
+
+def test_embeddings_are_packed_as_float32(tmp_path):
+    embedding = [i / 7 for i in range(64)]
+
+    @recorded("embedding")
+    def embed(text):
+        return embedding
+
+    with use_cassette(Cassette()) as cassette:
+        embed("heist")
+    path = tmp_path / "session.jsonl.gz"
+
+    with use_cassette(replay(cassette, path, 0)):
+        assert embed("heist") == pytest.approx(embedding, abs=1e-6)
+    with gzip.open(path, "rt") as f:
+        line = json.loads(f.readlines()[1])
+    assert len(base64.b64decode(line["result"]["__f32__"])) == 64 * 4
+
+
+def test_llm_completions_are_replayed_in_order(tmp_path, monkeypatch):
+    answers = iter(["first", "second"])
+
+    def complete(self, messages, **kwargs):
+        self.last_input_token_count = 10
+        self.last_output_token_count = 2
+        return ChatMessage(role="assistant", content=next(answers))
+
+    monkeypatch.setattr(LiteLLMModel, "__call__", complete)
+    model = MovieLiteLLMModel(model_id="test")
+    prompt = [{"role": "user", "content": "Suggest a heist movie"}]
+    with use_cassette(Cassette()) as cassette:
+        model(prompt)
+        model(prompt + [{"role": "user", "content": "Another one"}])
+
+    with use_cassette(replay(cassette, tmp_path / "session.jsonl.gz", 0)) as replayed:
+        assert model(prompt).content == "first"
+        # A prompt changed by the code under test gets the next completion
+        assert model(prompt + [{"role": "user", "content": "Other"}]).content == (
+            "second"
+        )
+        assert model.last_input_token_count == 10
+
+    assert replayed.stats["out_of_order"] == 1
+
+
+def test_calls_pass_through_without_a_cassette():
+    @recorded("tmdb")
+    def fetch(endpoint):
+        return endpoint
+
+    assert fetch("/search/movie") == "/search/movie"
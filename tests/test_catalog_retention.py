@@ -0,0 +1,104 @@
+import time
+
+import pytest
+from app.clients.embedding_queue import EmbeddingWorkerPool
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import MovieInfo
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+DAY = 86400
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = SQLiteClient(
+        db_path=str(tmp_path / "movies.db"), backend=HashingEmbeddingBackend(dim=32)
+    )
+    for movie_id in range(1, 6):
+        client.insert_movie(
+            MovieInfo(
+                id=movie_id,
+                title=f"Movie {movie_id}",
+                overview=f"Overview of movie {movie_id}",
+                popularity=float(movie_id),
+            ),
+            [],
+        )
+    EmbeddingWorkerPool(client).drain()
+    return client
+
+
+def set_last_seen(client, days_ago):
+    conn = client._get_connection()
+    conn.executemany(
+        "UPDATE movie_embeddings SET last_seen_at = ? WHERE id = ?",
+        [(time.time() - days * DAY, movie_id) for movie_id, days in days_ago.items()],
+    )
+    conn.commit()
+    conn.close()
+
+
+def movie_ids(client):
+    conn = client._get_connection()
+    ids = [row[0] for row in conn.execute("SELECT id FROM movie_embeddings")]
+    conn.close()
+    return sorted(ids)
+
+
+def test_movies_not_seen_trending_are_pruned_from_catalog_and_index(client):
+    set_last_seen(client, {1: 400, 2: 30})
+
+    pruned = client.prune_catalog(retention_days=365, min_popularity=0, max_movies=0)
+
+    assert pruned == {"expired": 1, "unpopular": 0, "over_capacity": 0}
+    assert movie_ids(client) == [2, 3, 4, 5]
+    assert list(client.vector_index.snapshot().ids) == [2, 3, 4, 5]
+
+
+def test_trending_again_refreshes_the_movie(client):
+    set_last_seen(client, {1: 400})
+
+    movie = MovieInfo(id=1, title="Movie 1", popularity=9)
+    assert not client.insert_movie(movie, [], refresh=True)
+
+    assert client.prune_catalog(retention_days=365, max_movies=0)["expired"] == 0
+    assert movie_ids(client) == [1, 2, 3, 4, 5]
+
+
+def test_user_mentions_do_not_refresh_the_movie(client):
+    set_last_seen(client, {1: 400})
+
+    # Written back by the title resolver when a user mentions it
+    assert not client.insert_movie(MovieInfo(id=1, title="Movie 1", popularity=9), [])
+
+    assert client.prune_catalog(retention_days=365, max_movies=0)["expired"] == 1
+    assert movie_ids(client) == [2, 3, 4, 5]
+
+
+def test_popularity_floor_and_catalog_size_bound(client):
+    set_last_seen(client, {3: 10, 4: 5})
+
+    pruned = client.prune_catalog(retention_days=0, min_popularity=2, max_movies=2)
+
+    # Movie 1 is unpopular, movie 3 is the least recently seen of the rest
+    assert pruned == {"expired": 0, "unpopular": 1, "over_capacity": 2}
+    assert movie_ids(client) == [2, 5]
+
+
+def test_compaction_reclaims_pruned_pages(client):
+    conn = client._get_connection()
+    conn.executemany(
+        "UPDATE movie_embeddings SET overview = ? WHERE id = ?",
+        [("x" * 200_000, movie_id) for movie_id in range(1, 6)],
+    )
+    conn.commit()
+    conn.close()
+    client.prune_catalog(retention_days=0, min_popularity=0, max_movies=1)
+
+    compacted = client.compact_database()
+
+    assert compacted["reclaimed_bytes"] > 500_000
+    conn = client._get_connection()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    conn.close()
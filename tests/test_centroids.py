@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from app.clients.embedding_queue import EmbeddingWorkerPool
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import MovieInfo
+from app.settings import settings
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+MOVIES = [
+    (
+        1,
+        "Haunted Manor",
+        "A ghost haunts a family in a haunted manor",
+        "1985",
+        "Horror",
+    ),
+    (
+        2,
+        "The Haunting",
+        "Ghost hunters spend a night in a haunted house",
+        "1999",
+        "Horror",
+    ),
+    (3, "Wedding Crashers", "Two friends crash a wedding for laughs", "2005", "Comedy"),
+    (4, "Best Man", "A best man ruins the wedding with jokes", "1987", "Comedy"),
+    (5, "Lost Ghost", "A lonely ghost haunts a wedding", "2010", "Comedy"),
+]
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = SQLiteClient(
+        db_path=str(tmp_path / "movies.db"), backend=HashingEmbeddingBackend(dim=64)
+    )
+    for movie_id, title, overview, year, genre in MOVIES:
+        movie = MovieInfo(
+            id=movie_id, title=title, overview=overview, release_date=f"{year}-01-01"
+        )
+        client.insert_movie(movie, [genre])
+    EmbeddingWorkerPool(client).drain()
+    return client
+
+
+def ids(movies):
+    return [movie.id for movie in movies]
+
+
+def test_centroids_cover_the_embedded_catalog(client):
+    client.insert_movie(
+        MovieInfo(id=6, title="Pending", release_date="1970-01-01"), ["Western"]
+    )
+
+    assert client.compute_centroids() == 6
+
+    conn = client._get_connection()
+    counts = dict(
+        conn.execute(
+            "SELECT kind || ':' || name, movie_count FROM embedding_centroids"
+        ).fetchall()
+    )
+    conn.close()
+    assert counts == {
+        "genre:Horror": 2,
+        "genre:Comedy": 3,
+        "decade:1980": 2,
+        "decade:1990": 1,
+        "decade:2000": 1,
+        "decade:2010": 1,
+    }
+
+
+def test_users_without_an_embedding_are_served_from_centroids(client):
+    preferences = {"genre": "horror", "year_range": "1900-2030"}
+
+    horror = client.get_most_similar_movies(preferences, limit=2)
+    comedies = client.get_most_similar_movies({}, genres=["Comedy"])
+
+    assert sorted(ids(horror)) == [1, 2]
+    assert sorted(ids(comedies)) == [3, 4, 5]
+
+
+def test_year_ranges_select_decades(client):
+    client.compute_centroids()
+    eighties = client.centroid_embedding(year_range=(1980, 1989))
+
+    assert client.centroid_embedding(year_range="1900-2030") is None
+    assert client.centroid_embedding(genres=["Western"]) is None
+    assert np.linalg.norm(eighties) == pytest.approx(1)
+    assert eighties != client.centroid_embedding(year_range=(1980, 1999))
+
+
+def test_centroids_are_blended_into_the_preference_embedding(client, monkeypatch):
+    client.compute_centroids()
+    preferences = {
+        "embedding": client.embedding_backend.embed("jokes at a wedding"),
+        "genre": "Horror",
+    }
+
+    monkeypatch.setattr(settings, "centroid_blend_weight", 0.0)
+    assert ids(client.get_most_similar_movies(preferences, limit=1)) == [4]
+
+    monkeypatch.setattr(settings, "centroid_blend_weight", 0.9)
+    assert ids(client.get_most_similar_movies(preferences, limit=1)) in ([1], [2])
+
+
+def test_recomputed_centroids_replace_the_cached_ones(client):
+    client.compute_centroids()
+    assert client.centroid_embedding(genres=["Western"]) is None
+
+    client.insert_movie(
+        MovieInfo(id=6, title="Dust", overview="A cowboy rides west"), ["Western"]
+    )
+    EmbeddingWorkerPool(client).drain()
+    client.compute_centroids()
+
+    assert client.centroid_embedding(genres=["western"]) is not None
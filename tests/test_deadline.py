@@ -0,0 +1,171 @@
+import threading
+import time
+
+import httpx
+import pytest
+from app.agent.runtime import MovieAgent
+from app.clients.aio import io_loop
+from app.clients.deadline import (
+    DeadlineExceeded,
+    call_timeout,
+    check,
+    remaining,
+    request_deadline,
+)
+from app.clients.openai import OpenAIClient
+from app.clients.singleflight import SingleFlight
+from app.clients.tmdb import TMDBClient
+from smolagents import tool
+from smolagents.models import (
+    ChatMessage,
+    ChatMessageToolCall,
+    ChatMessageToolCallDefinition,
+)
+
+
+def test_calls_get_the_remaining_budget_and_nested_deadlines_never_extend():
+    assert remaining() is None
+    assert call_timeout(30, "test") == 30
+
+    with request_deadline(0.5):
+        with request_deadline(10):
+            assert remaining() <= 0.5
+        assert call_timeout(30, "test") <= 0.5
+        assert call_timeout(0.1, "test") == 0.1
+
+    with request_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            call_timeout(30, "test")
+
+
+def test_the_deadline_follows_tmdb_calls_onto_the_io_loop():
+    timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        timeouts.append(request.extensions["timeout"])
+        return httpx.Response(200, json={"results": [{"id": 1, "title": "Heat"}]})
+
+    client = TMDBClient(
+        api_key="test",
+        base_url="http://tmdb.test/3",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+    with request_deadline(2):
+        io_loop.gather(client.asearch_movie("Heat"))
+
+    assert 0 < timeouts[0]["read"] <= 2
+    assert timeouts[0]["connect"] <= 2
+
+
+def test_waiters_stop_at_their_own_deadline():
+    flight = SingleFlight("test")
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return "done"
+
+    leader = threading.Thread(target=flight.do, args=("key", slow))
+    leader.start()
+    started.wait()
+
+    start = time.monotonic()
+    with request_deadline(0.05), pytest.raises(DeadlineExceeded):
+        flight.do("key", slow)
+    assert time.monotonic() - start < 0.2
+    leader.join()
+
+
+def test_waiters_with_time_left_take_over_from_a_leader_out_of_time():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        check("test")
+        return "done"
+
+    def lead():
+        with request_deadline(0.05), pytest.raises(DeadlineExceeded):
+            flight.do("key", call)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait()
+
+    assert flight.do("key", call) == "done"
+    assert len(calls) == 2
+    leader.join()
+
+
+@tool
+def lookup(user_id: str) -> str:
+    """
+    Look up something about the user.
+
+    Args:
+        user_id: The unique identifier for the user
+    """
+    return "something"
+
+
+class SlowModel:
+    """Model which calls the lookup tool after thinking for 0.1 s."""
+
+    def __init__(self):
+        self.timeouts = []
+
+    def __call__(self, messages, **kwargs):
+        self.timeouts.append(kwargs.get("timeout"))
+        time.sleep(0.1)
+        return ChatMessage(
+            role="assistant",
+            content="",
+            tool_calls=[
+                ChatMessageToolCall(
+                    id="1",
+                    type="function",
+                    function=ChatMessageToolCallDefinition(
+                        name="lookup", arguments={"user_id": "1"}
+                    ),
+                )
+            ],
+        )
+
+
+def test_the_agent_stops_starting_steps_after_the_deadline():
+    model = SlowModel()
+    agent = MovieAgent(tools=[lookup], model=model, max_steps=10)
+
+    with request_deadline(0.05):
+        answer, tools = agent.run_with_tools("What do you know about me?")
+
+    assert answer == agent.deadline_answer
+    assert len(model.timeouts) == 1
+    assert tools == ["lookup"]
+
+
+def test_embedding_timeouts_are_not_retried_past_the_deadline():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        time.sleep(0.6)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    client = OpenAIClient(
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+    start = time.monotonic()
+    with request_deadline(0.5), pytest.raises(DeadlineExceeded):
+        client.get_embedding("Heat")
+
+    assert len(calls) == 1
+    assert time.monotonic() - start < 1
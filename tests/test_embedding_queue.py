@@ -0,0 +1,132 @@
+import sqlite3
+import time
+
+import pytest
+from app.clients.embedding_queue import EmbeddingWorkerPool, main
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import MovieInfo
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+MOVIES = [
+    MovieInfo(id=1, title="Heat", overview="A crew of thieves plans a heist"),
+    MovieInfo(id=2, title="Up", overview="A flying house"),
+    MovieInfo(id=3, title="Ronin", overview=""),
+]
+
+
+class PoisonBackend(HashingEmbeddingBackend):
+    """Fails every text containing "poison", like an upstream rejecting one input."""
+
+    def embed(self, text):
+        if "poison" in text:
+            raise ValueError("Invalid input")
+        return super().embed(text)
+
+    def embed_batch(self, texts):
+        return [self.embed(text) for text in texts]
+
+
+@pytest.fixture
+def client(tmp_path):
+    return SQLiteClient(
+        db_path=str(tmp_path / "movies.db"), backend=PoisonBackend(dim=32)
+    )
+
+
+def statuses(client):
+    conn = client._get_connection()
+    rows = dict(conn.execute("SELECT id, embedding_status FROM movie_embeddings"))
+    conn.close()
+    return rows
+
+
+def test_movies_become_searchable_once_embedded(client):
+    for movie in MOVIES:
+        assert client.insert_movie(movie, [])
+    query = {"embedding": client.embedding_backend.embed("thieves heist")}
+
+    assert client.get_most_similar_movies(query) == []
+    assert client.embedding_queue_stats()["queued"] == len(MOVIES)
+
+    assert EmbeddingWorkerPool(client, batch_size=2).drain() == len(MOVIES)
+
+    assert client.get_most_similar_movies(query, limit=1)[0].title == "Heat"
+    assert set(statuses(client).values()) == {"ready"}
+    stats = client.embedding_queue_stats()
+    assert (stats["queued"], stats["running"], stats["dead"]) == (0, 0, 0)
+    assert sorted(client.vector_index.snapshot().ids) == [1, 2, 3]
+
+
+def test_centroids_are_computed_once_the_queue_is_drained(client):
+    for movie in MOVIES:
+        client.insert_movie(movie, ["Drama"])
+    assert client.centroid_embedding(genres=["Drama"]) is None
+
+    EmbeddingWorkerPool(client).drain()
+
+    assert client.centroid_embedding(genres=["Drama"]) is not None
+    assert len(client.get_most_similar_movies({}, genres=["Drama"])) == len(MOVIES)
+
+
+def test_a_failing_movie_is_retried_then_dead_lettered(client, capsys):
+    for movie in MOVIES[:2]:
+        client.insert_movie(movie, [])
+    client.insert_movie(MovieInfo(id=4, title="Bad", overview="poison"), [])
+    pool = EmbeddingWorkerPool(client, max_attempts=2, retry_base_seconds=0)
+
+    pool.drain()
+
+    assert statuses(client) == {1: "ready", 2: "ready", 4: "failed"}
+    assert client.embedding_queue_stats()["dead"] == 1
+
+    client.embedding_backend = HashingEmbeddingBackend(dim=32)
+    assert main(["requeue-dead", "--db", client.db_path]) == 0
+    assert "Queued 1 dead embedding jobs again" in capsys.readouterr().out
+    assert statuses(client)[4] == "pending"
+    assert pool.drain() == 1
+    assert statuses(client)[4] == "ready"
+
+
+def test_failed_jobs_back_off(client):
+    client.insert_movie(MovieInfo(id=4, title="Bad", overview="poison"), [])
+    pool = EmbeddingWorkerPool(client, retry_base_seconds=60)
+
+    assert pool.drain() == 1
+
+    assert client.claim_embedding_jobs(10, lease_seconds=60) == []
+    assert client.embedding_queue_stats()["queued"] == 1
+
+
+def test_jobs_of_a_dead_worker_are_claimed_again(client):
+    client.insert_movie(MOVIES[0], [])
+
+    assert len(client.claim_embedding_jobs(10, lease_seconds=0.05)) == 1
+    assert client.claim_embedding_jobs(10, lease_seconds=0.05) == []
+    time.sleep(0.1)
+
+    assert [job[0] for job in client.claim_embedding_jobs(10, 60)] == [1]
+
+
+def test_legacy_tables_with_required_embeddings_are_migrated(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE movie_embeddings (
+            id INTEGER PRIMARY KEY, title TEXT NOT NULL, embedding TEXT NOT NULL,
+            genre_ids TEXT, overview TEXT, poster_path TEXT, release_date TEXT,
+            vote_average REAL, popularity REAL
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO movie_embeddings (id, title, embedding) VALUES (1, 'Old', ?)",
+        (str([0.5] * 32),),
+    )
+    conn.commit()
+    conn.close()
+
+    client = SQLiteClient(db_path=db_path, backend=HashingEmbeddingBackend(dim=32))
+
+    assert client.insert_movie(MOVIES[1], [])
+    assert statuses(client) == {1: "ready", 2: "pending"}
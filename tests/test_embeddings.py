@@ -0,0 +1,111 @@
+import json
+import sqlite3
+
+import numpy as np
+from app.clients.deadline import DeadlineExceeded
+from app.clients.embedding_queue import EmbeddingWorkerPool
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import MovieInfo, PreferenceData
+from app.settings import settings
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+OVERVIEWS = {
+    "heist": "A crew of professional thieves plans one last bank heist in the city.",
+    "robbery": "Thieves plan a daring bank robbery, one last job before retiring.",
+    "cartoon": "A family of talking animals goes on a musical animated adventure.",
+}
+
+
+def test_local_embeddings_are_deterministic_and_normalized():
+    backend = HashingEmbeddingBackend(dim=128)
+
+    vector = np.array(backend.embed(OVERVIEWS["heist"]))
+
+    assert vector.shape == (128,)
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert np.array_equal(
+        vector, HashingEmbeddingBackend(dim=128).embed(OVERVIEWS["heist"])
+    )
+    assert backend.model_id != HashingEmbeddingBackend(dim=256).model_id
+
+
+def test_local_embeddings_rank_related_texts_higher():
+    backend = HashingEmbeddingBackend()
+    heist, robbery, cartoon = (
+        np.array(backend.embed(text)) for text in OVERVIEWS.values()
+    )
+
+    assert heist @ robbery > heist @ cartoon
+
+
+def test_switching_backend_reembeds_movies_and_preferences(tmp_path):
+    db_path = str(tmp_path / "movies.db")
+    first = SQLiteClient(db_path=db_path, backend=HashingEmbeddingBackend(dim=64))
+    for movie_id, (name, overview) in enumerate(OVERVIEWS.items(), start=1):
+        first.insert_movie(MovieInfo(id=movie_id, title=name, overview=overview), [])
+    EmbeddingWorkerPool(first).drain()
+    first.update_preferences(
+        "1",
+        PreferenceData(genre=[]),
+        OVERVIEWS["robbery"],
+        first.embedding_backend.embed(OVERVIEWS["robbery"]),
+    )
+
+    second = SQLiteClient(db_path=db_path, backend=HashingEmbeddingBackend(dim=32))
+    assert second.get_most_similar_movies({"embedding": [1.0] * 32}) == []
+
+    assert second.reembed_movies() == len(OVERVIEWS)
+    preferences = second.get_preferences("1")
+    assert preferences["embedding_model"] == second.embedding_backend.model_id
+    assert len(preferences["embedding"]) == 32
+    movies = second.get_most_similar_movies(preferences, limit=1)
+    assert [movie.title for movie in movies] == ["robbery"]
+
+
+def test_vectors_stored_before_backends_were_recorded_are_migrated(tmp_path):
+    db_path = tmp_path / "movies.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE movie_embeddings (
+            id INTEGER PRIMARY KEY, title TEXT NOT NULL, embedding TEXT NOT NULL,
+            genre_ids TEXT, overview TEXT, poster_path TEXT, release_date TEXT,
+            vote_average REAL, popularity REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO movie_embeddings (id, title, embedding) VALUES (1, 'Heat', ?)",
+        (json.dumps([0.1, 0.2, 0.3]),),
+    )
+    conn.commit()
+    conn.close()
+
+    SQLiteClient(db_path=str(db_path))
+
+    conn = sqlite3.connect(db_path)
+    row = conn.execute(
+        "SELECT embedding_model, embedding_dim FROM movie_embeddings"
+    ).fetchone()
+    conn.close()
+    assert row == (f"openai:{settings.embedding_model_name}", 3)
+
+
+def test_preferences_keep_their_embedding_when_reembedding_fails(tmp_path):
+    db_path = str(tmp_path / "movies.db")
+    first = SQLiteClient(db_path=db_path, backend=HashingEmbeddingBackend(dim=64))
+    embedding = first.embedding_backend.embed(OVERVIEWS["heist"])
+    first.update_preferences(
+        "1", PreferenceData(genre=[]), OVERVIEWS["heist"], embedding
+    )
+
+    class FailingBackend(HashingEmbeddingBackend):
+        def embed(self, text):
+            raise DeadlineExceeded("embedding")
+
+    second = SQLiteClient(db_path=db_path, backend=FailingBackend(dim=32))
+    preferences = second.get_preferences("1")
+
+    assert preferences["embedding"] == embedding
+    assert preferences["embedding_model"] == first.embedding_backend.model_id
@@ -0,0 +1,106 @@
+import pytest
+from app.clients.embedding_queue import EmbeddingWorkerPool
+from app.clients.rate_limiter import UpstreamLimiter
+from app.clients.sqlite import SQLiteClient
+from app.observability.health import HealthMonitor, InFlight, JobStatus
+from app.schemas.schemas import MovieInfo
+from app.settings import settings
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+
+@pytest.fixture
+def client(tmp_path):
+    return SQLiteClient(
+        db_path=str(tmp_path / "movies.db"),
+        vector_index_dir=str(tmp_path / "vectors"),
+        backend=HashingEmbeddingBackend(dim=32),
+    )
+
+
+def add_movies(client, *movie_ids):
+    for movie_id in movie_ids:
+        client.insert_movie(MovieInfo(id=movie_id, title=f"Movie {movie_id}"), [])
+
+
+def monitor(client, **kwargs):
+    kwargs.setdefault("cache_seconds", 0)
+    return HealthMonitor(client, scrape=JobStatus("scrape"), runs=InFlight(), **kwargs)
+
+
+def test_workers_are_ready_once_the_catalog_is_embedded_and_indexed(client):
+    health = monitor(client)
+    assert health.readiness() == (
+        False,
+        ["catalog has 0 embedded movies, 1 required", "vector index not loaded"],
+    )
+
+    add_movies(client, 1, 2)
+    EmbeddingWorkerPool(client).drain()
+    client.export_vector_index()
+
+    report = health.report()
+    assert report["catalog"]["movies"] == report["catalog"]["embedded"] == 2
+    assert report["catalog"]["age_seconds"] < 60
+    assert report["index"]["loaded"] and report["index"]["movies"] == 2
+    assert health.readiness(report) == (True, [])
+
+
+def test_startup_scrape_and_scrape_lag_gate_readiness(client, monkeypatch):
+    monkeypatch.setattr(settings, "readiness_min_catalog_movies", 0)
+    monkeypatch.setattr(settings, "readiness_require_vector_index", False)
+    scrape = JobStatus("scrape")
+    health = HealthMonitor(client, scrape=scrape, runs=InFlight(), cache_seconds=0)
+
+    with pytest.raises(RuntimeError), scrape.track():
+        assert health.readiness()[1] == ["startup scrape running"]
+        raise RuntimeError("TMDB is down")
+    assert health.readiness() == (True, [])
+    assert health.report()["scrape"]["last_error"] == "TMDB is down"
+
+    monkeypatch.setattr(settings, "readiness_max_scrape_lag_hours", 1)
+    health.started_at -= 7200
+    assert health.readiness()[1] == ["no successful scrape for 7200s"]
+    with scrape.track():
+        pass
+    assert health.readiness() == (True, [])
+
+
+def test_queues_agent_runs_and_upstreams_are_reported(client, monkeypatch):
+    monkeypatch.setattr(settings, "readiness_min_catalog_movies", 0)
+    monkeypatch.setattr(settings, "readiness_require_vector_index", False)
+    monkeypatch.setattr(settings, "readiness_max_embedding_queue_depth", 1)
+    monkeypatch.setattr(settings, "readiness_max_agent_runs", 1)
+    limiter = UpstreamLimiter("tmdb", rate=10)
+    runs = InFlight()
+    health = HealthMonitor(
+        client,
+        limiters=[limiter],
+        queues={"telegram": lambda: 3},
+        runs=runs,
+        scrape=JobStatus("scrape"),
+        cache_seconds=0,
+    )
+    add_movies(client, 1, 2)
+    limiter.acquire()
+    limiter.release(0.1, throttled=True, retry_after=30)
+
+    with runs.track():
+        report = health.report()
+        ready, reasons = health.readiness(report)
+
+    assert report["queues"]["embedding"]["queued"] == 2
+    assert report["queues"]["telegram"] == 3
+    assert report["agent"]["in_flight"] == 1
+    assert report["upstreams"]["tmdb"]["state"] == "throttled"
+    assert not ready
+    assert reasons == ["2 movies waiting for embedding", "1 agent runs in flight"]
+
+
+def test_database_stats_are_cached(client):
+    health = monitor(client, cache_seconds=60)
+    assert health.report()["catalog"]["movies"] == 0
+
+    add_movies(client, 1)
+
+    assert health.report()["catalog"]["movies"] == 0
+    assert monitor(client).report()["catalog"]["movies"] == 1
@@ -0,0 +1,99 @@
+import pytest
+from app.clients.embedding_queue import EmbeddingWorkerPool
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import MovieInfo
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+MOVIES = [
+    (1, "Heat", "A crew of professional thieves plans one last heist in Los Angeles"),
+    (2, "Ocean's Eleven", "Danny Ocean gathers a team for a casino heist"),
+    (3, "Interstellar", "Explorers travel through a wormhole in space"),
+    (4, "Gravity", "Two astronauts are stranded in space after an accident"),
+    (5, "Notting Hill", "A bookshop owner falls for a famous actress"),
+    (6, "Amélie", "A shy waitress in Paris quietly changes the lives of others"),
+]
+
+
+@pytest.fixture
+def client(tmp_path):
+    backend = HashingEmbeddingBackend(dim=64)
+    client = SQLiteClient(db_path=str(tmp_path / "movies.db"), backend=backend)
+    for movie_id, title, overview in MOVIES:
+        client.insert_movie(
+            MovieInfo(id=movie_id, title=title, overview=overview), ["Drama"]
+        )
+    EmbeddingWorkerPool(client).drain()
+    return client
+
+
+def preferences(client, text):
+    return {"embedding": client.embedding_backend.embed(text)}
+
+
+def ids(movies):
+    return [movie.id for movie in movies]
+
+
+def test_query_words_restrict_the_candidates(client):
+    movies = client.get_most_similar_movies(
+        preferences(client, "romantic comedy in london"), limit=2, query="heist"
+    )
+
+    assert sorted(ids(movies)) == [1, 2]
+
+
+def test_vector_ranking_orders_the_lexical_matches(client):
+    movies = client.get_most_similar_movies(
+        preferences(client, "astronauts stranded after an accident"),
+        limit=3,
+        query="Suggest me a space heist",
+    )
+
+    assert ids(movies)[0] == 4
+
+
+def test_few_matches_are_filled_up_with_the_vector_search(client):
+    movies = client.get_most_similar_movies(
+        preferences(client, "waitress in paris"), limit=3, query="casino"
+    )
+
+    assert ids(movies)[0] == 2
+    assert 6 in ids(movies)
+    assert len(set(ids(movies))) == 3
+
+
+def test_query_without_embedding_ranks_by_bm25(client):
+    movies = client.get_most_similar_movies({}, limit=5, query="heist thieves")
+
+    assert ids(movies) == [1, 2]
+
+
+@pytest.mark.parametrize("query", ['"heist', "NEAR(heist", "the movie", "a"])
+def test_queries_are_never_parsed_as_fts_syntax(client, query):
+    movies = client.get_most_similar_movies(
+        preferences(client, "heist"), limit=2, query=query
+    )
+
+    assert len(movies) == 2
+
+
+def test_index_follows_updates_and_deletes(client):
+    conn = client._get_connection()
+    conn.execute("UPDATE movie_embeddings SET overview = 'A robbery' WHERE id = 1")
+    conn.execute("DELETE FROM movie_embeddings WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+    assert client.get_most_similar_movies({}, query="heist") == []
+    assert ids(client.get_most_similar_movies({}, query="robbery")) == [1]
+
+
+def test_snapshot_imports_rebuild_the_index(client, tmp_path):
+    path = tmp_path / "catalog.snapshot"
+    client.export_snapshot(path)
+    client.import_snapshot(path)
+
+    conn = client._get_connection()
+    conn.execute("INSERT INTO movie_fts (movie_fts) VALUES ('integrity-check')")
+    conn.close()
+    assert ids(client.get_most_similar_movies({}, query="wormhole")) == [3]
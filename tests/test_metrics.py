@@ -0,0 +1,39 @@
+from app.observability.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_metrics_render_prometheus_text():
+    registry = Registry(enabled=True)
+    requests = Counter("requests", "Requests by endpoint", registry=registry)
+    latency = Histogram(
+        "latency_seconds", "Latency", buckets=(0.1, 1), registry=registry
+    )
+    depth = Gauge("queue_depth", "Queue depth", registry=registry)
+
+    requests.inc(endpoint="/search/movie")
+    requests.inc(2, endpoint="/search/movie")
+    latency.observe(0.05, endpoint="/search/movie")
+    latency.observe(0.5, endpoint="/search/movie")
+    depth.set_function(lambda: 7)
+
+    text = registry.render()
+
+    assert "# TYPE requests counter" in text
+    assert 'requests_total{endpoint="/search/movie"} 3' in text
+    assert 'latency_seconds_bucket{endpoint="/search/movie",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{endpoint="/search/movie",le="1"} 2' in text
+    assert 'latency_seconds_bucket{endpoint="/search/movie",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{endpoint="/search/movie"} 2' in text
+    assert "queue_depth 7" in text
+
+
+def test_disabled_metrics_are_noops():
+    registry = Registry(enabled=False)
+    requests = Counter("requests", "Requests", registry=registry)
+    latency = Histogram("latency_seconds", "Latency", registry=registry)
+
+    requests.inc()
+    with latency.time():
+        pass
+
+    assert requests.value() == 0
+    assert latency.count() == 0
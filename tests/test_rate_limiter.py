@@ -0,0 +1,83 @@
+import threading
+import time
+
+import httpx
+import pytest
+from app.clients import openai as openai_clients
+from app.clients.rate_limiter import Priority, UpstreamLimiter
+from openai import RateLimitError
+from tenacity import wait_none
+
+
+def test_interactive_calls_go_before_waiting_background_calls():
+    limiter = UpstreamLimiter("test", rate=1000, max_concurrency=1)
+    order = []
+
+    limiter.acquire(Priority.INTERACTIVE)
+
+    def call(priority):
+        with limiter.slot(priority):
+            order.append(priority)
+
+    background = threading.Thread(target=call, args=(Priority.BACKGROUND,))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=call, args=(Priority.INTERACTIVE,))
+    interactive.start()
+    time.sleep(0.05)
+
+    limiter.release(latency=0.01)
+    background.join(1)
+    interactive.join(1)
+
+    assert order == [Priority.INTERACTIVE, Priority.BACKGROUND]
+
+
+def test_throttling_halves_concurrency_and_pauses_calls():
+    limiter = UpstreamLimiter("test", rate=1000, max_concurrency=8)
+
+    with limiter.slot() as slot:
+        slot.mark_throttled(retry_after=0.2)
+
+    assert limiter.limit == 4
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0.05)
+    start = time.monotonic()
+    with limiter.slot():
+        pass
+    assert time.monotonic() - start >= 0.1
+
+
+def test_background_calls_leave_room_for_interactive_calls():
+    limiter = UpstreamLimiter(
+        "test", rate=1000, max_concurrency=4, background_share=0.5
+    )
+    limiter.acquire(Priority.BACKGROUND)
+    limiter.acquire(Priority.BACKGROUND)
+
+    with pytest.raises(TimeoutError):
+        limiter.acquire(Priority.BACKGROUND, timeout=0.05)
+    limiter.acquire(Priority.INTERACTIVE, timeout=0.05)
+
+
+def test_every_embedding_attempt_goes_through_the_limiter(monkeypatch):
+    limiter = UpstreamLimiter("embeddings", rate=1000, max_concurrency=8)
+    monkeypatch.setattr(openai_clients, "embedding_limiter", limiter)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(limiter.snapshot()["in_flight"])
+        return httpx.Response(429, headers={"retry-after": "0"}, json={})
+
+    client = openai_clients.OpenAIClient(
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    get_embeddings = openai_clients.OpenAIClient.get_embeddings.retry_with(
+        wait=wait_none()
+    )
+
+    with pytest.raises(RateLimitError):
+        get_embeddings(client, ["Heat"])
+
+    assert calls == [1, 1, 1]
+    assert limiter.limit == 1
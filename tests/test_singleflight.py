@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from app.clients.aio import io_loop
+from app.clients.singleflight import SingleFlight
+from app.clients.tmdb import TMDBClient
+
+
+def test_concurrent_threads_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.1)
+        return ["result"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("key", call)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(1)
+
+    assert len(calls) == 1
+    assert results == [["result"]] * 5
+    assert flight.snapshot() == {"in_flight": 0, "calls": 1, "coalesced": 4}
+
+
+def test_waiters_get_the_error_of_the_shared_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.ado("key", call) for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    flight = SingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("key", call))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.ado("key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(main()) == 42
+
+
+def test_identical_tmdb_searches_are_coalesced():
+    requests = []
+
+    async def tmdb(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.params["query"])
+        await asyncio.sleep(0.1)
+        query = request.url.params["query"]
+        return httpx.Response(200, json={"results": [{"id": 1, "title": query}]})
+
+    client = TMDBClient(
+        api_key="test",
+        base_url="http://coalesce.test/3",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(tmdb)),
+    )
+    titles = ["Heat"] * 5 + ["Ronin"]
+
+    movies = io_loop.gather(*(client.asearch_movie(title) for title in titles))
+
+    assert [movie.title for movie in movies] == titles
+    assert sorted(requests) == ["Heat", "Ronin"]
+    # Finished calls are not cached
+    io_loop.run(client.asearch_movie("Heat"))
+    assert requests.count("Heat") == 2
+
+
+def test_failed_calls_are_not_remembered():
+    flight = SingleFlight("test")
+
+    def call():
+        raise RuntimeError("boom")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            flight.do("key", call)
+
+    assert flight.snapshot()["in_flight"] == 0
@@ -0,0 +1,102 @@
+import pytest
+from app.clients.embedding_queue import EmbeddingWorkerPool
+from app.clients.sqlite import SQLiteClient
+from app.schemas.schemas import MovieInfo
+from app.vectors.embeddings import HashingEmbeddingBackend
+from app.vectors.snapshot import default_path, main, read_manifest
+
+MOVIES = [
+    (
+        MovieInfo(
+            id=1,
+            title="Heat",
+            overview="A crew of thieves",
+            release_date="1995-12-15",
+            vote_average=8.3,
+            popularity=40.0,
+        ),
+        ["Crime"],
+    ),
+    (
+        MovieInfo(
+            id=2,
+            title="Up",
+            overview="A flying house",
+            release_date="2009-05-28",
+            vote_average=8.0,
+        ),
+        ["Animation"],
+    ),
+    (
+        MovieInfo(
+            id=3,
+            title="Ronin",
+            overview="Mercenaries chase a case",
+            poster_path="/ronin.jpg",
+        ),
+        [],
+    ),
+]
+
+
+def make_client(path, dim=64, quantization="none"):
+    return SQLiteClient(
+        db_path=str(path),
+        quantization=quantization,
+        backend=HashingEmbeddingBackend(dim=dim),
+    )
+
+
+@pytest.fixture
+def source(tmp_path):
+    client = make_client(tmp_path / "source.db")
+    for movie, genres in MOVIES:
+        client.insert_movie(movie, genres)
+    EmbeddingWorkerPool(client).drain()
+    return client
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_imported_catalog_is_searchable_like_the_source(source, tmp_path, quantization):
+    path = tmp_path / "catalog.npz"
+    assert source.export_snapshot(path) == len(MOVIES)
+
+    target = make_client(tmp_path / "target.db", quantization=quantization)
+    target.embedding_backend.embed = None  # no embedding calls during the import
+    assert target.import_snapshot(path) == len(MOVIES)
+
+    query = {"embedding": HashingEmbeddingBackend(dim=64).embed("thieves")}
+    expected = source.get_most_similar_movies(query, limit=3)
+    imported = target.get_most_similar_movies(query, limit=3)
+    assert [movie.model_dump() for movie in imported] == [
+        movie.model_dump() for movie in expected
+    ]
+    assert target.vector_index.snapshot().version == 1
+
+
+def test_snapshots_of_another_embedding_model_are_refused(source, tmp_path):
+    path = default_path(source.embedding_backend.model_id, tmp_path)
+    source.export_snapshot(path)
+
+    target = make_client(tmp_path / "target.db", dim=32)
+
+    assert read_manifest(path)["embedding_model"] == source.embedding_backend.model_id
+    assert target.import_snapshot(path) is None
+    assert target.get_most_similar_movies({"embedding": [1.0] * 32}) == []
+
+
+def test_cli_replaces_the_catalog(source, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.npz"
+    source.export_snapshot(path)
+    target = make_client(tmp_path / "target.db")
+    target.insert_movie(MovieInfo(id=99, title="Old", overview="Stale movie"), [])
+    monkeypatch.setattr(
+        "app.clients.sqlite.embedding_backend", target.embedding_backend
+    )
+
+    assert main(["import", str(path), "--db", target.db_path, "--replace"]) == 0
+
+    conn = target._get_connection()
+    ids = [row[0] for row in conn.execute("SELECT id FROM movie_embeddings")]
+    conn.close()
+    assert sorted(ids) == [1, 2, 3]
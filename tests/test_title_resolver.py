@@ -0,0 +1,100 @@
+import pytest
+from app.clients.sqlite import SQLiteClient
+from app.clients.title_resolver import TitleResolver
+from app.clients.titles import normalize_title
+from app.schemas.schemas import MovieInfo
+from app.vectors.embeddings import HashingEmbeddingBackend
+
+
+class FakeTMDB:
+    """Knows one movie, under a title spelled differently from the users' one."""
+
+    def __init__(self):
+        self.searches = []
+
+    async def asearch_movie(self, title):
+        self.searches.append(title)
+        if "rings" not in title.lower():
+            raise IndexError("No results")
+        return MovieInfo(
+            id=120,
+            title="The Lord of the Rings: The Fellowship of the Ring",
+            overview="A hobbit sets out to destroy a ring",
+            release_date="2001-12-18",
+            genre_ids=[12],
+        )
+
+    def get_movie_genres(self, movie):
+        return ["Adventure"]
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = SQLiteClient(
+        db_path=str(tmp_path / "movies.db"), backend=HashingEmbeddingBackend(dim=32)
+    )
+    for movie, genres in (
+        (MovieInfo(id=1, title="Heat", release_date="1995-12-15", popularity=40), []),
+        (MovieInfo(id=2, title="Heat", release_date="1986-03-14", popularity=5), []),
+        (MovieInfo(id=3, title="Amélie", release_date="2001-04-25"), ["Comedy"]),
+    ):
+        client.insert_movie(movie, genres)
+    return client
+
+
+@pytest.mark.parametrize(
+    "title, expected",
+    [
+        ("Heat (1995)", ("heat", 1995)),
+        ("  AMELIE ", ("amelie", None)),
+        ("Fast & Furious", ("fast and furious", None)),
+        ("Blade Runner 2049", ("blade runner 2049", None)),
+        ("1917", ("1917", None)),
+        ("Spider-Man: No Way Home [2021]", ("spider man no way home", 2021)),
+    ],
+)
+def test_titles_are_normalized(title, expected):
+    assert normalize_title(title) == expected
+
+
+def test_catalog_titles_are_resolved_without_tmdb(client):
+    tmdb = FakeTMDB()
+    resolver = TitleResolver(client, tmdb)
+
+    heat, older_heat, amelie = resolver.resolve(["heat", "Heat (1986)", "amelie"])
+
+    assert (heat.id, older_heat.id, amelie.id) == (1, 2, 3)
+    assert amelie.genres == ["Comedy"]
+    assert tmdb.searches == []
+    assert resolver.hit_rate == 1.0
+
+
+def test_tmdb_results_are_written_back_to_the_index(client):
+    tmdb = FakeTMDB()
+    resolver = TitleResolver(client, tmdb)
+
+    assert resolver.resolve(["lord of the rings"])[0].id == 120
+    assert resolver.resolve(["Lord of the Rings!"])[0].genres == ["Adventure"]
+    fellowship = resolver.resolve(["The Lord of the Rings: The Fellowship of the Ring"])
+
+    assert fellowship[0].id == 120
+    assert tmdb.searches == ["lord of the rings"]
+    assert resolver.hit_rate == pytest.approx(2 / 3)
+
+
+def test_unknown_titles_and_years_fall_back_to_tmdb(client):
+    tmdb = FakeTMDB()
+    resolver = TitleResolver(client, tmdb)
+
+    assert resolver.resolve(["Heat (1972)", "Unknown movie"]) == [None, None]
+    assert tmdb.searches == ["Heat (1972)", "Unknown movie"]
+
+
+def test_pruned_movies_leave_the_index(client):
+    client.prune_catalog(retention_days=0, min_popularity=10, max_movies=0)
+
+    assert client.find_movie_by_title("Heat").id == 1
+    assert client.find_movie_by_title("Heat (1986)") is None
+    conn = client._get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM movie_titles").fetchone()[0] == 1
+    conn.close()
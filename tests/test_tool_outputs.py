@@ -0,0 +1,71 @@
+from app.agent.outputs import (
+    compact_movies,
+    compact_preferences,
+    estimate_tokens,
+    movie_projection,
+)
+from app.schemas.schemas import MovieInfo, UserPreferencesResponse
+
+OVERVIEW = (
+    "Obsessive master thief Neil McCauley leads a top-notch crew on various daring "
+    "heists throughout Los Angeles while determined detective Vincent Hanna pursues "
+    "him without rest. Each man recognizes and respects the ability and the "
+    "dedication of the other even though they are aware their cat-and-mouse game "
+    "may end in violence."
+)
+
+
+def movie(index: int) -> MovieInfo:
+    return MovieInfo(
+        id=index,
+        title=f"Heat {index}",
+        overview=OVERVIEW,
+        release_date="1995-12-15",
+        vote_average=7.94,
+        poster_path="/obpPQskaVpSTuoGjhlDQRfL1YYk.jpg",
+        popularity=61.2,
+        genre_ids=[80, 18, 28],
+        genres=["Crime", "Drama", "Action"],
+    )
+
+
+def test_movie_projection_keeps_what_the_agent_presents():
+    projection = movie_projection(movie(1), overview_chars=60)
+
+    assert projection == {
+        "title": "Heat 1",
+        "year": "1995",
+        "rating": 7.9,
+        "genres": ["Crime", "Drama", "Action"],
+        "overview": "Obsessive master thief Neil McCauley leads a top-notch crew…",
+    }
+    assert movie_projection(MovieInfo(id=2, title="Up"), 60) == {"title": "Up"}
+
+
+def test_compact_movies_fit_the_token_budget():
+    movies = [movie(index) for index in range(5)]
+
+    roomy = compact_movies(movies, token_budget=1000, overview_chars=200)
+    tight = compact_movies(movies, token_budget=100, overview_chars=200)
+
+    assert len(roomy) == 5 and "overview" in roomy[0]
+    assert estimate_tokens(tight) <= 100
+    assert all("overview" not in projection for projection in tight)
+    assert [projection["title"] for projection in tight] == [
+        f"Heat {index}" for index in range(len(tight))
+    ]
+    assert estimate_tokens(roomy) < estimate_tokens(movies)
+
+
+def test_preferences_never_include_the_embedding():
+    response = UserPreferencesResponse(
+        genre="Crime",
+        favourite_movies="Heat",
+        embedding=[0.1] * 1536,
+        embedding_model="openai:text-embedding-3-small",
+    )
+
+    assert compact_preferences(response) == {
+        "genre": "Crime",
+        "favourite_movies": "Heat",
+    }
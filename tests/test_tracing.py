@@ -0,0 +1,26 @@
+from app.clients.aio import io_loop
+from app.observability.tracing import span, start_trace
+
+
+def test_spans_on_the_io_loop_join_the_trace():
+    with start_trace("request") as trace:
+        with span("tool.suggest_movies"):
+            io_loop.gather(span_on_io_loop(), span_on_io_loop())
+
+    names = [s.name for s in trace.spans]
+    assert names.count("http.tmdb") == 2
+    tool_span = next(s for s in trace.spans if s.name == "tool.suggest_movies")
+    assert all(
+        s.parent_id == tool_span.span_id for s in trace.spans if s.name == "http.tmdb"
+    )
+    assert {"request", "tool", "http"} <= set(trace.self_times())
+
+
+async def span_on_io_loop():
+    with span("http.tmdb", endpoint="/search/movie"):
+        pass
+
+
+def test_span_outside_trace_is_noop():
+    with span("db.get_preferences") as current:
+        assert current is None
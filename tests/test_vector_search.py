@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+from app.clients.sqlite import SQLiteClient
+from app.clients.titles import normalize_title
+from app.vectors.index import VectorIndex
+from app.vectors.quantization import dequantize, quantize
+
+MOVIES = [
+    # id, title, embedding, genres, year, vote_average, popularity
+    (1, "Heat", [1.0, 0.0, 0.0], ["Crime"], 1995, 8.3, 40.0),
+    (2, "Ronin", [0.9, 0.1, 0.0], ["Crime", "Action"], 1998, 7.2, 20.0),
+    (3, "Collateral", [0.8, 0.2, 0.0], ["Crime"], 2004, 7.5, 900.0),
+    (4, "Thief", [0.7, 0.3, 0.0], ["Crime"], 1981, 5.9, 5.0),
+    (5, "Up", [0.0, 0.0, 1.0], ["Animation"], 2009, 8.0, 60.0),
+]
+
+
+def insert_movies(client, movies, model_id=None):
+    model_id = model_id or client.embedding_backend.model_id
+    conn = client._get_connection()
+    conn.executemany(
+        """
+        INSERT INTO movie_embeddings
+        (id, title, embedding, genre_ids, overview, poster_path,
+         release_date, vote_average, popularity, embedding_model, embedding_dim)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (id, title, json.dumps(vector), json.dumps(genres), title, f"/{id}.jpg",
+             f"{year}-01-01", vote, popularity, model_id, len(vector))
+            for id, title, vector, genres, year, vote, popularity in movies
+        ],
+    )  # fmt: skip
+    conn.executemany(
+        "INSERT OR IGNORE INTO movie_titles VALUES (?, ?)",
+        [(normalize_title(movie[1])[0], movie[0]) for movie in movies],
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(params=["none", "float16", "int8"])
+def client(request, tmp_path):
+    client = SQLiteClient(
+        db_path=str(tmp_path / "movies.db"), quantization=request.param
+    )
+    insert_movies(client, MOVIES)
+    return client
+
+
+def titles(movies):
+    return [movie.title for movie in movies]
+
+
+def test_results_are_ordered_by_similarity(client):
+    movies = client.get_most_similar_movies({"embedding": [1.0, 0.0, 0.0]}, limit=3)
+
+    assert titles(movies) == ["Heat", "Ronin", "Collateral"]
+    assert movies[0].genres == ["Crime"]
+
+
+def test_watched_movies_and_low_ratings_are_excluded(client):
+    preferences = {
+        "embedding": [1.0, 0.0, 0.0],
+        "favourite_movies": "heat;Ronin",
+        "rating_min": 6.0,
+    }
+
+    movies = client.get_most_similar_movies(preferences, limit=5, genres=["Crime"])
+
+    assert titles(movies) == ["Collateral"]
+
+
+def test_watched_movies_are_matched_ignoring_accents_and_aliases(client):
+    insert_movies(client, [(6, "Amélie", [1.0, 0.0, 0.0], ["Comedy"], 2001, 8.0, 30.0)])
+    client.add_title_alias("Heat (the Michael Mann one)", 1)
+    preferences = {
+        "embedding": [1.0, 0.0, 0.0],
+        "favourite_movies": "AMELIE;Heat (the Michael Mann one)",
+    }
+
+    movies = client.get_most_similar_movies(preferences, limit=6)
+
+    assert "Amélie" not in titles(movies)
+    assert "Heat" not in titles(movies)
+    assert len(movies) == 4
+
+
+def test_popularity_weight_reorders_results(client):
+    movies = client.get_most_similar_movies(
+        {"embedding": [1.0, 0.0, 0.0]}, limit=3, popularity_weight=0.5
+    )
+
+    assert titles(movies)[0] == "Collateral"
+
+
+def test_missing_embedding_returns_no_movies(client):
+    assert client.get_most_similar_movies({"embedding": None}) == []
+
+
+def test_backfilled_quantized_embeddings_are_searched(client):
+    backfilled = client.backfill_quantized_embeddings()
+
+    assert backfilled == (0 if client.quantization == "none" else len(MOVIES))
+    assert client.backfill_quantized_embeddings() == 0
+    movies = client.get_most_similar_movies({"embedding": [0.0, 0.1, 1.0]}, limit=1)
+    assert titles(movies) == ["Up"]
+
+
+@pytest.mark.parametrize("mode, tolerance", [("float16", 1e-3), ("int8", 1e-2)])
+def test_quantization_round_trip(mode, tolerance):
+    vectors = np.random.default_rng(0).standard_normal((4, 64)).astype(np.float32)
+
+    codes, scales = quantize(vectors, mode)
+
+    restored = dequantize(codes, scales)
+    assert np.abs(restored - vectors).max() / np.abs(vectors).max() < tolerance
+
+
+def test_search_reads_the_exported_index(client):
+    assert client.export_vector_index() == 1
+    # Inserted after the export, so scored from SQLite
+    insert_movies(client, [(6, "Drive", [0.0, 1.0, 0.0], ["Crime"], 2011, 7.6, 50.0)])
+
+    movies = client.get_most_similar_movies({"embedding": [0.0, 1.0, 0.0]}, limit=2)
+
+    assert client.vector_index.snapshot().format == client.quantization
+    assert titles(movies) == ["Drive", "Thief"]
+
+
+def test_index_versions_are_swapped_and_pruned(tmp_path):
+    index = VectorIndex(tmp_path, keep_versions=2)
+    mapped = []
+    for version in (1, 2, 3):
+        with index.write(1, 2, np.float32, "none") as (ids, matrix):
+            ids[:] = [version]
+            matrix[:] = [[1.0, 0.0]]
+        mapped.append(index.snapshot())
+
+    assert [snapshot.version for snapshot in mapped] == [1, 2, 3]
+    # Mappings of pruned versions stay readable
+    assert mapped[0].ids[0] == 1
+    assert sorted(path.name for path in tmp_path.glob("v*.npy")) == [
+        "v2.ids.npy",
+        "v2.npy",
+        "v3.ids.npy",
+        "v3.npy",
+    ]
+
+
+def test_concurrent_exports_get_their_own_versions(tmp_path):
+    def export(movie_id):
+        # One index per export, like the schedulers of two uvicorn workers
+        with VectorIndex(tmp_path).write(1, 2, np.float32, "none") as (ids, matrix):
+            ids[:] = [movie_id]
+            time.sleep(0.1)
+            matrix[:] = [[float(movie_id), 0.0]]
+
+    threads = [threading.Thread(target=export, args=(i,)) for i in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert VectorIndex(tmp_path).snapshot().version == 2
+    for version in (1, 2):
+        ids = np.load(tmp_path / f"v{version}.ids.npy")
+        matrix = np.load(tmp_path / f"v{version}.npy")
+        assert matrix[0][0] == ids[0]
+
+
+def test_movies_from_another_backend_are_never_compared(client):
+    insert_movies(
+        client,
+        [(7, "Manhunter", [1.0, 0.0, 0.0], ["Crime"], 1986, 6.9, 30.0)],
+        model_id="local:other",
+    )
+
+    movies = client.get_most_similar_movies({"embedding": [1.0, 0.0, 0.0]}, limit=5)
+
+    assert "Manhunter" not in titles(movies)